@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+import cancellation
+from metrics import QUEUE_DEPTH
+from storage import atomic_write_text
+
+
+# Report admission is shared by every gunicorn worker through lock files in
+# ADMISSION_DIR. Can be overridden with env vars:
+#   export ADMISSION_MAX_ACTIVE=4                 # reports generated at once (0 = no admission control)
+#   export ADMISSION_MAX_QUEUED=8                 # reports allowed to wait for a slot; the rest get 429
+#   export ADMISSION_MAX_PER_CLIENT=0             # active + queued reports per client (0 = no limit)
+#   export ADMISSION_QUEUE_TIMEOUT_SECONDS=90     # give up waiting for a slot after this long (503)
+#   export ADMISSION_INTERACTIVE_RESERVE=1        # active slots batch work may never take
+#   export ADMISSION_DIR=/run/research-agent-admission
+ADMISSION_MAX_ACTIVE = int(os.getenv("ADMISSION_MAX_ACTIVE", "4"))
+ADMISSION_MAX_QUEUED = int(os.getenv("ADMISSION_MAX_QUEUED", "8"))
+ADMISSION_MAX_PER_CLIENT = int(os.getenv("ADMISSION_MAX_PER_CLIENT", "0"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "90"))
+ADMISSION_INTERACTIVE_RESERVE = int(os.getenv("ADMISSION_INTERACTIVE_RESERVE", "1"))
+ADMISSION_DIR = Path(os.getenv("ADMISSION_DIR") or Path(tempfile.gettempdir()) / "research_agent_admission")
+
+# Report duration assumed before any report has finished, and the weight of
+# each new duration in the moving average used for Retry-After.
+INITIAL_DURATION_SECONDS = 60.0
+DURATION_EWMA_ALPHA = 0.2
+MAX_RETRY_AFTER = 600
+
+
+class AdmissionRejected(Exception):
+    """Raised when a report cannot be accepted now; retry_after is in seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Report rejected ({reason}); retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _client_key(client: str) -> str:
+    return hashlib.sha256(client.encode("utf-8")).hexdigest()[:16]
+
+
+class AdmissionController:
+    """
+    Bounds concurrently generated reports across processes.
+
+    Each active report holds an flock on one of max_active slot files and
+    each waiting report one of max_queued queue files; a report that can
+    get neither is rejected straight away. The kernel drops the locks of
+    a worker that dies, so slots never leak. Per-client limits work the
+    same way with max_per_client files per client.
+
+    Batch work never queues and may only take the first
+    max_active - interactive_reserve slots, so interactive reports always
+    find a slot (or a queue place) free of batch jobs.
+
+    Retry-After is estimated from a moving average of recent report
+    durations, shared between workers through a small stats file.
+    """
+
+    def __init__(
+        self,
+        directory: Path = ADMISSION_DIR,
+        max_active: int = ADMISSION_MAX_ACTIVE,
+        max_queued: int = ADMISSION_MAX_QUEUED,
+        max_per_client: int = ADMISSION_MAX_PER_CLIENT,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+        poll_interval: float = 0.25,
+        interactive_reserve: int = ADMISSION_INTERACTIVE_RESERVE,
+    ):
+        self.directory = Path(directory)
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.max_per_client = max_per_client
+        self.queue_timeout = queue_timeout
+        self.poll_interval = poll_interval
+        self.interactive_reserve = interactive_reserve
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_active > 0 and fcntl is not None
+
+    @property
+    def stats_path(self) -> Path:
+        return self.directory / "stats.json"
+
+    def _try_lock(self, names: List[str]) -> Optional[int]:
+        """Lock the first free file among names; returns its fd or None."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for name in names:
+            fd = os.open(self.directory / name, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                continue
+            return fd
+        return None
+
+    @staticmethod
+    def _release(fd: Optional[int]) -> None:
+        if fd is not None:
+            os.close(fd)
+
+    def _active_names(self, count: Optional[int] = None) -> List[str]:
+        return [f"active-{i}.lock" for i in range(self.max_active if count is None else count)]
+
+    def average_duration(self) -> float:
+        try:
+            value = float(json.loads(self.stats_path.read_text(encoding="utf-8"))["avg_duration"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return INITIAL_DURATION_SECONDS
+        return value if value > 0 else INITIAL_DURATION_SECONDS
+
+    def record_duration(self, seconds: float) -> None:
+        """Fold a finished report's duration into the moving average."""
+        average = self.average_duration()
+        average += DURATION_EWMA_ALPHA * (seconds - average)
+        try:
+            atomic_write_text(self.stats_path, json.dumps({"avg_duration": average}))
+        except OSError:
+            pass
+
+    def retry_after(self, reason: str) -> int:
+        """
+        Seconds until a retry is likely to be admitted: the system as a
+        whole finishes a report every avg/max_active seconds, while a
+        client at its own limit must wait for one of its reports.
+        """
+        average = self.average_duration()
+        if reason == "client":
+            estimate = average
+        else:
+            estimate = average / max(self.max_active, 1)
+        return int(min(max(round(estimate), 1), MAX_RETRY_AFTER))
+
+    @contextmanager
+    def admit(self, client: Optional[str] = None, priority: str = "interactive") -> Iterator[None]:
+        """
+        Run the block once a slot is free. Raises AdmissionRejected
+        immediately if the queue (or the client's allowance) is full, or
+        after queue_timeout seconds without a slot. Batch work is rejected
+        at once unless one of its slots is free. A queued job that is
+        cancelled gives up its queue place and raises Cancelled.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        client_fd = None
+        if client and self.max_per_client > 0:
+            key = _client_key(client)
+            client_fd = self._try_lock([f"client-{key}-{i}.lock" for i in range(self.max_per_client)])
+            if client_fd is None:
+                raise AdmissionRejected("client", self.retry_after("client"))
+
+        try:
+            if priority == "batch":
+                active_fd = self._try_lock(self._active_names(max(self.max_active - self.interactive_reserve, 1)))
+                if active_fd is None:
+                    raise AdmissionRejected("busy", self.retry_after("busy"))
+            else:
+                active_fd = self._try_lock(self._active_names())
+                if active_fd is None:
+                    active_fd = self._wait_for_slot()
+            started = time.monotonic()
+            try:
+                yield
+            finally:
+                self._release(active_fd)
+            # Only reports that finish feed the estimate: fast failures and
+            # cancellations would drag Retry-After toward zero under load.
+            self.record_duration(time.monotonic() - started)
+        finally:
+            self._release(client_fd)
+
+    def _wait_for_slot(self) -> int:
+        queue_fd = self._try_lock([f"queued-{i}.lock" for i in range(self.max_queued)])
+        if queue_fd is None:
+            raise AdmissionRejected("busy", self.retry_after("busy"))
+
+        deadline = time.monotonic() + self.queue_timeout
+        QUEUE_DEPTH.inc()
+        try:
+            while True:
+                active_fd = self._try_lock(self._active_names())
+                if active_fd is not None:
+                    return active_fd
+                if time.monotonic() >= deadline:
+                    raise AdmissionRejected("timeout", self.retry_after("timeout"))
+                cancellation.sleep(self.poll_interval)
+        finally:
+            QUEUE_DEPTH.dec()
+            self._release(queue_fd)
@@ -1,7 +1,14 @@
+import hashlib
+import math
+import os
+import re
+import select
+import socket
+import sqlite3
+import threading
 import uuid
-import json
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Callable, List, Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
 
 from flask import (
@@ -9,6 +16,8 @@ from flask import (
     request,
     jsonify,
     abort,
+    Response,
+    stream_with_context,
     render_template_string,
     url_for,
 )
@@ -16,26 +25,151 @@ from flask import (
 # Load environment variables from .env file
 load_dotenv()
 
-from pipeline import generate_full_report, HISTORY_DIR
+from pipeline import generate_full_report, regenerate_section, HISTORY_DIR
+from html_writer import get_asset, iter_document
+from report_document import load_document
+from exporters import EXPORT_FORMATS, format_for_mimetype, resolve_format
+from storage import get_storage, ReportStorage
+from retention import start_background_retention
+from metrics import HTTP_REQUESTS, REGISTRY
+from tracing import load_trace, trace_dir, waterfall_rows
+from admission import AdmissionController, AdmissionRejected
+from jobs import JobRegistry, job_key, run_job
+from batches import BATCH_MAX_ITEMS, BATCH_WORKER_THREADS, BatchStore, BatchWorkers
+from scheduler import PRIORITIES, job_context
+from cancellation import Cancelled, CancelToken, cancel_scope
+from search_index import SearchIndex
 
 app = Flask(__name__)
 
 BASE_DIR = Path(__file__).resolve().parent
 
+# Run ids are uuid4 hex, whether generated here or picked by the page.
+RUN_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+# Can be overridden with env vars:
+#   export HISTORY_PAGE_SIZE=20   # past reports per page of the home page
+HISTORY_PAGE_SIZE = max(1, int(os.getenv("HISTORY_PAGE_SIZE", "20")))
+
+
+def _storage() -> ReportStorage:
+    return get_storage(HISTORY_DIR)
+
+
+retention_sweeper = start_background_retention(_storage, lambda: HISTORY_DIR)
+admission = AdmissionController()
+
+
+def _jobs() -> JobRegistry:
+    return JobRegistry(HISTORY_DIR / "jobs.db")
+
+
+def _batches() -> BatchStore:
+    return BatchStore(HISTORY_DIR / "batches.db")
+
+
+def _run_batch_item(item: Dict[str, Any], token: CancelToken) -> Dict[str, Any]:
+    """Run one batch item as a batch-priority job of the batch's client."""
+    report_type = "research"
+
+    def generate_report(run_id: str) -> Dict[str, Any]:
+        with job_context("batch", item["client"]):
+            return generate_full_report(item["topic"], run_id, report_type, use_cache=item["use_cache"])
+
+    return run_job(
+        _jobs(),
+        item["job_key"],
+        uuid.uuid4().hex,
+        generate_report,
+        admit=lambda: admission.admit(item["client"], priority="batch"),
+        exists=_storage().exists,
+        token=token,
+    )
+
+
+# Every worker process runs pending items from startup, so batches left
+# pending by a deploy or a recycled worker resume without a client polling.
+batch_workers = BatchWorkers(_batches, _run_batch_item)
+if BATCH_WORKER_THREADS > 0:
+    batch_workers.start()
+
+
+def _client_id() -> str:
+    """API key if the caller sent one, else the peer address."""
+    return request.headers.get("X-API-Key") or request.remote_addr or "unknown"
 
-def load_history_items() -> List[Dict[str, Any]]:
-    HISTORY_DIR.mkdir(exist_ok=True)
-    items: List[Dict[str, Any]] = []
 
-    for meta_path in HISTORY_DIR.glob("*.json"):
+def _disconnect_check(environ: Dict[str, Any]) -> Callable[[], bool]:
+    """
+    A check that is True once the client of this request hung up. Needs the
+    connection's socket (gunicorn, werkzeug); without it nothing is detected.
+    """
+    sock = environ.get("gunicorn.socket") or environ.get("werkzeug.socket")
+    if sock is None:
+        return lambda: False
+
+    def disconnected() -> bool:
         try:
-            data = json.loads(meta_path.read_text(encoding="utf-8"))
-            items.append(data)
-        except Exception:
-            continue
+            readable, _, _ = select.select([sock], [], [], 0)
+            # A closed connection is readable with nothing left to read.
+            return bool(readable) and sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b""
+        except BlockingIOError:
+            return False
+        except (OSError, ValueError):
+            return True
+
+    return disconnected
+
+
+def _request_token() -> CancelToken:
+    """Cancellation token that fires when the current request's client goes away."""
+    token = CancelToken()
+    token.add_check(_disconnect_check(request.environ), "Client disconnected")
+    return token
+
 
-    items.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-    return items
+@app.after_request
+def _count_request(response):
+    # Route templates, not raw paths, keep label cardinality bounded.
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+
+def load_history_items() -> List[Dict[str, Any]]:
+    return _storage().list_meta()
+
+
+# Rendered home pages of the current history version: the history list is
+# read and each page rendered once, then served until a report is added or
+# deleted.
+_home_cache: Dict[str, Any] = {"key": None, "history": [], "pages": {}}
+_home_cache_lock = threading.Lock()
+
+
+def _home_page(page: int) -> Tuple[bytes, str]:
+    """Rendered home page showing one page of past reports, and its ETag."""
+    version: Optional[str] = _storage().version()
+    key = (str(HISTORY_DIR), version)
+    with _home_cache_lock:
+        if version is None or _home_cache["key"] != key:
+            _home_cache.update(key=key, history=load_history_items(), pages={})
+        history = _home_cache["history"]
+        pages = max(1, math.ceil(len(history) / HISTORY_PAGE_SIZE))
+        page = min(max(1, page), pages)
+        cached = _home_cache["pages"].get(page)
+    if cached is not None:
+        return cached
+
+    start = (page - 1) * HISTORY_PAGE_SIZE
+    body = render_template_string(
+        HOME_TEMPLATE, history=history[start:start + HISTORY_PAGE_SIZE], page=page, pages=pages
+    ).encode("utf-8")
+    cached = (body, hashlib.sha1(body).hexdigest())
+    with _home_cache_lock:
+        if _home_cache["key"] == key:
+            _home_cache["pages"][page] = cached
+    return cached
 
 
 HOME_TEMPLATE = """
@@ -171,6 +305,16 @@ HOME_TEMPLATE = """
       max-height: 420px;
       overflow-y: auto;
     }
+    .history-pages {
+      display: flex;
+      justify-content: space-between;
+      margin-top: 0.75rem;
+      font-size: 0.8rem;
+      color: #9ca3af;
+    }
+    .history-pages a {
+      color: #e5e7eb;
+    }
     .history-empty {
       font-size: 0.9rem;
       color: #6b7280;
@@ -256,6 +400,13 @@ HOME_TEMPLATE = """
           </li>
         {% endfor %}
       </ul>
+      {% if pages > 1 %}
+      <nav class="history-pages">
+        <span>{% if page > 1 %}<a href="{{ url_for('index', page=page - 1) }}">&larr; Newer</a>{% endif %}</span>
+        <span>Page {{ page }} of {{ pages }}</span>
+        <span>{% if page < pages %}<a href="{{ url_for('index', page=page + 1) }}">Older &rarr;</a>{% endif %}</span>
+      </nav>
+      {% endif %}
       {% else %}
       <div class="history-empty">
         No reports yet. Generate your first one using the form.
@@ -294,6 +445,18 @@ HOME_TEMPLATE = """
       progress.style.display = 'none';
     }
 
+    // Run id of the report being generated, so leaving the page can cancel it.
+    let pendingRunId = null;
+
+    function newRunId() {
+      const bytes = crypto.getRandomValues(new Uint8Array(16));
+      return Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    window.addEventListener('pagehide', () => {
+      if (pendingRunId) navigator.sendBeacon(`/report/${pendingRunId}/cancel`);
+    });
+
     form.addEventListener('submit', async (e) => {
       e.preventDefault();
       const topicEl = document.getElementById('topic');
@@ -304,15 +467,23 @@ HOME_TEMPLATE = """
       btn.textContent = "Working…";
       startProgress();
 
+      pendingRunId = newRunId();
       try {
         const res = await fetch("{{ url_for('generate') }}", {
           method: "POST",
           headers: {
             "Content-Type": "application/json"
           },
-          body: JSON.stringify({ topic, report_type: "research" })
+          body: JSON.stringify({ topic, report_type: "research", run_id: pendingRunId })
         });
+        pendingRunId = null;
 
+        if (res.status === 429 || res.status === 503) {
+          const wait = res.headers.get("Retry-After") || "a few";
+          alert(`The server is busy generating other reports. Please try again in ${wait} seconds.`);
+          stopProgress();
+          return;
+        }
         if (!res.ok) {
           throw new Error("Generation failed");
         }
@@ -324,6 +495,7 @@ HOME_TEMPLATE = """
         console.error(err);
         stopProgress();
       } finally {
+        pendingRunId = null;
         btn.disabled = false;
         btn.textContent = "Generate report";
       }
@@ -334,10 +506,67 @@ HOME_TEMPLATE = """
 """
 
 
+TRACE_TEMPLATE = """
+<!doctype html>
+<html lang="en">
+<head>
+  <meta charset="utf-8" />
+  <title>Trace {{ run_id }}</title>
+  <style>
+    body {
+      font-family: system-ui, -apple-system, BlinkMacSystemFont, "Segoe UI", sans-serif;
+      background: #0f172a;
+      color: #e5e7eb;
+      margin: 0;
+      padding: 2rem;
+      font-size: 0.85rem;
+    }
+    h1 { font-size: 1.3rem; margin-top: 0; }
+    a { color: #38bdf8; }
+    table { width: 100%; border-collapse: collapse; margin-bottom: 2rem; }
+    td { padding: 2px 6px; border-bottom: 1px solid #1f2937; white-space: nowrap; }
+    td.name { width: 28%; overflow: hidden; text-overflow: ellipsis; max-width: 0; }
+    td.ms { width: 8%; text-align: right; color: #9ca3af; }
+    td.bar { width: 64%; position: relative; }
+    .bar span {
+      position: absolute;
+      top: 4px;
+      bottom: 4px;
+      min-width: 1px;
+      border-radius: 3px;
+      background: #6366f1;
+    }
+    .bar span.error { background: #ef4444; }
+    .bar span.llm-backoff { background: #f59e0b; }
+  </style>
+</head>
+<body>
+  <h1>Trace for <a href="/report/{{ run_id }}">{{ run_id }}</a></h1>
+  {% if not rows %}<p>No spans were recorded for this run.</p>{% endif %}
+  <table>
+    {% for row in rows %}
+    {% if row.depth == 0 and not loop.first %}</table><table>{% endif %}
+    <tr title="{{ row.attrs | tojson }}{% if row.error %} — {{ row.error }}{% endif %}">
+      <td class="name" style="padding-left: {{ 6 + row.depth * 14 }}px">{{ row.name }}</td>
+      <td class="ms">{{ '%.1f' | format(row.duration_ms) }} ms</td>
+      <td class="bar"><span class="{{ row.name | replace('.', '-') }}{% if row.status == 'error' %} error{% endif %}"
+        style="left: {{ row.offset_pct }}%; width: {{ row.width_pct }}%"></span></td>
+    </tr>
+    {% endfor %}
+  </table>
+</body>
+</html>
+"""
+
+
 @app.get("/")
 def index():
-    history_items = load_history_items()
-    return render_template_string(HOME_TEMPLATE, history=history_items)
+    body, etag = _home_page(request.args.get("page", 1, type=int))
+    response = Response(body, mimetype="text/html")
+    response.set_etag(etag)
+    # Revalidate every time; unchanged pages come back as a bodiless 304.
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
 
 
 @app.post("/generate")
@@ -348,27 +577,260 @@ def generate():
         return jsonify({"error": "Missing topic"}), 400
 
     report_type = "research"
-
-    run_id = uuid.uuid4().hex
-
+    use_cache = data.get("cache", True) is not False
+    priority = data.get("priority", "interactive")
+    if priority not in PRIORITIES:
+        return jsonify({"error": f"Unknown priority; use one of {', '.join(PRIORITIES)}"}), 400
+
+    # The page picks the run id up front so it can cancel the run by id
+    # (POST /report/<run_id>/cancel) while waiting for this response.
+    run_id = data.get("run_id") or uuid.uuid4().hex
+    if not isinstance(run_id, str) or not RUN_ID_PATTERN.fullmatch(run_id):
+        return jsonify({"error": "run_id must be 32 lowercase hex characters"}), 400
+    if _storage().exists(run_id):
+        return jsonify({"error": "A report with this run_id already exists"}), 409
+
+    client = _client_id()
+
+    def generate_report(run_id: str) -> Dict[str, Any]:
+        with job_context(priority, client):
+            return generate_full_report(topic, run_id, report_type, use_cache=use_cache)
+
+    # Identical submissions share one job (and run id) instead of each
+    # running the whole pipeline.
+    job = run_job(
+        _jobs(),
+        job_key(topic, report_type=report_type, use_cache=use_cache),
+        run_id,
+        generate_report,
+        admit=lambda: admission.admit(client),
+        exists=_storage().exists,
+        token=_request_token(),
+    )
+    return _job_response(job, report_type)
+
+
+def _busy_response(retry_after: int, status: int = 429):
+    response = jsonify({"error": "Too many reports in progress, try again later", "retry_after": retry_after})
+    response.headers["Retry-After"] = str(retry_after)
+    return response, status
+
+
+def _job_response(job: Dict[str, Any], report_type: str):
+    """Answer a submission with the outcome of its (possibly shared) job."""
+    if job["status"] == "done":
+        report_id = job["result"]["id"] if job.get("result") else job["run_id"]
+        return jsonify({
+            "id": report_id,
+            "report_type": report_type,
+            "report_url": f"/report/{report_id}",
+            "deduplicated": job["deduplicated"],
+        })
+    if job["status"] == "rejected":
+        return _busy_response(job.get("retry_after") or 1, 503 if job.get("reason") == "timeout" else 429)
+    if job["status"] == "timeout":
+        return jsonify({"error": "Timed out waiting for the identical report in progress", "id": job["run_id"]}), 504
+    if job["status"] == "cancelled":
+        return jsonify({"error": "Generation cancelled", "id": job["run_id"]}), 409
+    return jsonify({"error": f"Generation failed: {job.get('error')}"}), 500
+
+
+@app.post("/generate/batch")
+def generate_batch():
+    data = request.get_json(silent=True) or {}
+    topics = data.get("topics")
+    if not isinstance(topics, list) or not topics:
+        return jsonify({"error": "Expected a non-empty list of topics"}), 400
+    if len(topics) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {BATCH_MAX_ITEMS} topics per batch"}), 400
+
+    default_cache = data.get("cache", True) is not False
+    items = []
+    for index, entry in enumerate(topics):
+        options = entry if isinstance(entry, dict) else {"topic": entry}
+        topic = options.get("topic")
+        topic = topic.strip() if isinstance(topic, str) else ""
+        if not topic:
+            return jsonify({"error": f"Missing topic at index {index}"}), 400
+        use_cache = default_cache if "cache" not in options else options["cache"] is not False
+        items.append({"topic": topic, "use_cache": use_cache})
+
+    batch_id = _batches().create(_client_id(), items)
+    # Wake idle worker threads instead of waiting for their next poll.
+    batch_workers.start()
+    status_url = f"/generate/batch/{batch_id}"
+    response = jsonify({"id": batch_id, "total": len(items), "status_url": status_url})
+    response.headers["Location"] = status_url
+    return response, 202
+
+
+@app.post("/generate/batch/<batch_id>/cancel")
+def cancel_batch(batch_id):
+    batches = _batches()
+    if batches.status(batch_id) is None:
+        return jsonify({"error": "Unknown batch"}), 404
+    return jsonify({"id": batch_id, "cancelled": batches.cancel(batch_id)})
+
+
+@app.get("/generate/batch/<batch_id>")
+def batch_status(batch_id):
+    status = _batches().status(batch_id)
+    if status is None:
+        return jsonify({"error": "Unknown batch"}), 404
+    return jsonify(status)
+
+
+@app.post("/report/<run_id>/cancel")
+def cancel_report(run_id):
+    """Stop an unfinished generation; its slots and pending LLM calls are released."""
+    if not _jobs().cancel(run_id):
+        return jsonify({"error": "No generation in progress for this id"}), 404
+    return jsonify({"id": run_id, "cancelled": True})
+
+
+@app.post("/report/<run_id>/sections/<int:index>/regenerate")
+def regenerate_report_section(run_id, index):
+    # One regeneration per report at a time: each rewrites the whole
+    # stored document, so concurrent ones would drop each other's section.
+    jobs = _jobs()
+    key = f"regen:{run_id}"
+    _, owned = jobs.claim(key, run_id, reuse_seconds=0)
+    if not owned:
+        return jsonify({"error": "A section of this report is already being regenerated"}), 409
+
+    client = _client_id()
+    token = _request_token()
+    token.add_check(lambda: jobs.is_cancelled(key, run_id), "Cancelled by request")
+    status, error = "failed", None
     try:
-        result = generate_full_report(topic, run_id, report_type=report_type)
+        with cancel_scope(token), job_context("interactive", client), admission.admit(client):
+            token.raise_if_cancelled()
+            jobs.update(key, run_id, "running")
+            result = regenerate_section(run_id, index)
+        status, error = "done", result.get("error")
+    except AdmissionRejected as e:
+        status, error = "rejected", str(e)
+        return _busy_response(e.retry_after, 503 if e.reason == "timeout" else 429)
+    except LookupError as e:
+        error = str(e)
+        return jsonify({"error": error}), 404
+    except Cancelled as e:
+        status, error = "cancelled", str(e)
+        return jsonify({"error": f"Regeneration cancelled: {e}"}), 409
     except Exception as e:
-        return jsonify({"error": f"Generation failed: {e}"}), 500
+        error = str(e)
+        return jsonify({"error": f"Regeneration failed: {e}"}), 500
+    finally:
+        jobs.update(key, run_id, status, error=error)
+
+    if result.get("error"):
+        return jsonify({"error": f"Section generation failed: {result['error']}", "index": index}), 502
 
     return jsonify({
-        "id": result["id"],
-        "report_type": report_type,
-        "report_url": f"/report/{result['id']}"
+        "id": run_id,
+        "index": index,
+        "title": result["title"],
+        "report_url": f"/report/{run_id}"
     })
 
 
+@app.get("/search")
+def search():
+    query = (request.args.get("q") or "").strip()
+    if not query:
+        return jsonify({"error": "Missing q"}), 400
+    page = request.args.get("page", 1, type=int)
+    per_page = request.args.get("per_page", 20, type=int)
+
+    try:
+        index = SearchIndex(HISTORY_DIR / "search.db")
+        result = index.search(query, page=page, per_page=per_page)
+        # Deletes remove reports from the index (retention.delete_report);
+        # anything deleted some other way drops out here.
+        ids = [hit["id"] for hit in result["results"]]
+        stored = _storage().load_metas(ids)
+        missing = [run_id for run_id in ids if run_id not in stored]
+        if missing:
+            index.remove(missing)
+            result["total"] -= len(missing)
+    except sqlite3.Error as e:
+        return jsonify({"error": f"Search is unavailable: {e}"}), 503
+
+    result["results"] = [
+        dict(hit, report_url=f"/report/{hit['id']}") for hit in result["results"] if hit["id"] in stored
+    ]
+    result["pages"] = math.ceil(result["total"] / result["per_page"])
+    return jsonify(result)
+
+
+@app.get("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.get("/assets/<name>")
+def report_asset(name):
+    asset = get_asset(name)
+    if asset is None:
+        abort(404)
+    content, mimetype = asset
+    response = Response(content, mimetype=mimetype)
+    # Filenames carry a content hash, so a given URL never changes.
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
 @app.get("/report/<run_id>")
 def view_report(run_id):
-    html_path = HISTORY_DIR / f"{run_id}.html"
-    meta_path = HISTORY_DIR / f"{run_id}.json"
+    storage = _storage()
+    if not storage.exists(run_id):
+        abort(404)
 
-    if not html_path.exists() or not meta_path.exists():
+    # Render from the structured document so template changes apply to
+    # old reports; runs saved before documents existed keep their HTML.
+    doc = load_document(storage.load_artifact(run_id, "doc"))
+    if doc is not None:
+        storage.touch(run_id)
+        return Response(stream_with_context(iter_document(doc)), mimetype="text/html")
+
+    html = storage.load_artifact(run_id, "html")
+    if html is None:
+        abort(404)
+    storage.touch(run_id)
+    return html
+
+
+@app.get("/report/<run_id>/trace")
+def report_trace(run_id):
+    if not _storage().exists(run_id):
+        abort(404)
+    spans = load_trace(trace_dir(HISTORY_DIR), run_id)
+    if request.args.get("format") == "json":
+        return jsonify({"id": run_id, "spans": spans})
+    return render_template_string(TRACE_TEMPLATE, run_id=run_id, rows=waterfall_rows(spans))
+
+
+@app.get("/report/<run_id>/export")
+def export_report(run_id):
+    if "format" in request.args:
+        fmt = resolve_format(request.args["format"])
+        if fmt is None:
+            return jsonify({"error": f"Unsupported format; use one of {', '.join(EXPORT_FORMATS)}"}), 400
+    else:
+        best = request.accept_mimetypes.best_match([m for m, _, _ in EXPORT_FORMATS.values()])
+        fmt = format_for_mimetype(best) or "markdown"
+
+    storage = _storage()
+    if not storage.exists(run_id):
+        abort(404)
+    doc = load_document(storage.load_artifact(run_id, "doc"))
+    if doc is None:
+        # Runs saved before structured documents only have their HTML.
         abort(404)
 
-    return html_path.read_text(encoding="utf-8")
+    mimetype, extension, renderer = EXPORT_FORMATS[fmt]
+    response = Response(stream_with_context(renderer(doc)), mimetype=mimetype)
+    filename = re.sub(r"[^A-Za-z0-9_.-]", "_", run_id)
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}.{extension}"'
+    response.headers["Vary"] = "Accept"
+    return response
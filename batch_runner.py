@@ -0,0 +1,242 @@
+import json
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+from jobs import job_key
+from llm_client import track_usage
+from pipeline import generate_full_report
+from scheduler import LLM_SCHEDULER, job_context
+
+
+# Client name batch jobs are scheduled (and fair-shared) under.
+BATCH_CLIENT = "batch-cli"
+
+# Statuses that count as finished when resuming; failed items are retried.
+FINAL_STATUSES = ("ok", "invalid")
+
+
+def read_items(path: Path) -> Iterator[Dict[str, Any]]:
+    """
+    Items from a JSONL file of {"topic": ..., "id"?: ..., "cache"?: bool}.
+    Lines that are not such objects come back with an "error" so they can
+    be reported instead of stopping the batch.
+    """
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                yield {"line": lineno, "error": f"invalid JSON: {e}"}
+                continue
+            if not isinstance(item, dict) or not str(item.get("topic") or "").strip():
+                yield {"line": lineno, "error": "missing topic"}
+                continue
+            yield dict(item, line=lineno)
+
+
+def item_key(item: Dict[str, Any], use_cache: bool = True) -> str:
+    """Stable identity of an input item across runs: its id, else its job key."""
+    if item.get("id") is not None:
+        return str(item["id"])
+    if "error" in item:
+        return f"line-{item['line']}"
+    return job_key(item["topic"], report_type="research", use_cache=item.get("cache", use_cache))
+
+
+def load_finished(path: Path) -> Set[str]:
+    """Keys already recorded as finished in an output file."""
+    finished: Set[str] = set()
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A line cut off by an interruption; that item reruns.
+                    continue
+                if isinstance(record, dict) and record.get("status") in FINAL_STATUSES:
+                    finished.add(record.get("key"))
+    except FileNotFoundError:
+        pass
+    return finished
+
+
+def _ends_with_newline(path: Path) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, 2)
+        return f.read(1) == b"\n"
+
+
+def run_item(item: Dict[str, Any], key: str, use_cache: bool = True) -> Dict[str, Any]:
+    """Generate one report as a batch job and describe the outcome."""
+    record: Dict[str, Any] = {"key": key, "line": item.get("line"), "topic": item.get("topic")}
+    if "error" in item:
+        return dict(record, status="invalid", error=item["error"])
+
+    run_id = uuid.uuid4().hex
+    started = time.perf_counter()
+    with job_context("batch", BATCH_CLIENT), track_usage() as usage:
+        try:
+            generate_full_report(item["topic"], run_id, "research", use_cache=item.get("cache", use_cache))
+            record.update(status="ok", run_id=run_id)
+        except Exception as e:
+            record.update(status="error", error=str(e))
+    record["seconds"] = round(time.perf_counter() - started, 3)
+    record.update(usage.to_dict())
+    return record
+
+
+class BatchStats:
+    """Throughput, token and cost totals of one batch run."""
+
+    def __init__(self, prompt_price: float = 0.0, completion_price: float = 0.0):
+        # USD per million tokens, used when the provider reports no cost.
+        self.prompt_price = prompt_price
+        self.completion_price = completion_price
+        self.started = time.monotonic()
+        self.counts = {"ok": 0, "error": 0, "invalid": 0, "skipped": 0}
+        self.durations: List[float] = []
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+
+    def record_cost(self, record: Dict[str, Any]) -> float:
+        if record.get("cost") is not None:
+            return float(record["cost"])
+        return (
+            record.get("prompt_tokens", 0) * self.prompt_price
+            + record.get("completion_tokens", 0) * self.completion_price
+        ) / 1_000_000
+
+    def add(self, record: Dict[str, Any]) -> None:
+        self.counts[record["status"]] += 1
+        if record["status"] == "invalid":
+            return
+        self.durations.append(record["seconds"])
+        self.llm_calls += record.get("llm_calls", 0)
+        self.prompt_tokens += record.get("prompt_tokens", 0)
+        self.completion_tokens += record.get("completion_tokens", 0)
+        self.cost += self.record_cost(record)
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        durations = sorted(self.durations)
+
+        def percentile(p: float) -> Optional[float]:
+            if not durations:
+                return None
+            return durations[min(len(durations) - 1, int(round(p * (len(durations) - 1))))]
+
+        ok = self.counts["ok"]
+        return dict(
+            self.counts,
+            elapsed_seconds=round(elapsed, 3),
+            reports_per_minute=round(ok / elapsed * 60, 2) if elapsed > 0 else 0.0,
+            p50_seconds=percentile(0.5),
+            p95_seconds=percentile(0.95),
+            llm_calls=self.llm_calls,
+            prompt_tokens=self.prompt_tokens,
+            completion_tokens=self.completion_tokens,
+            cost=round(self.cost, 6),
+            cost_per_report=round(self.cost / ok, 6) if ok else None,
+        )
+
+
+def run_batch(
+    input_path: Path,
+    output_path: Path,
+    concurrency: int = 4,
+    rate_per_minute: float = 0,
+    llm_concurrency: Optional[int] = None,
+    resume: bool = True,
+    use_cache: bool = True,
+    prompt_price: float = 0.0,
+    completion_price: float = 0.0,
+    on_record: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Generate a report for every item of input_path, concurrency at a time.
+
+    Each finished item is appended to output_path as one JSON line right
+    away, so an interrupted batch resumes by skipping the keys already
+    recorded there (failed items are retried). Identical items within the
+    input run once. LLM calls are scheduled as "batch" priority, limited
+    to llm_concurrency in flight and rate_per_minute requests a minute.
+
+    On KeyboardInterrupt, items not started yet are dropped, running ones
+    finish and are recorded, and the summary has "interrupted": True.
+    """
+    previous = (LLM_SCHEDULER.max_concurrency, LLM_SCHEDULER.rate_budget)
+    LLM_SCHEDULER.max_concurrency = llm_concurrency or concurrency
+    LLM_SCHEDULER.set_rate(rate_per_minute)
+    try:
+        summary = _run_items(
+            Path(input_path), Path(output_path), concurrency, resume, use_cache,
+            BatchStats(prompt_price, completion_price), on_record,
+        )
+    finally:
+        LLM_SCHEDULER.max_concurrency, LLM_SCHEDULER.rate_budget = previous
+    return summary
+
+
+def _run_items(
+    input_path: Path,
+    output_path: Path,
+    concurrency: int,
+    resume: bool,
+    use_cache: bool,
+    stats: BatchStats,
+    on_record: Optional[Callable[[Dict[str, Any]], None]],
+) -> Dict[str, Any]:
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    seen = load_finished(output_path) if resume else set()
+    interrupted = False
+
+    with open(output_path, "a" if resume else "w", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as executor:
+        if out.tell() > 0 and not _ends_with_newline(output_path):
+            # Terminate a line cut off by an interruption before appending.
+            out.write("\n")
+        pending: Set[Future] = set()
+
+        def collect(done: Set[Future]) -> None:
+            for future in done:
+                if future.cancelled():
+                    continue
+                record = future.result()
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                stats.add(record)
+                if on_record is not None:
+                    on_record(record)
+
+        try:
+            for item in read_items(input_path):
+                key = item_key(item, use_cache)
+                if key in seen:
+                    stats.counts["skipped"] += 1
+                    continue
+                seen.add(key)
+                # Keep only a bounded number of items in flight so huge
+                # inputs are streamed rather than loaded.
+                while len(pending) >= concurrency * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending.add(executor.submit(run_item, item, key, use_cache))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        except KeyboardInterrupt:
+            interrupted = True
+            for future in pending:
+                future.cancel()
+            done, _ = wait(pending)
+            collect(done)
+
+    return dict(stats.summary(), interrupted=interrupted)
@@ -0,0 +1,332 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from cancellation import CancelToken
+from jobs import JOB_STALE_SECONDS, _pid_alive, job_key
+
+logger = logging.getLogger(__name__)
+
+
+# Can be overridden with env vars:
+#   export BATCH_WORKER_THREADS=2       # batch items each worker process runs at once (0 = none)
+#   export BATCH_MAX_ITEMS=100          # topics accepted per batch submission
+#   export BATCH_MAX_ATTEMPTS=30        # tries per item before it fails for lack of capacity (0 = no limit)
+BATCH_WORKER_THREADS = int(os.getenv("BATCH_WORKER_THREADS", "2"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+BATCH_MAX_ATTEMPTS = int(os.getenv("BATCH_MAX_ATTEMPTS", "30"))
+
+# Finished batches are kept this long for status lookups.
+BATCH_ROW_TTL_SECONDS = 7 * 24 * 3600
+
+ITEM_STATUSES = ("pending", "running", "done", "failed", "cancelled")
+FINAL_ITEM_STATUSES = ("done", "failed", "cancelled")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id TEXT PRIMARY KEY,
+    client TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS batch_items (
+    batch_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    topic TEXT NOT NULL,
+    use_cache INTEGER NOT NULL,
+    job_key TEXT NOT NULL,
+    duplicate_of INTEGER,
+    status TEXT NOT NULL,
+    run_id TEXT,
+    error TEXT,
+    deduplicated INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    owner_pid INTEGER,
+    not_before REAL NOT NULL DEFAULT 0,
+    started_at REAL,
+    finished_at REAL,
+    PRIMARY KEY (batch_id, idx)
+);
+CREATE INDEX IF NOT EXISTS batch_items_pending ON batch_items(status, not_before);
+"""
+
+
+class BatchStore:
+    """
+    Submitted batches and the state of each of their items, shared by every
+    worker through SQLite.
+
+    An item identical to an earlier one in the same batch is stored as a
+    duplicate of it and never runs; it reports the original's outcome.
+    Workers of any process claim pending items in submission order; items
+    claimed by a process that died, or running longer than stale_seconds,
+    go back to pending. Cancelled items keep their status; whatever their
+    worker reports afterwards is ignored.
+    """
+
+    def __init__(self, path: Path, stale_seconds: int = JOB_STALE_SECONDS):
+        self.path = Path(path)
+        self.stale_seconds = stale_seconds
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode; writers that read first take BEGIN IMMEDIATE.
+        conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def create(self, client: str, items: List[Dict[str, Any]], report_type: str = "research") -> str:
+        """Store a batch of {"topic", "use_cache"} items; returns its id."""
+        batch_id = uuid.uuid4().hex
+        now = time.time()
+        first_by_key: Dict[str, int] = {}
+        rows = []
+        for idx, item in enumerate(items):
+            key = job_key(item["topic"], report_type=report_type, use_cache=item["use_cache"])
+            duplicate_of = first_by_key.setdefault(key, idx)
+            rows.append((
+                batch_id, idx, item["topic"], int(item["use_cache"]), key,
+                duplicate_of if duplicate_of != idx else None,
+                "pending" if duplicate_of == idx else "duplicate",
+            ))
+
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._prune(conn, now)
+                conn.execute("INSERT INTO batches (batch_id, client, created_at) VALUES (?, ?, ?)",
+                             (batch_id, client, now))
+                conn.executemany(
+                    "INSERT INTO batch_items (batch_id, idx, topic, use_cache, job_key, duplicate_of, status) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return batch_id
+
+    def _prune(self, conn: sqlite3.Connection, now: float) -> None:
+        old = (
+            "SELECT batch_id FROM batches WHERE created_at < ? AND batch_id NOT IN "
+            "(SELECT batch_id FROM batch_items WHERE status IN ('pending', 'running'))"
+        )
+        cutoff = now - BATCH_ROW_TTL_SECONDS
+        conn.execute(f"DELETE FROM batch_items WHERE batch_id IN ({old})", (cutoff,))
+        conn.execute(f"DELETE FROM batches WHERE batch_id IN ({old})", (cutoff,))
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """Mark the oldest runnable item as running in this process and return it."""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for row in conn.execute(
+                    "SELECT batch_id, idx, owner_pid, started_at FROM batch_items WHERE status = 'running'"
+                ).fetchall():
+                    if now - row["started_at"] >= self.stale_seconds or not _pid_alive(row["owner_pid"]):
+                        conn.execute(
+                            "UPDATE batch_items SET status = 'pending', owner_pid = NULL "
+                            "WHERE batch_id = ? AND idx = ?",
+                            (row["batch_id"], row["idx"]),
+                        )
+                row = conn.execute(
+                    "SELECT i.*, b.client FROM batch_items i JOIN batches b USING (batch_id) "
+                    "WHERE i.status = 'pending' AND i.not_before <= ? "
+                    "ORDER BY b.created_at, i.idx LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE batch_items SET status = 'running', owner_pid = ?, started_at = ?, "
+                        "attempts = attempts + 1 WHERE batch_id = ? AND idx = ?",
+                        (os.getpid(), now, row["batch_id"], row["idx"]),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return dict(row, status="running", attempts=row["attempts"] + 1, use_cache=bool(row["use_cache"]))
+
+    def finish(
+        self,
+        batch_id: str,
+        idx: int,
+        status: str,
+        run_id: Optional[str] = None,
+        error: Optional[str] = None,
+        deduplicated: bool = False,
+    ) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE batch_items SET status = ?, run_id = ?, error = ?, deduplicated = ?, "
+                "owner_pid = NULL, finished_at = ? WHERE batch_id = ? AND idx = ? AND status != 'cancelled'",
+                (status, run_id, error, int(deduplicated), time.time(), batch_id, idx),
+            )
+
+    def defer(self, batch_id: str, idx: int, delay: float) -> None:
+        """Put a claimed item back to pending, runnable again after delay seconds."""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE batch_items SET status = 'pending', owner_pid = NULL, not_before = ? "
+                "WHERE batch_id = ? AND idx = ? AND status != 'cancelled'",
+                (time.time() + delay, batch_id, idx),
+            )
+
+    def cancel(self, batch_id: str) -> int:
+        """Cancel the unfinished items of a batch; returns how many there were."""
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE batch_items SET status = 'cancelled', error = 'Cancelled by request', finished_at = ? "
+                "WHERE batch_id = ? AND status IN ('pending', 'running')",
+                (time.time(), batch_id),
+            )
+        return cursor.rowcount
+
+    def is_cancelled(self, batch_id: str, idx: int) -> bool:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT status FROM batch_items WHERE batch_id = ? AND idx = ?", (batch_id, idx)
+            ).fetchone()
+        return row is None or row["status"] == "cancelled"
+
+    def status(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Aggregate progress and per-item results of a batch, or None if unknown."""
+        with closing(self._connect()) as conn:
+            batch = conn.execute("SELECT * FROM batches WHERE batch_id = ?", (batch_id,)).fetchone()
+            if batch is None:
+                return None
+            rows = [dict(r) for r in conn.execute(
+                "SELECT * FROM batch_items WHERE batch_id = ? ORDER BY idx", (batch_id,)
+            )]
+
+        items = []
+        for row in rows:
+            source = rows[row["duplicate_of"]] if row["duplicate_of"] is not None else row
+            item = {
+                "index": row["idx"],
+                "topic": row["topic"],
+                "status": source["status"],
+                "run_id": source["run_id"],
+                "report_url": f"/report/{source['run_id']}" if source["status"] == "done" else None,
+                "error": source["error"],
+                "deduplicated": row["duplicate_of"] is not None or bool(source["deduplicated"]),
+            }
+            items.append(item)
+
+        counts = {status: 0 for status in ITEM_STATUSES}
+        for item in items:
+            counts[item["status"]] += 1
+        completed = sum(counts[status] for status in FINAL_ITEM_STATUSES)
+        return {
+            "id": batch_id,
+            "created_at": batch["created_at"],
+            "total": len(items),
+            "counts": counts,
+            "completed": completed,
+            "progress": round(completed / len(items), 3) if items else 1.0,
+            "finished": completed == len(items),
+            "items": items,
+        }
+
+
+class BatchWorkers:
+    """
+    Daemon threads that run pending batch items, from every batch, in this
+    process. run_item(item, token) runs one report job under token and
+    returns its outcome as jobs.run_job does; items turned away by
+    admission are retried later, and fail once they have been tried
+    max_attempts times. The token fires when the item is cancelled
+    through the store, from any process.
+    """
+
+    def __init__(
+        self,
+        store_factory: Callable[[], BatchStore],
+        run_item: Callable[[Dict[str, Any], CancelToken], Dict[str, Any]],
+        threads: int = BATCH_WORKER_THREADS,
+        poll_interval: float = 2.0,
+        max_attempts: int = BATCH_MAX_ATTEMPTS,
+    ):
+        self.store_factory = store_factory
+        self.run_item = run_item
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> "BatchWorkers":
+        """Start the threads if they are not running yet, and wake idle ones."""
+        with self._lock:
+            if not self._threads:
+                for n in range(self.threads):
+                    thread = threading.Thread(target=self._run, name=f"batch-worker-{n}", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+        self._wake.set()
+        return self
+
+    def stop(self) -> None:
+        """Stop the threads once their current item is done."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        self._stop.set()
+        self._wake.set()
+        for thread in threads:
+            thread.join(timeout=5)
+        self._stop.clear()
+
+    def process_next(self) -> bool:
+        """Run one pending item; False if there was none."""
+        store = self.store_factory()
+        item = store.claim_next()
+        if item is None:
+            return False
+
+        token = CancelToken()
+        token.add_check(lambda: store.is_cancelled(item["batch_id"], item["idx"]), "Batch cancelled")
+        try:
+            job = self.run_item(item, token)
+        except Exception as e:
+            logger.exception("Batch item %s/%d failed", item["batch_id"], item["idx"])
+            job = {"status": "failed", "run_id": None, "error": str(e)}
+
+        no_capacity = job["status"] in ("rejected", "timeout")
+        if no_capacity and (not self.max_attempts or item["attempts"] < self.max_attempts):
+            # No capacity (or the shared job is still running): try again later.
+            store.defer(item["batch_id"], item["idx"], job.get("retry_after") or self.poll_interval)
+        elif no_capacity:
+            store.finish(
+                item["batch_id"], item["idx"], "failed",
+                error=f"Gave up after {item['attempts']} attempts ({job.get('error') or job['status']})",
+            )
+        else:
+            store.finish(
+                item["batch_id"], item["idx"], job["status"],
+                run_id=job.get("run_id"), error=job.get("error"), deduplicated=job.get("deduplicated", False),
+            )
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self.process_next():
+                    continue
+            except Exception:
+                logger.exception("Batch worker failed")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
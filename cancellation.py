@@ -0,0 +1,106 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+
+
+# Can be overridden with env vars:
+#   export CANCEL_CHECK_INTERVAL_SECONDS=1   # how often cancellation checks (disconnect, cancel flag) are polled
+CANCEL_CHECK_INTERVAL = float(os.getenv("CANCEL_CHECK_INTERVAL_SECONDS", "1"))
+
+
+class Cancelled(Exception):
+    """Raised inside a cancelled job at its next cancellation point."""
+    pass
+
+
+class CancelToken:
+    """
+    Cancellation state of one job. cancel() sets it directly; checks added
+    with add_check() (client gone, cancel requested from another process)
+    are polled at most every check_interval seconds while the job asks.
+    """
+
+    def __init__(self, check_interval: float = CANCEL_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._checks: List[Tuple[Callable[[], bool], str]] = []
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+
+    def add_check(self, check: Callable[[], bool], reason: str) -> None:
+        with self._lock:
+            self._checks.append((check, reason))
+            # Poll the new check on the next question.
+            self._last_check = 0.0
+
+    def cancel(self, reason: str = "Cancelled") -> None:
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_check < self.check_interval:
+                return False
+            self._last_check = now
+            checks = list(self._checks)
+        for check, reason in checks:
+            if check():
+                self.cancel(reason)
+                return True
+        return False
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            raise Cancelled(self.reason)
+
+    def wait(self, seconds: float) -> bool:
+        """Sleep up to seconds; returns True as soon as the token is cancelled."""
+        deadline = time.monotonic() + seconds
+        while not self.cancelled:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._event.wait(min(remaining, self.check_interval))
+        return True
+
+
+_current_token: contextvars.ContextVar[Optional[CancelToken]] = contextvars.ContextVar("cancel_token", default=None)
+
+
+@contextmanager
+def cancel_scope(token: CancelToken) -> Iterator[CancelToken]:
+    """Make token the cancellation token of everything run inside the block."""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def current_token() -> Optional[CancelToken]:
+    return _current_token.get()
+
+
+def check_cancelled() -> None:
+    """Cancellation point: raise Cancelled if the current job was cancelled."""
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def sleep(seconds: float) -> None:
+    """time.sleep that ends early, raising Cancelled, if the current job is cancelled."""
+    token = _current_token.get()
+    if token is None:
+        time.sleep(seconds)
+    elif token.wait(seconds):
+        raise Cancelled(token.reason)
@@ -0,0 +1,97 @@
+import re
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+
+CITATION_PATTERN = re.compile(r"\[(\d+)\]")
+
+
+def build_citation_map(
+    sources: List[Dict[str, Any]],
+    resolve: Callable[[Dict[str, Any]], Optional[int]],
+) -> Dict[int, int]:
+    """
+    Map a section's local source ids to global ids in one pass over its
+    sources. The first source wins when the model reuses a local id.
+    """
+    citation_map: Dict[int, int] = {}
+    for src in sources:
+        try:
+            local_id = int(src.get("id", -1))
+        except (TypeError, ValueError):
+            continue
+        if local_id in citation_map:
+            continue
+        global_id = resolve(src)
+        if global_id:
+            citation_map[local_id] = global_id
+    return citation_map
+
+
+def renumber_citations(body: str, citation_map: Dict[int, int]) -> Tuple[str, List[int], Set[int]]:
+    """
+    Rewrite [n] markers in body to their global ids in a single scan.
+
+    Returns (new_body, dangling, cited) where dangling lists local ids
+    (in order of first appearance) that have no mapped source and are left
+    untouched, and cited is the set of local ids that were rewritten.
+    """
+    parts: List[str] = []
+    dangling: List[int] = []
+    cited: Set[int] = set()
+    pos = 0
+
+    for match in CITATION_PATTERN.finditer(body):
+        local_id = int(match.group(1))
+        global_id = citation_map.get(local_id)
+        if global_id is None:
+            if local_id not in dangling:
+                dangling.append(local_id)
+            continue
+        cited.add(local_id)
+        parts.append(body[pos:match.start()])
+        parts.append(f"[{global_id}]")
+        pos = match.end()
+
+    if not parts:
+        return body, dangling, cited
+
+    parts.append(body[pos:])
+    return "".join(parts), dangling, cited
+
+
+def normalize_citations(
+    blocks: List[Dict[str, Any]],
+    resolve: Callable[[Dict[str, Any]], Optional[int]],
+) -> Tuple[List[Dict[str, str]], List[Dict[str, Any]]]:
+    """
+    Rewrite local [n] citations of every section block to global ids.
+
+    blocks: [{"title": ..., "body": ..., "sources": [{"id": 1, ...}, ...]}, ...]
+    resolve: maps a section source dict to its global id (or None)
+
+    Returns (sections, issues):
+    sections: [{"title": ..., "body": <normalized body>}, ...]
+    issues: one entry per section with problems, e.g.
+      {"section": "Title", "dangling": [4], "unused": [2]}
+    where dangling are cited ids with no matching source and unused are
+    source ids the body never cites.
+    """
+    sections: List[Dict[str, str]] = []
+    issues: List[Dict[str, Any]] = []
+
+    for block in blocks:
+        citation_map = build_citation_map(block.get("sources", []), resolve)
+        body, dangling, cited = renumber_citations(block.get("body", ""), citation_map)
+        sections.append({"title": block["title"], "body": body})
+
+        unused = sorted(local_id for local_id in citation_map if local_id not in cited)
+        if dangling or unused:
+            issues.append(
+                {
+                    "section": block["title"],
+                    "dangling": dangling,
+                    "unused": unused,
+                }
+            )
+
+    return sections, issues
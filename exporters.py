@@ -0,0 +1,105 @@
+import json
+from typing import Any, Callable, Dict, IO, Iterator, Optional, Tuple
+
+from citations import CITATION_PATTERN
+from html_writer import iter_html as iter_report_html, reference_fields, split_paragraphs
+
+
+_MD_SPECIAL = str.maketrans({c: "\\" + c for c in "\\`*_[]<>#|"})
+
+
+def _md_escape(text: str) -> str:
+    return " ".join((text or "").split()).translate(_MD_SPECIAL)
+
+
+def _md_citations(paragraph: str) -> str:
+    """[n] -> [[n]](#ref-n), matching the HTML report's anchors."""
+    return CITATION_PATTERN.sub(lambda m: f"[[{m.group(1)}]](#ref-{m.group(1)})", paragraph)
+
+
+def iter_markdown(doc: Dict[str, Any]) -> Iterator[str]:
+    """Markdown for a report document, one chunk per block."""
+    yield f"# {_md_escape(doc.get('topic', ''))}\n\n"
+    for sec in doc.get("sections", []):
+        yield f"## {_md_escape(sec.get('title', ''))}\n\n"
+        for para in split_paragraphs(sec.get("body", "")):
+            yield _md_citations(para) + "\n\n"
+
+    sources = doc.get("sources", [])
+    if sources:
+        yield "## References\n\n"
+    for src in sources:
+        fields = reference_fields(src)
+        line = f'<a id="ref-{fields["ref_id"]}"></a>{fields["ref_id"]}. **{_md_escape(fields["title"])}**'
+        if fields["source_type"]:
+            line += f" — _{_md_escape(fields['source_type'])}_"
+        if fields["why_relevant"]:
+            line += f". {_md_escape(fields['why_relevant'])}"
+        if fields["url"]:
+            line += f" <{fields['url']}>"
+        yield line + "\n"
+
+
+def iter_json(doc: Dict[str, Any]) -> Iterator[str]:
+    """
+    JSON for a report document, streamed section by section. Each section
+    also lists the reference ids it cites.
+    """
+
+    def dumps(value: Any) -> str:
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+    header = {k: doc.get(k) for k in ("id", "topic", "user_topic", "created_at")}
+    yield dumps(header)[:-1] + ',"sections":['
+    for i, sec in enumerate(doc.get("sections", [])):
+        body = sec.get("body", "")
+        cited = sorted({int(m.group(1)) for m in CITATION_PATTERN.finditer(body)})
+        item = {"title": sec.get("title", ""), "goal": sec.get("goal", ""), "body": body, "citations": cited}
+        yield ("," if i else "") + dumps(item)
+    yield '],"sources":['
+    for i, src in enumerate(doc.get("sources", [])):
+        fields = reference_fields(src)
+        item = {
+            "id": fields["ref_id"],
+            "title": fields["title"],
+            "url": fields["url"],
+            "source_type": fields["source_type"],
+            "why_relevant": fields["why_relevant"],
+        }
+        yield ("," if i else "") + dumps(item)
+    yield "]}\n"
+
+
+def iter_html(doc: Dict[str, Any]) -> Iterator[str]:
+    """Standalone HTML (assets inlined), streamed section by section."""
+    yield from iter_report_html(doc.get("topic", ""), doc.get("sections", []), doc.get("sources", []), "inline")
+
+
+# format -> (mimetype, file extension, renderer)
+EXPORT_FORMATS: Dict[str, Tuple[str, str, Callable[[Dict[str, Any]], Iterator[str]]]] = {
+    "markdown": ("text/markdown", "md", iter_markdown),
+    "json": ("application/json", "json", iter_json),
+    "html": ("text/html", "html", iter_html),
+}
+_FORMAT_ALIASES = {"md": "markdown"}
+
+
+def resolve_format(name: Optional[str]) -> Optional[str]:
+    """Canonical export format for a format= value, or None if unsupported."""
+    name = (name or "").strip().lower()
+    name = _FORMAT_ALIASES.get(name, name)
+    return name if name in EXPORT_FORMATS else None
+
+
+def format_for_mimetype(mimetype: Optional[str]) -> Optional[str]:
+    for name, (fmt_mimetype, _, _) in EXPORT_FORMATS.items():
+        if fmt_mimetype == mimetype:
+            return name
+    return None
+
+
+def write_export(doc: Dict[str, Any], fmt: str, out: IO[str]) -> None:
+    """Write an export to a text file object without building it in memory."""
+    _, _, renderer = EXPORT_FORMATS[fmt]
+    for chunk in renderer(doc):
+        out.write(chunk)
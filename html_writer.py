@@ -1,8 +1,22 @@
+import hashlib
 import html
-from typing import List, Dict
-
-STYLE_BLOCK = """
-<style>
+import os
+import threading
+from collections import OrderedDict
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+
+from citations import CITATION_PATTERN
+from report_document import document_hash
+
+# How report CSS/JS is included, can be overridden with env vars:
+#   export REPORT_ASSET_MODE=inline            # "external" (default) links versioned files
+#   export REPORT_ASSET_URL_PREFIX=/assets/    # where app.py serves them
+REPORT_ASSET_MODE = os.getenv("REPORT_ASSET_MODE", "external")
+REPORT_ASSET_URL_PREFIX = os.getenv("REPORT_ASSET_URL_PREFIX", "/assets/")
+#   export RENDER_CACHE_BYTES=33554432         # rendered pages kept in memory (0 = no cache)
+RENDER_CACHE_BYTES = int(os.getenv("RENDER_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+REPORT_CSS = """
   body {
     font-family: -apple-system, BlinkMacSystemFont, "Helvetica Neue", "Segoe UI", Roboto, Arial, sans-serif;
     background-color: #fafafa;
@@ -139,8 +153,9 @@ STYLE_BLOCK = """
     border-left: 3px solid #0a7cff;
     transition: background-color 0.3s ease;
   }
-</style>
-<script>
+"""
+
+REPORT_JS = """
   // Add click handler for citation links to highlight the reference
   document.addEventListener('DOMContentLoaded', function() {
     const citationLinks = document.querySelectorAll('.citation-link');
@@ -162,9 +177,51 @@ STYLE_BLOCK = """
       });
     });
   });
-</script>
 """
 
+STYLE_BLOCK = f"""
+<style>{REPORT_CSS}</style>
+<script>{REPORT_JS}</script>
+"""
+
+
+def _asset_name(stem: str, content: str, ext: str) -> str:
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:12]
+    return f"{stem}.{digest}.{ext}"
+
+
+# Content-hashed filenames: a changed stylesheet gets a new URL, so the
+# files can be cached forever.
+CSS_ASSET = _asset_name("report", REPORT_CSS, "css")
+JS_ASSET = _asset_name("report", REPORT_JS, "js")
+ASSETS: Dict[str, Tuple[str, str]] = {
+    CSS_ASSET: (REPORT_CSS, "text/css"),
+    JS_ASSET: (REPORT_JS, "application/javascript"),
+}
+
+
+def get_asset(name: str) -> Optional[Tuple[str, str]]:
+    """(content, mimetype) of a versioned report asset, or None."""
+    return ASSETS.get(name)
+
+
+def asset_tags(mode: Optional[str] = None, url_prefix: Optional[str] = None) -> str:
+    """
+    <head> markup for the report CSS/JS: inlined ("inline", for standalone
+    files) or linked to the versioned asset URLs ("external").
+    """
+    mode = mode or REPORT_ASSET_MODE
+    if mode == "inline":
+        return STYLE_BLOCK
+    if mode != "external":
+        raise ValueError(f"Unknown REPORT_ASSET_MODE: {mode}")
+    prefix = html.escape(url_prefix if url_prefix is not None else REPORT_ASSET_URL_PREFIX)
+    return (
+        f'<link rel="stylesheet" href="{prefix}{CSS_ASSET}"/>\n'
+        f'<script src="{prefix}{JS_ASSET}" defer></script>'
+    )
+
+
 HTML_TEMPLATE = """<!DOCTYPE html>
 <html lang="en">
 <head>
@@ -197,98 +254,211 @@ HTML_TEMPLATE = """<!DOCTYPE html>
 """
 
 
-def _render_sections(sections: List[Dict[str, str]]) -> str:
-    import re
-    parts = []
+def split_paragraphs(body: str) -> List[str]:
+    """Non-empty, stripped paragraphs of a section body (blank-line separated)."""
+    return [p.strip() for p in (body or "").split("\n\n") if p.strip()]
+
+
+def _citation_link(match) -> str:
+    citation_id = match.group(1)
+    return f'<a href="#ref-{citation_id}" class="citation-link" data-ref="{citation_id}">[{citation_id}]</a>'
+
+
+def _render_paragraph(para: str) -> str:
+    """
+    Escape a paragraph and turn [n] into superscript reference links
+    (Wikipedia-style) in one pass with the shared, precompiled pattern.
+    """
+    return "<p>" + CITATION_PATTERN.sub(_citation_link, html.escape(para)) + "</p>"
+
+
+def iter_sections(sections: List[Dict[str, str]]) -> Iterator[str]:
+    """Section markup, one chunk per section."""
+    separator = ""
     for sec in sections:
         sec_title = html.escape(sec["title"])
-        body_raw = sec["body"]
-        para_chunks = [p.strip() for p in body_raw.split("\n\n") if p.strip()]
-
-        para_html_chunks = []
-        for para in para_chunks:
-            # First escape HTML to prevent XSS
-            para_escaped = html.escape(para)
-            
-            # Pattern to match [1], [2], [12], etc. - find all citations
-            citation_pattern = re.compile(r'\[(\d+)\]')
-            
-            # Find all citation positions in original text
-            citations = list(citation_pattern.finditer(para_escaped))
-            
-            if not citations:
-                # No citations, just output as-is
-                para_html_chunks.append(f"<p>{para_escaped}</p>")
-                continue
-            
-            # Wikipedia-style: Replace [1] with superscript clickable link right where it appears
-            # Process from end to start to maintain positions
-            result = para_escaped
-            for match in reversed(citations):
-                citation_id = match.group(1)
-                start_pos = match.start()
-                end_pos = match.end()
-                
-                # Replace [1] with superscript clickable link
-                superscript_link = f'<a href="#ref-{citation_id}" class="citation-link" data-ref="{citation_id}">[{citation_id}]</a>'
-                result = result[:start_pos] + superscript_link + result[end_pos:]
-            
-            para_html_chunks.append(f"<p>{result}</p>")
-
-        section_block = f"""
+        paragraphs = "".join(_render_paragraph(para) for para in split_paragraphs(sec["body"]))
+        yield f"""{separator}
         <section class="article-section">
           <h2>{sec_title}</h2>
-          {''.join(para_html_chunks)}
+          {paragraphs}
         </section>
         """
-        parts.append(section_block)
-    return "\n".join(parts)
+        separator = "\n"
 
 
-def _render_references(sources: List[Dict[str, str]]) -> str:
-    refs = []
+def _render_sections(sections: List[Dict[str, str]]) -> str:
+    return "".join(iter_sections(sections))
+
+
+def reference_fields(src: Dict[str, Any]) -> Dict[str, Any]:
+    """Unescaped fields of one reference entry; shared by every output format."""
+    return {
+        "ref_id": src.get("global_id", ""),
+        "title": src.get("title", "") or "",
+        "url": (src.get("url", "") or "").strip(),
+        "source_type": src.get("source_type", "") or "",
+        "why_relevant": src.get("why_relevant", "") or "",
+    }
+
+
+def iter_references(sources: List[Dict[str, str]]) -> Iterator[str]:
+    """Reference list items, one chunk per source."""
+    separator = ""
     for s in sources:
-        title = html.escape(s.get("title", ""))
-        url = s.get("url", "").strip()
-        source_type = html.escape(s.get("source_type", ""))
-        why = html.escape(s.get("why_relevant", ""))
-        ref_id = s.get("global_id", "")
+        fields = reference_fields(s)
+        title = html.escape(fields["title"])
+        url = fields["url"]
+        source_type = html.escape(fields["source_type"])
+        why = html.escape(fields["why_relevant"])
+        ref_id = fields["ref_id"]
 
         if url:
             link_html = f'<a href="{html.escape(url)}" target="_blank" rel="noopener noreferrer">{html.escape(url)}</a>'
         else:
             link_html = ""
 
-        refs.append(f"""
+        yield separator + f"""
         <li id="ref-{ref_id}">
           <strong>[{ref_id}] {title}</strong><br/>
           <em>{source_type}</em><br/>
           {why}<br/>
           {link_html}
         </li>
-        """.strip())
-    return "\n".join(refs)
+        """.strip()
+        separator = "\n"
 
 
-def save_html(
+def _render_references(sources: List[Dict[str, str]]) -> str:
+    return "".join(iter_references(sources))
+
+
+# HTML_TEMPLATE split around its two bulk placeholders for streaming.
+_TEMPLATE_HEAD, _rest = HTML_TEMPLATE.split("{sections_html}")
+_TEMPLATE_MIDDLE, _TEMPLATE_TAIL = _rest.split("{references_html}")
+del _rest
+
+
+def iter_html(
     topic: str,
     sections: List[Dict[str, str]],
     sources: List[Dict[str, str]],
-    output_path: str,
-) -> str:
-
-    sections_html = _render_sections(sections)
-    references_html = _render_references(sources)
-
-    final_html = HTML_TEMPLATE.format(
+    asset_mode: Optional[str] = None,
+) -> Iterator[str]:
+    """
+    The full report page as a stream of chunks (head, one per section,
+    one per reference, tail); the document is never built in memory.
+    """
+    yield _TEMPLATE_HEAD.format(
         title=html.escape(topic),
         title_escaped=html.escape(topic),
-        style=STYLE_BLOCK,
-        sections_html=sections_html,
-        references_html=references_html,
+        style=asset_tags(asset_mode),
     )
+    yield from iter_sections(sections)
+    yield _TEMPLATE_MIDDLE
+    yield from iter_references(sources)
+    yield _TEMPLATE_TAIL
+
+
+def write_html(
+    out: IO[str],
+    topic: str,
+    sections: List[Dict[str, str]],
+    sources: List[Dict[str, str]],
+    asset_mode: Optional[str] = None,
+) -> None:
+    """Stream the report page into a text file object."""
+    for chunk in iter_html(topic, sections, sources, asset_mode):
+        out.write(chunk)
+
+
+def render_html(
+    topic: str,
+    sections: List[Dict[str, str]],
+    sources: List[Dict[str, str]],
+    asset_mode: Optional[str] = None,
+) -> str:
+    return "".join(iter_html(topic, sections, sources, asset_mode))
+
+
+# Identifies the template and assets; part of the render cache key so a
+# re-theme never serves stale HTML.
+TEMPLATE_VERSION = hashlib.sha256(
+    "|".join((HTML_TEMPLATE, CSS_ASSET, JS_ASSET)).encode("utf-8")
+).hexdigest()[:12]
+
+# key -> (page, size in bytes), least recently used first.
+_render_cache: "OrderedDict[Tuple[str, str, str], Tuple[str, int]]" = OrderedDict()
+_render_cache_bytes = 0
+_render_cache_lock = threading.Lock()
+
+
+def _cache_page(key: Tuple[str, str, str], page: str, size: int) -> None:
+    global _render_cache_bytes
+    with _render_cache_lock:
+        if key in _render_cache:
+            return
+        _render_cache[key] = (page, size)
+        _render_cache_bytes += size
+        while _render_cache_bytes > RENDER_CACHE_BYTES:
+            _, (_, evicted) = _render_cache.popitem(last=False)
+            _render_cache_bytes -= evicted
+
+
+def iter_document(doc: Dict[str, Any], asset_mode: Optional[str] = None) -> Iterator[str]:
+    """
+    Render a structured report document (see report_document) to HTML as
+    a stream of chunks. Pages up to an eighth of RENDER_CACHE_BYTES are
+    kept in an in-process LRU keyed by document hash, template version
+    and asset mode, holding at most RENDER_CACHE_BYTES in total; larger
+    pages are only ever streamed.
+    """
+    mode = asset_mode or REPORT_ASSET_MODE
+    key = (document_hash(doc), TEMPLATE_VERSION, mode)
+    with _render_cache_lock:
+        cached = _render_cache.get(key)
+        if cached is not None:
+            _render_cache.move_to_end(key)
+    if cached is not None:
+        yield cached[0]
+        return
+
+    limit = RENDER_CACHE_BYTES // 8
+    kept: Optional[List[str]] = [] if limit > 0 else None
+    size = 0
+    for chunk in iter_html(doc.get("topic", ""), doc.get("sections", []), doc.get("sources", []), asset_mode=mode):
+        if kept is not None:
+            size += len(chunk.encode("utf-8"))
+            if size <= limit:
+                kept.append(chunk)
+            else:
+                kept = None
+        yield chunk
+    if kept is not None:
+        _cache_page(key, "".join(kept), size)
+
+
+def render_document(doc: Dict[str, Any], asset_mode: Optional[str] = None) -> str:
+    """iter_document as one string."""
+    return "".join(iter_document(doc, asset_mode))
+
+
+def clear_render_cache() -> None:
+    global _render_cache_bytes
+    with _render_cache_lock:
+        _render_cache.clear()
+        _render_cache_bytes = 0
+
+
+def save_html(
+    topic: str,
+    sections: List[Dict[str, str]],
+    sources: List[Dict[str, str]],
+    output_path: str,
+) -> str:
 
+    # Standalone files must not depend on the server's asset URLs.
     with open(output_path, "w", encoding="utf-8") as f:
-        f.write(final_html)
+        write_html(f, topic, sections, sources, asset_mode="inline")
 
     return output_path
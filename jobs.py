@@ -0,0 +1,354 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Dict, Optional, Tuple
+
+from admission import AdmissionRejected
+from cancellation import Cancelled, CancelToken, cancel_scope
+
+
+# Can be overridden with env vars:
+#   export JOB_REUSE_SECONDS=0         # serve a finished identical report this long after it completed (0 = off)
+#   export JOB_STALE_SECONDS=900       # treat an unfinished job older than this as abandoned
+#   export JOB_WAIT_TIMEOUT_SECONDS=600  # how long an attached submission waits for the shared job
+JOB_REUSE_SECONDS = int(os.getenv("JOB_REUSE_SECONDS", "0"))
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "900"))
+JOB_WAIT_TIMEOUT = float(os.getenv("JOB_WAIT_TIMEOUT_SECONDS", "600"))
+
+# Finished job rows are kept at least this long (longer if reuse needs them).
+JOB_ROW_TTL_SECONDS = 24 * 3600
+
+ACTIVE_STATUSES = ("queued", "running")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_key TEXT PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner_pid INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    error TEXT,
+    retry_after INTEGER
+);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs(finished_at);
+CREATE TABLE IF NOT EXISTS job_waiters (
+    job_key TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    waiter_id TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    PRIMARY KEY (job_key, run_id, waiter_id)
+);
+"""
+
+
+def normalize_topic(topic: str) -> str:
+    """Case-, whitespace- and trailing-punctuation-insensitive topic."""
+    return " ".join((topic or "").lower().split()).rstrip(" .?!")
+
+
+def job_key(topic: str, **options: Any) -> str:
+    """Identity of a report job: the normalized topic plus its options."""
+    payload = json.dumps({"topic": normalize_topic(topic), "options": options}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobRegistry:
+    """
+    Report jobs by job key, shared by every worker through SQLite.
+
+    The first submission of a key claims it and runs the pipeline; identical
+    submissions arriving while it is queued or running attach to it, get
+    its run id and wait for its outcome instead of starting a pipeline of
+    their own. A job whose owning process died, or that has been running
+    longer than stale_seconds, no longer absorbs submissions.
+
+    Submissions that pass a waiter_id to claim() are tracked as waiting for
+    the job (the owner's included) until it finishes or they leave(); the
+    last one to leave cancels it, since nobody wants its result any more.
+    """
+
+    def __init__(self, path: Path, stale_seconds: int = JOB_STALE_SECONDS):
+        self.path = Path(path)
+        self.stale_seconds = stale_seconds
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode; claim() takes its own write lock with BEGIN IMMEDIATE.
+        conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _is_live(self, row: Dict[str, Any], now: float) -> bool:
+        return (
+            row["status"] in ACTIVE_STATUSES
+            and now - row["created_at"] < self.stale_seconds
+            and _pid_alive(row["owner_pid"])
+        )
+
+    def claim(
+        self,
+        key: str,
+        run_id: str,
+        reuse_seconds: int = JOB_REUSE_SECONDS,
+        waiter_id: Optional[str] = None,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Returns (job, owned). owned is True if run_id now owns the key and
+        the caller must run the job; otherwise job is the live (or, within
+        reuse_seconds, recently finished) job to attach to. With waiter_id
+        the caller is registered as waiting for the owned or live job.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT * FROM jobs WHERE job_key = ?", (key,)).fetchone()
+                if row is not None:
+                    row = dict(row)
+                    if self._is_live(row, now):
+                        if waiter_id is not None:
+                            self._add_waiter(conn, key, row["run_id"], waiter_id)
+                        conn.execute("COMMIT")
+                        return row, False
+                    if (
+                        row["status"] == "done"
+                        and reuse_seconds > 0
+                        and now - (row["finished_at"] or 0) <= reuse_seconds
+                    ):
+                        conn.execute("COMMIT")
+                        return row, False
+
+                conn.execute(
+                    "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                    (now - max(JOB_ROW_TTL_SECONDS, reuse_seconds),),
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO jobs (job_key, run_id, status, owner_pid, created_at) "
+                    "VALUES (?, ?, 'queued', ?, ?)",
+                    (key, run_id, os.getpid(), now),
+                )
+                conn.execute("DELETE FROM job_waiters WHERE job_key = ? AND run_id != ?", (key, run_id))
+                if waiter_id is not None:
+                    self._add_waiter(conn, key, run_id, waiter_id)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return self.get(key), True
+
+    def update(
+        self,
+        key: str,
+        run_id: str,
+        status: str,
+        error: Optional[str] = None,
+        retry_after: Optional[int] = None,
+    ) -> None:
+        """Set the status of run_id's job; no-op if the key was taken over or the job cancelled."""
+        finished_at = None if status in ACTIVE_STATUSES else time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ?, retry_after = ? "
+                "WHERE job_key = ? AND run_id = ? AND status != 'cancelled'",
+                (status, finished_at, error, retry_after, key, run_id),
+            )
+            if finished_at is not None:
+                conn.execute("DELETE FROM job_waiters WHERE job_key = ? AND run_id = ?", (key, run_id))
+
+    @staticmethod
+    def _add_waiter(conn: sqlite3.Connection, key: str, run_id: str, waiter_id: str) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO job_waiters (job_key, run_id, waiter_id, pid) VALUES (?, ?, ?, ?)",
+            (key, run_id, waiter_id, os.getpid()),
+        )
+
+    def _live_waiters(self, conn: sqlite3.Connection, key: str, run_id: str) -> int:
+        pids = [row[0] for row in conn.execute(
+            "SELECT pid FROM job_waiters WHERE job_key = ? AND run_id = ?", (key, run_id)
+        )]
+        return sum(1 for pid in pids if _pid_alive(pid))
+
+    def waiters(self, key: str, run_id: str) -> int:
+        """Submissions (in live processes) still waiting for run_id's job."""
+        with closing(self._connect()) as conn:
+            return self._live_waiters(conn, key, run_id)
+
+    def leave(self, key: str, run_id: str, waiter_id: str) -> bool:
+        """
+        Stop waiting for run_id's job. If no other submission is waiting
+        for it, the unfinished job is cancelled; returns True then.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "DELETE FROM job_waiters WHERE job_key = ? AND run_id = ? AND waiter_id = ?",
+                    (key, run_id, waiter_id),
+                )
+                cancelled = False
+                if self._live_waiters(conn, key, run_id) == 0:
+                    cursor = conn.execute(
+                        "UPDATE jobs SET status = 'cancelled', finished_at = ?, error = 'All clients disconnected' "
+                        "WHERE job_key = ? AND run_id = ? AND status IN ('queued', 'running')",
+                        (time.time(), key, run_id),
+                    )
+                    cancelled = cursor.rowcount > 0
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return cancelled
+
+    def cancel(self, run_id: str) -> bool:
+        """Ask the owner of run_id's unfinished job to stop; False if there is none."""
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ?, error = 'Cancelled by request' "
+                "WHERE run_id = ? AND status IN ('queued', 'running')",
+                (time.time(), run_id),
+            )
+        return cursor.rowcount > 0
+
+    def is_cancelled(self, key: str, run_id: str) -> bool:
+        job = self.get(key)
+        return job is not None and job["run_id"] == run_id and job["status"] == "cancelled"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_key = ?", (key,)).fetchone()
+        return dict(row) if row else None
+
+    def wait(
+        self,
+        key: str,
+        run_id: str,
+        timeout: float = JOB_WAIT_TIMEOUT,
+        poll_interval: float = 0.5,
+        token: Optional[CancelToken] = None,
+        waiter_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Block until run_id's job finishes. Returns the finished job; if
+        the job was abandoned or replaced, or timeout passes, the returned
+        job has status "failed" or "timeout" respectively. If the waiter's
+        own token is cancelled it stops waiting with status "cancelled".
+        A waiter_id that gives up (timeout or cancelled) leaves the job.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(key)
+            if job is None or job["run_id"] != run_id:
+                return {"run_id": run_id, "status": "failed", "error": "Job was abandoned"}
+            if job["status"] not in ACTIVE_STATUSES:
+                return job
+            if not self._is_live(job, time.time()):
+                return dict(job, status="failed", error="Job was abandoned")
+            if time.monotonic() >= deadline:
+                if waiter_id is not None:
+                    self.leave(key, run_id, waiter_id)
+                return dict(job, status="timeout")
+            if token is not None and token.wait(poll_interval):
+                if waiter_id is not None:
+                    self.leave(key, run_id, waiter_id)
+                return dict(job, status="cancelled", error=token.reason)
+            if token is None:
+                time.sleep(poll_interval)
+
+
+def _leave_when_cancelled(
+    jobs: JobRegistry, key: str, run_id: str, waiter_id: str, token: CancelToken
+) -> Callable[[], bool]:
+    """Job-token check: once token fires, leave the job; True if that cancelled it."""
+    left = threading.Event()
+
+    def check() -> bool:
+        if left.is_set() or not token.cancelled:
+            return False
+        left.set()
+        return jobs.leave(key, run_id, waiter_id)
+
+    return check
+
+
+def run_job(
+    jobs: JobRegistry,
+    key: str,
+    run_id: str,
+    generate: Callable[[str], Any],
+    admit: Callable[[], ContextManager],
+    exists: Callable[[str], bool],
+    token: Optional[CancelToken] = None,
+) -> Dict[str, Any]:
+    """
+    Run the report job for key once, or join the identical one in progress.
+
+    The owner runs generate(run_id) inside admit(); a submission that
+    attaches waits for the shared job instead. Returns the finished job
+    with "deduplicated" set for attached submissions (and the owner's
+    generate() return value as "result"). Its status is "done",
+    "failed", "rejected" (with "reason" and "retry_after" when known),
+    "timeout" if the shared job did not finish in time, or "cancelled".
+
+    token belongs to this submission (client disconnect, batch cancel).
+    When it fires, the submission stops waiting; the shared job itself is
+    cancelled only once every submission waiting for it has gone, so the
+    owner's client going away does not throw away work others still
+    want. The job also stops when JobRegistry.cancel() is called for its
+    run id from any process; a submission attached to a job cancelled
+    that way runs it itself.
+    """
+    token = token or CancelToken()
+    waiter_id = uuid.uuid4().hex
+    while True:
+        job, owned = jobs.claim(key, run_id, waiter_id=waiter_id)
+        if not owned and job["status"] == "done" and not exists(job["run_id"]):
+            # The reused report is gone (e.g. deleted); run it again.
+            job, owned = jobs.claim(key, run_id, reuse_seconds=0, waiter_id=waiter_id)
+        if owned:
+            break
+        if job["status"] in ACTIVE_STATUSES:
+            job = jobs.wait(key, job["run_id"], token=token, waiter_id=waiter_id)
+        if job["status"] != "cancelled" or token.cancelled:
+            return dict(job, deduplicated=True)
+
+    job_token = CancelToken(token.check_interval)
+    job_token.add_check(lambda: jobs.is_cancelled(key, run_id), "Cancelled by request")
+    job_token.add_check(_leave_when_cancelled(jobs, key, run_id, waiter_id, token), "All clients disconnected")
+    try:
+        with cancel_scope(job_token), admit():
+            job_token.raise_if_cancelled()
+            jobs.update(key, run_id, "running")
+            result = generate(run_id)
+    except Cancelled as e:
+        jobs.update(key, run_id, "cancelled", error=str(e))
+        return {"run_id": run_id, "status": "cancelled", "error": str(e), "deduplicated": False}
+    except AdmissionRejected as e:
+        jobs.update(key, run_id, "rejected", error=str(e), retry_after=e.retry_after)
+        return {"run_id": run_id, "status": "rejected", "reason": e.reason,
+                "retry_after": e.retry_after, "error": str(e), "deduplicated": False}
+    except Exception as e:
+        jobs.update(key, run_id, "failed", error=str(e))
+        return {"run_id": run_id, "status": "failed", "error": str(e), "deduplicated": False}
+
+    jobs.update(key, run_id, "done")
+    return {"run_id": run_id, "status": "done", "deduplicated": False, "result": result}
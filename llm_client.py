@@ -1,10 +1,19 @@
 import os
 import json
+import threading
 import time
-from typing import List, Dict, Any, Optional
+import contextvars
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterator, Optional
 
 import requests
 
+import cancellation
+from cancellation import Cancelled, CancelToken, check_cancelled, current_token
+from metrics import LLM_CALL_SECONDS
+from tracing import span
+from scheduler import LLM_SCHEDULER
+
 
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
@@ -19,11 +28,97 @@ class LLMError(Exception):
     pass
 
 
+class LLMText(str):
+    """
+    Assistant message text, plus the response's finish_reason ("stop",
+    "length", ...; None if the provider did not say) and its token usage.
+    """
+
+    finish_reason: Optional[str]
+    usage: Dict[str, Any]
+
+    def __new__(cls, content: str, finish_reason: Optional[str] = None, usage: Optional[Dict[str, Any]] = None):
+        text = super().__new__(cls, content)
+        text.finish_reason = finish_reason
+        text.usage = usage or {}
+        return text
+
+
+class UsageMeter:
+    """Totals of the LLM responses received inside a track_usage() block."""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        # USD as reported by OpenRouter usage accounting; None if never reported.
+        self.cost: Optional[float] = None
+
+    def add(self, usage: Dict[str, Any]) -> None:
+        self.calls += 1
+        self.prompt_tokens += int(usage.get("prompt_tokens") or 0)
+        self.completion_tokens += int(usage.get("completion_tokens") or 0)
+        if usage.get("cost") is not None:
+            self.cost = (self.cost or 0.0) + float(usage["cost"])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "llm_calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost": self.cost,
+        }
+
+
+_usage_meter: contextvars.ContextVar[Optional[UsageMeter]] = contextvars.ContextVar("usage_meter", default=None)
+
+
+@contextmanager
+def track_usage() -> Iterator[UsageMeter]:
+    """Count calls, tokens and cost of every call_llm made inside the block."""
+    meter = UsageMeter()
+    token = _usage_meter.set(meter)
+    try:
+        yield meter
+    finally:
+        _usage_meter.reset(token)
+
+
 def _check_api_key() -> None:
     if not OPENROUTER_API_KEY:
         raise LLMError("OPENROUTER_API_KEY is not set in the environment.")
 
 
+def _post(token: Optional[CancelToken], **kwargs: Any) -> requests.Response:
+    """
+    requests.post to OpenRouter that stops waiting as soon as token is
+    cancelled (raising Cancelled). The request runs on a helper thread
+    while this one polls the token; an abandoned request finishes or
+    times out there and its response is dropped.
+    """
+    if token is None:
+        return requests.post(OPENROUTER_URL, **kwargs)
+
+    done = threading.Event()
+    outcome: Dict[str, Any] = {}
+
+    def run() -> None:
+        try:
+            outcome["response"] = requests.post(OPENROUTER_URL, **kwargs)
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            done.set()
+
+    threading.Thread(target=run, name="llm-request", daemon=True).start()
+    while not done.wait(max(token.check_interval, 0.05)):
+        if token.cancelled:
+            raise Cancelled(token.reason)
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["response"]
+
+
 def call_llm(
     messages: List[Dict[str, str]],
     model: Optional[str] = None,
@@ -33,7 +128,8 @@ def call_llm(
     max_retries: int = 2,
 ) -> str:
     """
-    Call OpenRouter chat completions and return the assistant message text.
+    Call OpenRouter chat completions and return the assistant message text
+    (an LLMText, whose finish_reason tells whether max_tokens cut it off).
 
     messages: list of { "role": "system"|"user"|"assistant", "content": "text" }
     model: override model name (defaults to env OPENROUTER_MODEL or 'perplexity/sonar')
@@ -42,7 +138,9 @@ def call_llm(
     timeout: per-request timeout in seconds
     max_retries: number of retries on transient network / 5xx errors
 
-    raises LLMError on any logical / API error.
+    raises LLMError on any logical / API error, and Cancelled once the
+    current job is cancelled: before an attempt starts, during backoff, or
+    while a request is in flight (within the token's check interval).
     """
     _check_api_key()
 
@@ -51,6 +149,8 @@ def call_llm(
         "messages": messages,
         "max_tokens": max_tokens,
         "temperature": temperature,
+        # Ask OpenRouter to report the cost of the call alongside token counts.
+        "usage": {"include": True},
     }
 
     headers = {
@@ -61,43 +161,72 @@ def call_llm(
     }
 
     last_exc: Optional[Exception] = None
+    outcome = "error"
+    started = time.perf_counter()
 
-    for attempt in range(max_retries + 1):
+    with span("llm.call", model=payload["model"], max_tokens=max_tokens) as call_span:
         try:
-            resp = requests.post(
-                OPENROUTER_URL,
-                headers=headers,
-                json=payload,
-                timeout=timeout,
-            )
-
-            try:
-                resp.raise_for_status()
-            except requests.HTTPError as http_err:
-                snippet = resp.text[:300]
-                raise LLMError(
-                    f"OpenRouter HTTP error {resp.status_code}: {http_err}; "
-                    f"body snippet: {snippet}"
-                ) from http_err
-
-            data = resp.json()
-
-            try:
-                return data["choices"][0]["message"]["content"]
-            except (KeyError, IndexError) as e:
-                raise LLMError(
-                    "Unexpected OpenRouter response format. "
-                    f"Raw body: {json.dumps(data)[:500]}"
-                ) from e
-
-        except (requests.Timeout, requests.ConnectionError) as net_err:
-            last_exc = net_err
-            if attempt < max_retries:
-                time.sleep(1.5 * (attempt + 1))
-                continue
-            raise LLMError(f"Network error calling OpenRouter: {net_err}") from net_err
-
-        except requests.RequestException as req_err:
-            raise LLMError(f"Request error calling OpenRouter: {req_err}") from req_err
-
-    raise LLMError(f"Failed to call OpenRouter after {max_retries + 1} attempts: {last_exc}")
+            for attempt in range(max_retries + 1):
+                check_cancelled()
+                try:
+                    with span("llm.attempt", attempt=attempt + 1) as attempt_span:
+                        # Slots are held per attempt, so backoff sleeps leave
+                        # them to other jobs.
+                        with LLM_SCHEDULER.slot():
+                            resp = _post(current_token(), headers=headers, json=payload, timeout=timeout)
+                        if attempt_span:
+                            attempt_span.set(status_code=resp.status_code)
+
+                        try:
+                            resp.raise_for_status()
+                        except requests.HTTPError as http_err:
+                            outcome = "http_error"
+                            snippet = resp.text[:300]
+                            raise LLMError(
+                                f"OpenRouter HTTP error {resp.status_code}: {http_err}; "
+                                f"body snippet: {snippet}"
+                            ) from http_err
+
+                        data = resp.json()
+
+                        try:
+                            choice = data["choices"][0]
+                            text = LLMText(
+                                choice["message"]["content"], choice.get("finish_reason"), data.get("usage")
+                            )
+                        except (KeyError, IndexError) as e:
+                            outcome = "bad_response"
+                            raise LLMError(
+                                "Unexpected OpenRouter response format. "
+                                f"Raw body: {json.dumps(data)[:500]}"
+                            ) from e
+                        if attempt_span:
+                            attempt_span.set(finish_reason=text.finish_reason)
+                        meter = _usage_meter.get()
+                        if meter is not None:
+                            meter.add(text.usage)
+                        outcome = "ok" if text.finish_reason != "length" else "truncated"
+                        return text
+
+                except (requests.Timeout, requests.ConnectionError) as net_err:
+                    last_exc = net_err
+                    if attempt < max_retries:
+                        delay = 1.5 * (attempt + 1)
+                        with span("llm.backoff", seconds=delay):
+                            cancellation.sleep(delay)
+                        continue
+                    outcome = "network_error"
+                    raise LLMError(f"Network error calling OpenRouter: {net_err}") from net_err
+
+                except requests.RequestException as req_err:
+                    outcome = "request_error"
+                    raise LLMError(f"Request error calling OpenRouter: {req_err}") from req_err
+
+            raise LLMError(f"Failed to call OpenRouter after {max_retries + 1} attempts: {last_exc}")
+        except Cancelled:
+            outcome = "cancelled"
+            raise
+        finally:
+            if call_span:
+                call_span.set(outcome=outcome)
+            LLM_CALL_SECONDS.observe(time.perf_counter() - started, model=payload["model"], outcome=outcome)
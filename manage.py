@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Maintenance and bulk commands for the research agent's stored reports."""
+import argparse
+import sys
+from pathlib import Path
+
+from retention import RETENTION_MAX_AGE_DAYS, RETENTION_MAX_BYTES, RETENTION_MAX_REPORTS, enforce_retention
+from search_index import SearchIndex, backfill
+from storage import FilesystemStorage, get_storage, migrate_to_sharded
+
+
+def _history_dir(args) -> Path:
+    if args.history_dir:
+        return Path(args.history_dir)
+    from pipeline import HISTORY_DIR
+    return HISTORY_DIR
+
+
+def cmd_migrate_history(args) -> int:
+    """Move flat history/<run_id>.* files into history/ab/cd/ shards."""
+    history_dir = _history_dir(args)
+    if not args.dry_run:
+        imported = FilesystemStorage(history_dir).import_legacy_meta(remove=True)
+        print(f"Imported {imported} legacy metadata file(s) into {history_dir / 'meta.log'}")
+    moved = migrate_to_sharded(history_dir, dry_run=args.dry_run)
+    verb = "Would move" if args.dry_run else "Moved"
+    print(f"{verb} {moved} run(s) into sharded directories under {history_dir}")
+    return 0
+
+
+def cmd_compact_meta(args) -> int:
+    """Rewrite history/meta.log keeping only live metadata records."""
+    log = FilesystemStorage(_history_dir(args)).meta_log
+    before = log.stats()
+    live = log.compact()
+    print(f"Compacted {log.path}: {live} live record(s), dropped {before['dead']} superseded")
+    return 0
+
+
+def cmd_retention(args) -> int:
+    """Evict old and least-recently-viewed reports beyond the retention caps."""
+    result = enforce_retention(
+        get_storage(_history_dir(args)),
+        max_bytes=args.max_bytes,
+        max_reports=args.max_reports,
+        max_age_days=args.max_age_days,
+        dry_run=args.dry_run,
+        history_dir=_history_dir(args),
+    )
+    verb = "Would evict" if args.dry_run else "Evicted"
+    print(
+        f"{verb} {len(result['evicted'])} report(s) ({result['freed_bytes']} bytes), "
+        f"{result['sessions_removed']} session(s) and {result['traces_removed']} orphaned trace(s); "
+        f"{result['remaining_reports']} report(s) remain"
+    )
+    for eviction in result["evicted"]:
+        print(f"  {eviction['id']}  {eviction['reason']}  {eviction['bytes']} bytes")
+    return 0
+
+
+def cmd_search_index(args) -> int:
+    """Index every stored report for full-text search (and drop deleted ones)."""
+    history_dir = _history_dir(args)
+    index = SearchIndex(history_dir / "search.db")
+    result = backfill(index, get_storage(history_dir), prune=not args.no_prune)
+    print(
+        f"Indexed {result['indexed']} report(s), removed {result['removed']} deleted report(s); "
+        f"{index.count()} report(s) in {index.path}"
+    )
+    return 0
+
+
+def cmd_batch(args) -> int:
+    """Generate reports for every topic of a JSONL file."""
+    import pipeline
+    from batch_runner import run_batch
+
+    if args.history_dir:
+        pipeline.HISTORY_DIR = Path(args.history_dir)
+
+    def progress(record) -> None:
+        detail = record.get("run_id") or record.get("error", "")
+        print(f"  {record['status']:<7} {record.get('seconds', 0):>7.1f}s  {record.get('topic') or ''}  {detail}")
+
+    summary = run_batch(
+        Path(args.input),
+        Path(args.output),
+        concurrency=args.concurrency,
+        rate_per_minute=args.rate_per_minute,
+        llm_concurrency=args.llm_concurrency,
+        resume=not args.no_resume,
+        use_cache=not args.no_cache,
+        prompt_price=args.prompt_price,
+        completion_price=args.completion_price,
+        on_record=progress,
+    )
+    cost_per_report = summary["cost_per_report"]
+    print(
+        f"{'Interrupted' if summary['interrupted'] else 'Finished'}: {summary['ok']} ok, "
+        f"{summary['error']} failed, {summary['invalid']} invalid, {summary['skipped']} already done "
+        f"in {summary['elapsed_seconds']:.1f}s ({summary['reports_per_minute']} reports/min)"
+    )
+    if summary["p50_seconds"] is not None:
+        print(f"Report latency: p50 {summary['p50_seconds']:.1f}s, p95 {summary['p95_seconds']:.1f}s")
+    print(
+        f"LLM: {summary['llm_calls']} call(s), {summary['prompt_tokens']} prompt + "
+        f"{summary['completion_tokens']} completion tokens, ${summary['cost']:.4f}"
+        + (f" (${cost_per_report:.4f}/report)" if cost_per_report is not None else "")
+    )
+    return 130 if summary["interrupted"] else (1 if summary["error"] else 0)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--history-dir", help="History directory (defaults to pipeline.HISTORY_DIR)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    migrate = sub.add_parser("migrate-history", help=cmd_migrate_history.__doc__)
+    migrate.add_argument("--dry-run", action="store_true", help="Only count runs that would move")
+    migrate.set_defaults(func=cmd_migrate_history)
+
+    compact = sub.add_parser("compact-meta", help=cmd_compact_meta.__doc__)
+    compact.set_defaults(func=cmd_compact_meta)
+
+    retention = sub.add_parser("retention", help=cmd_retention.__doc__)
+    retention.add_argument("--max-bytes", type=int, default=RETENTION_MAX_BYTES, help="Total size cap (0 = none)")
+    retention.add_argument("--max-reports", type=int, default=RETENTION_MAX_REPORTS, help="Report count cap (0 = none)")
+    retention.add_argument("--max-age-days", type=float, default=RETENTION_MAX_AGE_DAYS, help="Age cap in days (0 = none)")
+    retention.add_argument("--dry-run", action="store_true", help="Only list what would be evicted")
+    retention.set_defaults(func=cmd_retention)
+
+    search = sub.add_parser("search-index", help=cmd_search_index.__doc__)
+    search.add_argument("--no-prune", action="store_true", help="Keep entries of reports that no longer exist")
+    search.set_defaults(func=cmd_search_index)
+
+    batch = sub.add_parser("batch", help=cmd_batch.__doc__)
+    batch.add_argument("input", help='JSONL file of {"topic": ..., "id"?: ..., "cache"?: bool} lines')
+    batch.add_argument("output", help="JSONL results file; appended to, and used to resume")
+    batch.add_argument("--concurrency", type=int, default=4, help="Reports generated at once")
+    batch.add_argument("--llm-concurrency", type=int, help="LLM calls in flight (defaults to --concurrency)")
+    batch.add_argument("--rate-per-minute", type=float, default=0, help="LLM request budget per minute (0 = none)")
+    batch.add_argument("--no-resume", action="store_true", help="Overwrite the output instead of resuming")
+    batch.add_argument("--no-cache", action="store_true", help="Bypass the similar-topic section cache")
+    batch.add_argument("--prompt-price", type=float, default=0.0,
+                       help="USD per million prompt tokens, if the provider reports no cost")
+    batch.add_argument("--completion-price", type=float, default=0.0,
+                       help="USD per million completion tokens, if the provider reports no cost")
+    batch.set_defaults(func=cmd_batch)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
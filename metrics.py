@@ -0,0 +1,419 @@
+import atexit
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from storage import atomic_write_text
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+
+# Per-process metric files live here so every gunicorn worker's numbers can
+# be summed at scrape time. Can be overridden with env vars:
+#   export METRICS_DIR=/run/research-agent-metrics
+#   export METRICS_FLUSH_SECONDS=1      # max delay before a worker's file is updated
+METRICS_DIR = Path(os.getenv("METRICS_DIR") or Path(tempfile.gettempdir()) / "research_agent_metrics")
+FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "1"))
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labelnames: Sequence[str], labels: Dict[str, Any]) -> LabelKey:
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {sorted(labelnames)}, got {sorted(labels)}")
+    return tuple((name, str(labels[name])) for name in labelnames)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class MetricsRegistry:
+    """
+    Process-local metric values, mirrored to <dir>/<pid>.json.
+
+    Each process only ever writes its own file (atomically, at most every
+    FLUSH_SECONDS), so no cross-process locking is needed. render()
+    merges every live process's file: counters and histograms are summed,
+    gauges are summed over live processes (e.g. active reports per worker).
+    The counters and histograms of a dead process are folded into
+    <dir>/archive.json before its file is removed, so totals never go
+    backwards when gunicorn recycles a worker; its gauges are dropped.
+    """
+
+    def __init__(self, directory: Path = METRICS_DIR, flush_seconds: float = FLUSH_SECONDS):
+        self.directory = Path(directory)
+        self.flush_seconds = flush_seconds
+        self._metrics: Dict[str, "_Metric"] = {}
+        self._lock = threading.RLock()
+        self._last_flush = 0.0
+        self._timer: Optional[threading.Timer] = None
+
+    def register(self, metric: "_Metric") -> "_Metric":
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Duplicate metric: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> "Counter":
+        return self.register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> "Gauge":
+        return self.register(Gauge(self, name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> "Histogram":
+        return self.register(Histogram(self, name, documentation, labelnames, buckets))
+
+    @property
+    def path(self) -> Path:
+        return self.directory / f"{os.getpid()}.json"
+
+    @property
+    def archive_path(self) -> Path:
+        return self.directory / "archive.json"
+
+    @contextmanager
+    def _archive_lock(self) -> Iterator[None]:
+        """Exclusive lock across processes for folding into the archive."""
+        if fcntl is None:
+            yield
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / "archive.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_archive(self) -> Dict[str, Any]:
+        try:
+            return json.loads(self.archive_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            return {}
+
+    def _archive_dead(self, path: Path) -> None:
+        """Fold a dead process's counters and histograms into the archive, then remove its file."""
+        with self._archive_lock():
+            try:
+                dead = json.loads(path.read_text(encoding="utf-8"))
+            except FileNotFoundError:
+                return  # already folded by another process
+            except (OSError, ValueError):
+                dead = {}
+            archive = self._read_archive()
+            with self._lock:
+                metrics = dict(self._metrics)
+            for name, dump in dead.items():
+                metric = metrics.get(name)
+                if metric is not None:
+                    archive[name] = metric.fold(archive.get(name, {}), dump)
+            try:
+                atomic_write_text(self.archive_path, json.dumps(archive, separators=(",", ":")))
+            except OSError:
+                return  # keep the file; folding is retried on the next scrape
+            path.unlink(missing_ok=True)
+
+    def _snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {name: metric.dump() for name, metric in self._metrics.items()}
+
+    def flush(self) -> None:
+        """Write this process's values to its metrics file now."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            snapshot = self._snapshot()
+            self._last_flush = time.monotonic()
+        try:
+            atomic_write_text(self.path, json.dumps(snapshot, separators=(",", ":")))
+        except OSError:
+            pass
+
+    def changed(self) -> None:
+        """Schedule a flush; at most one file write per flush interval."""
+        with self._lock:
+            if self._timer is not None:
+                return
+            delay = self.flush_seconds - (time.monotonic() - self._last_flush)
+            if delay <= 0:
+                flush_now = True
+            else:
+                flush_now = False
+                self._timer = threading.Timer(delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if flush_now:
+            self.flush()
+
+    def _collect(self) -> List[Dict[str, Any]]:
+        """Snapshots of every live process, this one first, then the archive of dead ones."""
+        self.flush()
+        snapshots = [self._snapshot()]
+        own = os.getpid()
+        for path in self.directory.glob("*.json"):
+            try:
+                pid = int(path.stem)
+            except ValueError:
+                continue
+            if pid == own:
+                continue
+            if not _pid_alive(pid):
+                self._archive_dead(path)
+                continue
+            try:
+                snapshots.append(json.loads(path.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                continue
+        snapshots.append(self._read_archive())
+        return snapshots
+
+    def render(self) -> str:
+        """All metrics, merged across processes, in Prometheus text format."""
+        snapshots = self._collect()
+        lines: List[str] = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render([s.get(metric.name, {}) for s in snapshots]))
+        return "\n".join(lines) + "\n"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: MetricsRegistry, name: str, documentation: str, labelnames: Sequence[str]):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelKey, Any] = {}
+
+    def dump(self) -> Dict[str, Any]:
+        return {json.dumps(key): value for key, value in self._values.items()}
+
+    def _merged(self, dumps: List[Dict[str, Any]]) -> Dict[LabelKey, Any]:
+        raise NotImplementedError
+
+    def fold(self, archive: Dict[str, Any], dump: Dict[str, Any]) -> Dict[str, Any]:
+        """Add a dead process's dump to this metric's archived values."""
+        raise NotImplementedError
+
+    def render(self, dumps: List[Dict[str, Any]]) -> List[str]:
+        merged = self._merged(dumps)
+        return [
+            f"{self.name}{_format_labels(key)} {_format_value(value)}"
+            for key, value in sorted(merged.items())
+        ]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if amount < 0:
+            raise ValueError("Counters only go up")
+        key = _label_key(self.labelnames, labels)
+        with self.registry._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self.registry.changed()
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def _merged(self, dumps):
+        merged: Dict[LabelKey, float] = {}
+        for dump in dumps:
+            for key, value in dump.items():
+                key = tuple(tuple(pair) for pair in json.loads(key))
+                merged[key] = merged.get(key, 0) + value
+        return merged
+
+    def fold(self, archive, dump):
+        for key, value in dump.items():
+            archive[key] = archive.get(key, 0) + value
+        return archive
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(self.labelnames, labels)
+        with self.registry._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self.registry.changed()
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def fold(self, archive, dump):
+        # Live-only: a dead process's in-progress work is gone.
+        return archive
+
+    def set(self, value: float, **labels) -> None:
+        key = _label_key(self.labelnames, labels)
+        with self.registry._lock:
+            self._values[key] = value
+        self.registry.changed()
+
+    @contextmanager
+    def track_inprogress(self, **labels) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, documentation, labelnames, buckets):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(self.labelnames, labels)
+        with self.registry._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["counts"][i] += 1
+                    break
+            entry["sum"] += value
+        self.registry.changed()
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def dump(self) -> Dict[str, Any]:
+        return {
+            json.dumps(key): {"counts": list(entry["counts"]), "sum": entry["sum"]}
+            for key, entry in self._values.items()
+        }
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(_label_key(self.labelnames, labels))
+        return sum(entry["counts"]) if entry else 0
+
+    def _merged(self, dumps):
+        merged: Dict[LabelKey, Dict[str, Any]] = {}
+        for dump in dumps:
+            for key, entry in dump.items():
+                key = tuple(tuple(pair) for pair in json.loads(key))
+                target = merged.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0})
+                for i, count in enumerate(entry["counts"][: len(self.buckets)]):
+                    target["counts"][i] += count
+                target["sum"] += entry["sum"]
+        return merged
+
+    def fold(self, archive, dump):
+        for key, entry in dump.items():
+            target = archive.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0})
+            for i, count in enumerate(entry["counts"][: len(self.buckets)]):
+                target["counts"][i] += count
+            target["sum"] += entry["sum"]
+        return archive
+
+    def render(self, dumps: List[Dict[str, Any]]) -> List[str]:
+        lines = []
+        for key, entry in sorted(self._merged(dumps).items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry["counts"]):
+                cumulative += count
+                le = _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', le),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(entry['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+REGISTRY = MetricsRegistry()
+atexit.register(REGISTRY.flush)
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "research_agent_http_requests_total", "HTTP requests by endpoint, method and status.",
+    ("endpoint", "method", "status"),
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "research_agent_stage_duration_seconds", "Pipeline stage latency.", ("stage",),
+)
+LLM_CALL_SECONDS = REGISTRY.histogram(
+    "research_agent_llm_call_duration_seconds", "call_llm latency (including retries) by model and outcome.",
+    ("model", "outcome"),
+)
+LLM_WAIT_SECONDS = REGISTRY.histogram(
+    "research_agent_llm_wait_seconds", "Time LLM calls waited for a scheduler slot, by priority class.",
+    ("priority",),
+)
+SECTION_FALLBACKS = REGISTRY.counter(
+    "research_agent_section_fallbacks_total", "Sections that ended with the generic fallback body.",
+)
+SECTION_CONTINUATIONS = REGISTRY.counter(
+    "research_agent_section_continuations_total", "Continuation calls made for cut-off section replies.",
+)
+SECTION_CACHE_HITS = REGISTRY.counter(
+    "research_agent_section_cache_hits_total", "Sections served from the similar-topic section cache.",
+)
+REPORTS = REGISTRY.counter(
+    "research_agent_reports_total", "Finished report runs by outcome.", ("outcome",),
+)
+ACTIVE_REPORTS = REGISTRY.gauge(
+    "research_agent_active_reports", "Reports currently being generated.",
+)
+QUEUE_DEPTH = REGISTRY.gauge(
+    "research_agent_queue_depth", "Report requests waiting for a generation slot.",
+)
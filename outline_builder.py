@@ -2,6 +2,7 @@ import json
 from typing import List, Dict, Any
 
 from llm_client import call_llm, LLMError
+from query_ranker import select_queries, OUTLINE_TOKEN_BUDGET
 
 
 OUTLINE_SYSTEM = """You are an academic research planning agent.
@@ -76,7 +77,9 @@ def build_outline(topic: str, queries: List[str]) -> List[Dict[str, Any]]:
     if not topic:
         raise ValueError("Empty topic passed to build_outline")
 
-    queries_text = "\n".join(f"- {q}" for q in (queries or []))
+    # The outline needs breadth across angles, so only the token budget applies.
+    queries = select_queries(queries or [], topic, top_k=0, token_budget=OUTLINE_TOKEN_BUDGET)
+    queries_text = "\n".join(f"- {q}" for q in queries)
 
     user_prompt = f"""
 Topic:
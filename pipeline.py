@@ -1,54 +1,204 @@
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-import json
-import re
-from typing import Dict, Any, List, Tuple
+import os
+import sqlite3
+from typing import Dict, Any, Iterator, List, Optional
 
+from cancellation import Cancelled, check_cancelled
 from llm_client import call_llm
 from query_refiner import refine_topic_to_queries
 from outline_builder import build_outline
 from section_researcher import research_section
-from html_writer import save_html as write_pretty_html
+from report_document import build_document, dump_document, load_document
+from citations import normalize_citations
+from source_registry import SourceRegistry
+from source_store import SourceStore
+from search_index import SearchIndex
+from section_cache import SectionCache, SECTION_CACHE_ENABLED
+from storage import get_storage
+from metrics import (
+    ACTIVE_REPORTS,
+    REPORTS,
+    SECTION_CACHE_HITS,
+    SECTION_CONTINUATIONS,
+    SECTION_FALLBACKS,
+    STAGE_SECONDS,
+)
+from tracing import Span, span, start_trace, trace_dir
 
 
 BASE_DIR = Path(__file__).resolve().parent
 HISTORY_DIR = BASE_DIR / "history"
 HISTORY_DIR.mkdir(exist_ok=True)
 
+# Cross-report source knowledge base; disable with SOURCE_STORE_ENABLED=0
+SOURCE_STORE_ENABLED = os.getenv("SOURCE_STORE_ENABLED", "1") != "0"
+KNOWN_SOURCES_PER_SECTION = int(os.getenv("KNOWN_SOURCES_PER_SECTION", "5"))
 
-def _source_key(src: Dict[str, Any]) -> Tuple[str, str]:
-    title = (src.get("title") or "").strip().lower()
-    url = (src.get("url") or "").strip().lower()
-    return (title, url)
+# Full-text report search (GET /search); disable with SEARCH_INDEX_ENABLED=0
+SEARCH_INDEX_ENABLED = os.getenv("SEARCH_INDEX_ENABLED", "1") != "0"
 
 
-def generate_full_report(user_topic: str, run_id: str, report_type: str = "research") -> Dict[str, Any]:
+def _source_store() -> Optional[SourceStore]:
+    if not SOURCE_STORE_ENABLED:
+        return None
+    try:
+        return SourceStore(HISTORY_DIR / "sources.db")
+    except sqlite3.Error:
+        return None
+
+
+def _search_index() -> Optional[SearchIndex]:
+    if not SEARCH_INDEX_ENABLED:
+        return None
+    try:
+        return SearchIndex(HISTORY_DIR / "search.db")
+    except sqlite3.Error:
+        return None
+
+
+def _index_for_search(doc: Dict[str, Any]) -> None:
+    index = _search_index()
+    if index is None:
+        return
+    try:
+        with span("search_index.put"):
+            index.index_document(doc)
+    except sqlite3.Error:
+        pass
+
+
+def _section_cache(use_cache: bool) -> Optional[SectionCache]:
+    if not (use_cache and SECTION_CACHE_ENABLED):
+        return None
+    try:
+        return SectionCache(HISTORY_DIR / "section_cache.db")
+    except sqlite3.Error:
+        return None
+
+
+@contextmanager
+def _stage(name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+    """
+    Time a pipeline stage for both /metrics and the run's trace. Stages
+    are cancellation points: once the job is cancelled, none start.
+    """
+    check_cancelled()
+    with STAGE_SECONDS.time(stage=name), span(name, **attrs) as stage_span:
+        yield stage_span
+
+
+def _research_section_cached(
+    cache: Optional[SectionCache],
+    store: Optional[SourceStore],
+    topic: str,
+    queries: List[str],
+    sec_title: str,
+    sec_goal: str,
+) -> Dict[str, Any]:
+    if cache is not None:
+        try:
+            cached = cache.get(topic, sec_title, sec_goal)
+        except sqlite3.Error:
+            cached = None
+        if cached is not None:
+            SECTION_CACHE_HITS.inc()
+            return cached
+
+    known = _known_sources(store, sec_title, sec_goal)
+    result = research_section(topic, queries, sec_title, sec_goal, known_sources=known)
+    if result.get("error"):
+        SECTION_FALLBACKS.inc()
+    if result.get("continuations"):
+        SECTION_CONTINUATIONS.inc(result["continuations"])
+
+    if cache is not None:
+        try:
+            with span("section_cache.put"):
+                cache.put(topic, sec_title, sec_goal, result)
+        except sqlite3.Error:
+            pass
+    return result
+
+
+def _known_sources(store: Optional[SourceStore], sec_title: str, sec_goal: str) -> List[Dict[str, Any]]:
+    if store is None or KNOWN_SOURCES_PER_SECTION <= 0:
+        return []
+    try:
+        return store.search(f"{sec_title} {sec_goal}", limit=KNOWN_SOURCES_PER_SECTION)
+    except sqlite3.Error:
+        return []
+
+
+def generate_full_report(
+    user_topic: str,
+    run_id: str,
+    report_type: str = "research",
+    use_cache: bool = True,
+) -> Dict[str, Any]:
     """
     Entry point called from app.py.
     Generates research reports.
+
+    use_cache: set False to bypass the similar-topic section cache.
+    Raises Cancelled, skipping the remaining stages, once the token of the
+    enclosing cancellation.cancel_scope is cancelled.
     """
-    return _generate_research_report(user_topic, run_id, report_type="research")
+    with ACTIVE_REPORTS.track_inprogress(), \
+            start_trace(run_id, trace_dir(HISTORY_DIR), "report", use_cache=use_cache):
+        try:
+            result = _generate_research_report(user_topic, run_id, report_type="research", use_cache=use_cache)
+        except Cancelled:
+            REPORTS.inc(outcome="cancelled")
+            raise
+        except Exception:
+            REPORTS.inc(outcome="error")
+            raise
+    REPORTS.inc(outcome="ok")
+    return result
 
 
-def _generate_research_report(user_topic: str, run_id: str, report_type: str = "research") -> Dict[str, Any]:
+def _generate_research_report(
+    user_topic: str,
+    run_id: str,
+    report_type: str = "research",
+    use_cache: bool = True,
+) -> Dict[str, Any]:
     user_topic = (user_topic or "").strip()
     if not user_topic:
         raise ValueError("Topic is empty")
 
     # 0) Refinement
-    refinement = refine_topic_to_queries(user_topic, n_queries=10)
+    with _stage("refine"):
+        refinement = refine_topic_to_queries(user_topic, n_queries=10)
     refined_topic = refinement["topic"]
     queries = refinement["queries"]
 
     # 1) Outline
-    outline_sections = build_outline(refined_topic, queries)
+    with _stage("outline") as stage_span:
+        outline_sections = build_outline(refined_topic, queries)
+        if stage_span:
+            stage_span.set(sections=len(outline_sections))
 
     # 2) Research each section
+    store = _source_store()
+    cache = _section_cache(use_cache)
+    cache_hits = 0
     section_blocks: List[Dict[str, Any]] = []
     for sec in outline_sections:
         sec_title = sec["title"]
         sec_goal = sec["goal"]
-        result = research_section(refined_topic, queries, sec_title, sec_goal)
+        with _stage("section", title=sec_title) as stage_span:
+            result = _research_section_cached(cache, store, refined_topic, queries, sec_title, sec_goal)
+            if stage_span:
+                stage_span.set(
+                    cached="cache" in result,
+                    fallback=bool(result.get("error")),
+                    continuations=result.get("continuations", 0),
+                )
+        if "cache" in result:
+            cache_hits += 1
         section_blocks.append(
             {
                 "title": sec_title,
@@ -59,75 +209,35 @@ def _generate_research_report(user_topic: str, run_id: str, report_type: str = "
         )
 
     # 3) Build global_sources (dedup) and normalized bodies
-    global_sources: List[Dict[str, Any]] = []
-    source_key_to_global_id: Dict[Tuple[str, str], int] = {}
-
-    for block in section_blocks:
-        for src in block["sources"]:
-            key = _source_key(src)
-            if not key[0] and not key[1]:
-                continue
-            if key in source_key_to_global_id:
-                continue
-            global_id = len(global_sources) + 1
-            source_key_to_global_id[key] = global_id
-            global_sources.append(
-                {
-                    "global_id": global_id,
-                    "title": src.get("title", "Untitled source"),
-                    "url": (src.get("url") or "").strip(),
-                    "source_type": src.get("source_type", "unspecified"),
-                    "why_relevant": src.get("why_relevant", ""),
-                }
-            )
-
-    citation_pattern = re.compile(r"\[(\d+)\]")
-
-    global_sections: List[Dict[str, str]] = []
-
-    for block in section_blocks:
-        body = block["body"]
-
-        def _replace(match):
-            local_id_str = match.group(1)
-            try:
-                local_id = int(local_id_str)
-            except ValueError:
-                return match.group(0)
-
-            src = next(
-                (s for s in block["sources"] if int(s.get("id", -1)) == local_id),
-                None,
-            )
-            if not src:
-                return match.group(0)
-
-            key = _source_key(src)
-            global_id = source_key_to_global_id.get(key)
-            if not global_id:
-                return match.group(0)
-
-            return f"[{global_id}]"
-
-        normalized_body = citation_pattern.sub(_replace, body)
-
-        global_sections.append(
-            {
-                "title": block["title"],
-                "body": normalized_body,
-            }
-        )
+    with _stage("citations"):
+        registry = SourceRegistry()
+        for block in section_blocks:
+            for src in block["sources"]:
+                registry.add(src)
+        global_sources = registry.sources
+
+        global_sections, citation_issues = normalize_citations(section_blocks, registry.resolve)
+
+    if store is not None:
+        try:
+            with span("source_store.record_run"):
+                store.record_run(run_id, refined_topic, section_blocks)
+        except sqlite3.Error:
+            pass
 
-    # 4) Write pretty HTML
-    html_path = HISTORY_DIR / f"{run_id}.html"
-    write_pretty_html(
+    # 4) Structured document: the canonical artifact, rendered on view
+    created_at = datetime.utcnow().isoformat() + "Z"
+    doc = build_document(
+        run_id=run_id,
         topic=refined_topic,
-        sections=global_sections,
+        user_topic=user_topic,
+        outline=outline_sections,
+        sections=[dict(sec, goal=block["goal"]) for sec, block in zip(global_sections, section_blocks)],
         sources=global_sources,
-        output_path=str(html_path),
+        created_at=created_at,
     )
 
-    # 5) Write metadata JSON
+    # 5) Persist document and metadata in one batched, atomic write
     meta = {
         "id": run_id,
         "user_topic": user_topic,
@@ -135,17 +245,118 @@ def _generate_research_report(user_topic: str, run_id: str, report_type: str = "
         "report_type": report_type,
         "queries": queries,
         "outline_sections": outline_sections,
-        "created_at": datetime.utcnow().isoformat() + "Z",
-        "html_filename": f"{run_id}.html",
+        "citation_issues": citation_issues,
+        "section_cache_hits": cache_hits,
+        "source_dedup": [d for d in registry.decisions if d["action"] != "new"],
+        "created_at": created_at,
     }
-    meta_path = HISTORY_DIR / f"{run_id}.json"
-    meta_path.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+    storage = get_storage(HISTORY_DIR)
+    with _stage("persist", backend=type(storage).__name__):
+        storage.save_report(run_id, {"doc": dump_document(doc)}, meta)
+    _index_for_search(doc)
 
     return {
         "id": run_id,
         "topic": refined_topic,
-        "html_path": str(html_path),
-        "meta_path": str(meta_path),
+        "doc_path": storage.locate(run_id, "doc"),
+        "meta_path": storage.locate(run_id, "meta"),
     }
 
 
+def regenerate_section(run_id: str, index: int, use_cache: bool = False) -> Dict[str, Any]:
+    """
+    Re-research one section of a stored run (one LLM call) and store its
+    updated document.
+
+    The refined topic and queries come from the run's metadata and the
+    section's title/goal from its stored document. New sources are merged
+    into the existing global numbering, so other sections keep their
+    citations; references only the old section used stay listed.
+
+    Raises LookupError if the run, its document or the section is missing,
+    or if the run is deleted before the new section is saved. If the model
+    fails again, nothing is saved and the result carries "error". Callers
+    must not regenerate sections of one run concurrently (the app holds a
+    "regen:<run_id>" job for the duration).
+    """
+    with ACTIVE_REPORTS.track_inprogress(), \
+            start_trace(run_id, trace_dir(HISTORY_DIR), "regenerate_section", index=index):
+        return _regenerate_section(run_id, index, use_cache)
+
+
+def _regenerate_section(run_id: str, index: int, use_cache: bool) -> Dict[str, Any]:
+    storage = get_storage(HISTORY_DIR)
+    meta = storage.load_meta(run_id)
+    if meta is None:
+        raise LookupError(f"Unknown run: {run_id}")
+    doc = load_document(storage.load_artifact(run_id, "doc"))
+    if doc is None:
+        raise LookupError(f"Run {run_id} has no structured document; regenerate the full report")
+    if not 0 <= index < len(doc["sections"]):
+        raise LookupError(f"Run {run_id} has no section {index}")
+
+    topic = meta.get("refined_topic") or doc.get("topic", "")
+    queries = meta.get("queries") or []
+    sec_title = doc["sections"][index]["title"]
+    sec_goal = doc["sections"][index].get("goal", "")
+
+    store = _source_store()
+    # Never serve the section being replaced from the cache; do store the
+    # fresh result for other runs.
+    with span("section", title=sec_title):
+        result = _research_section_cached(None, store, topic, queries, sec_title, sec_goal)
+    if result.get("error"):
+        return {"id": run_id, "index": index, "title": sec_title, "error": result["error"]}
+
+    cache = _section_cache(use_cache)
+    if cache is not None:
+        try:
+            with span("section_cache.put"):
+                cache.put(topic, sec_title, sec_goal, result)
+        except sqlite3.Error:
+            pass
+
+    block = {"title": sec_title, "goal": sec_goal, "body": result["body"], "sources": result.get("sources", [])}
+    registry = SourceRegistry.from_sources(doc["sources"])
+    for src in block["sources"]:
+        registry.add(src)
+    [new_section], issues = normalize_citations([block], registry.resolve)
+
+    if store is not None:
+        try:
+            with span("source_store.record_run"):
+                store.record_run(run_id, topic, [block])
+        except sqlite3.Error:
+            pass
+
+    sections = list(doc["sections"])
+    sections[index] = dict(new_section, goal=sec_goal)
+    doc = build_document(
+        run_id=run_id,
+        topic=doc.get("topic", topic),
+        user_topic=doc.get("user_topic", meta.get("user_topic", "")),
+        outline=doc.get("outline", []),
+        sections=sections,
+        sources=registry.sources,
+        created_at=doc.get("created_at", meta.get("created_at", "")),
+    )
+    meta = dict(meta)
+    meta["citation_issues"] = [i for i in meta.get("citation_issues", []) if i.get("section") != sec_title] + issues
+    meta["source_dedup"] = meta.get("source_dedup", []) + [d for d in registry.decisions if d["action"] != "new"]
+    meta["regenerated_sections"] = meta.get("regenerated_sections", []) + [
+        {"index": index, "title": sec_title, "at": datetime.utcnow().isoformat() + "Z"}
+    ]
+    # Deleted while the section was researched: saving would bring it back.
+    if not storage.exists(run_id):
+        raise LookupError(f"Run {run_id} was deleted during regeneration")
+    with span("persist", backend=type(storage).__name__):
+        storage.save_report(run_id, {"doc": dump_document(doc)}, meta)
+    _index_for_search(doc)
+
+    return {
+        "id": run_id,
+        "index": index,
+        "title": sec_title,
+        "doc_path": storage.locate(run_id, "doc"),
+        "meta_path": storage.locate(run_id, "meta"),
+    }
@@ -0,0 +1,116 @@
+import math
+import os
+import re
+from collections import Counter
+from typing import List, Optional, Tuple
+
+
+# Defaults can be overridden with env vars:
+#   export SECTION_QUERY_TOP_K=5
+#   export SECTION_QUERY_TOKEN_BUDGET=200
+DEFAULT_TOP_K = int(os.getenv("SECTION_QUERY_TOP_K", "5"))
+DEFAULT_TOKEN_BUDGET = int(os.getenv("SECTION_QUERY_TOKEN_BUDGET", "200"))
+OUTLINE_TOKEN_BUDGET = int(os.getenv("OUTLINE_QUERY_TOKEN_BUDGET", "400"))
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how",
+    "in", "into", "is", "it", "its", "of", "on", "or", "that", "the", "this",
+    "to", "what", "which", "who", "why", "with",
+}
+
+
+def _tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in _STOPWORDS]
+
+
+def _shingles(text: str) -> List[str]:
+    """Unigrams plus adjacent-word bigrams, so phrase matches score higher."""
+    tokens = _tokenize(text)
+    bigrams = [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    return tokens + bigrams
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough prompt-token estimate (~4 characters per token)."""
+    return max(1, len(text or "") // 4)
+
+
+def rank_queries(queries: List[str], section_title: str, section_goal: str = "") -> List[Tuple[float, str]]:
+    """
+    Score every query against the section title and goal with BM25 over
+    token shingles. Returns [(score, query), ...] sorted best first; ties keep
+    the original query order.
+    """
+    docs = [_shingles(q) for q in queries]
+    if not docs:
+        return []
+
+    n_docs = len(docs)
+    avg_len = sum(len(d) for d in docs) / n_docs or 1.0
+
+    doc_freq: Counter = Counter()
+    for d in docs:
+        doc_freq.update(set(d))
+
+    terms = set(_shingles(f"{section_title} {section_goal}"))
+
+    scored: List[Tuple[float, int, str]] = []
+    for idx, (query, doc) in enumerate(zip(queries, docs)):
+        tf = Counter(doc)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * len(doc) / avg_len)
+        score = 0.0
+        for term in terms:
+            freq = tf.get(term, 0)
+            if not freq:
+                continue
+            df = doc_freq[term]
+            idf = math.log((n_docs - df + 0.5) / (df + 0.5) + 1)
+            score += idf * freq * (BM25_K1 + 1) / (freq + norm)
+        scored.append((score, idx, query))
+
+    scored.sort(key=lambda s: (-s[0], s[1]))
+    return [(score, query) for score, _, query in scored]
+
+
+def select_queries(
+    queries: List[str],
+    section_title: str,
+    section_goal: str = "",
+    top_k: Optional[int] = None,
+    token_budget: Optional[int] = None,
+) -> List[str]:
+    """
+    Return the most relevant queries for a section, best first, keeping at
+    most top_k of them and staying within token_budget (estimated tokens of
+    the rendered "- query" lines). The best query is always kept so the
+    prompt never loses all context. Pass top_k=0 / token_budget=0 to disable
+    the respective limit. Non-string entries (an LLM occasionally returns
+    null or a number in the list) are dropped.
+    """
+    queries = [q for q in (queries or []) if isinstance(q, str) and q.strip()]
+    if not queries:
+        return []
+
+    top_k = DEFAULT_TOP_K if top_k is None else top_k
+    token_budget = DEFAULT_TOKEN_BUDGET if token_budget is None else token_budget
+
+    ranked = rank_queries(queries, section_title, section_goal)
+
+    selected: List[str] = []
+    used_tokens = 0
+    for _, query in ranked:
+        if top_k and len(selected) >= top_k:
+            break
+        cost = estimate_tokens(f"- {query}")
+        if token_budget and selected and used_tokens + cost > token_budget:
+            continue
+        selected.append(query)
+        used_tokens += cost
+
+    return selected
@@ -0,0 +1,73 @@
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+
+# Bump when the document layout changes incompatibly.
+DOCUMENT_VERSION = 1
+
+
+def build_document(
+    run_id: str,
+    topic: str,
+    user_topic: str,
+    outline: List[Dict[str, Any]],
+    sections: List[Dict[str, Any]],
+    sources: List[Dict[str, Any]],
+    created_at: str,
+) -> Dict[str, Any]:
+    """
+    Structured report: the outline, each section's citation-normalized
+    body and the global source list. Every output format (HTML, exports)
+    is rendered from this, so presentation changes need no LLM calls.
+    """
+    return {
+        "version": DOCUMENT_VERSION,
+        "id": run_id,
+        "topic": topic,
+        "user_topic": user_topic,
+        "created_at": created_at,
+        "outline": [
+            {"title": sec.get("title", ""), "goal": sec.get("goal", ""), "priority": sec.get("priority")}
+            for sec in outline
+        ],
+        "sections": [
+            {
+                "title": sec.get("title", ""),
+                "goal": sec.get("goal", ""),
+                "body": sec.get("body", ""),
+            }
+            for sec in sections
+        ],
+        "sources": [
+            {
+                "global_id": src.get("global_id"),
+                "title": src.get("title", ""),
+                "url": src.get("url", ""),
+                "source_type": src.get("source_type", ""),
+                "why_relevant": src.get("why_relevant", ""),
+            }
+            for src in sources
+        ],
+    }
+
+
+def dump_document(doc: Dict[str, Any]) -> str:
+    """Canonical JSON text (stable key order, so equal documents hash equally)."""
+    return json.dumps(doc, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def load_document(text: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not text:
+        return None
+    try:
+        doc = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(doc, dict) or doc.get("version") != DOCUMENT_VERSION:
+        return None
+    return doc
+
+
+def document_hash(doc: Dict[str, Any]) -> str:
+    return hashlib.sha256(dump_document(doc).encode("utf-8")).hexdigest()
@@ -0,0 +1,247 @@
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from search_index import SearchIndex
+from source_store import SourceStore
+from storage import SESSIONS_DIR, ReportStorage
+from tracing import delete_trace, trace_dir
+
+
+logger = logging.getLogger(__name__)
+
+# Retention caps; 0 disables a cap. Can be overridden with env vars:
+#   export RETENTION_MAX_BYTES=2000000000       # total size of stored reports
+#   export RETENTION_MAX_REPORTS=5000           # number of stored reports
+#   export RETENTION_MAX_AGE_DAYS=90            # reports and sessions older than this
+#   export RETENTION_INTERVAL_SECONDS=3600      # background sweep interval in the web app
+RETENTION_MAX_BYTES = int(os.getenv("RETENTION_MAX_BYTES", "0"))
+RETENTION_MAX_REPORTS = int(os.getenv("RETENTION_MAX_REPORTS", "0"))
+RETENTION_MAX_AGE_DAYS = float(os.getenv("RETENTION_MAX_AGE_DAYS", "0"))
+RETENTION_INTERVAL_SECONDS = int(os.getenv("RETENTION_INTERVAL_SECONDS", "0"))
+
+
+def retention_enabled() -> bool:
+    return bool(RETENTION_MAX_BYTES or RETENTION_MAX_REPORTS or RETENTION_MAX_AGE_DAYS)
+
+
+def plan_evictions(
+    usage: List[Dict[str, Any]],
+    max_bytes: int = 0,
+    max_reports: int = 0,
+    max_age_days: float = 0,
+    now: Optional[float] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Choose reports to delete from storage.usage() entries.
+
+    Reports past the age cap go first; then the least recently viewed
+    reports are evicted until the count and size caps are met.
+    Returns [{"id", "bytes", "reason"}] in eviction order.
+    """
+    now = time.time() if now is None else now
+    evictions: List[Dict[str, Any]] = []
+    remaining = []
+
+    cutoff = now - max_age_days * 86400 if max_age_days else None
+    for entry in usage:
+        if cutoff is not None and entry["created"] < cutoff:
+            evictions.append({"id": entry["id"], "bytes": entry["bytes"], "reason": "age"})
+        else:
+            remaining.append(entry)
+
+    # Least recently viewed first; never-viewed reports by creation time.
+    remaining.sort(key=lambda e: (e["last_accessed"], e["created"]))
+    total = sum(e["bytes"] for e in remaining)
+    count = len(remaining)
+
+    for entry in remaining:
+        if max_reports and count > max_reports:
+            reason = "count"
+        elif max_bytes and total > max_bytes:
+            reason = "size"
+        else:
+            break
+        evictions.append({"id": entry["id"], "bytes": entry["bytes"], "reason": reason})
+        count -= 1
+        total -= entry["bytes"]
+
+    return evictions
+
+
+def sweep_sessions(
+    sessions_dir: Path = SESSIONS_DIR,
+    max_age_days: float = RETENTION_MAX_AGE_DAYS,
+    now: Optional[float] = None,
+    dry_run: bool = False,
+) -> int:
+    """Remove session directories not modified within max_age_days. Returns how many."""
+    if not max_age_days:
+        return 0
+    sessions_dir = Path(sessions_dir)
+    if not sessions_dir.is_dir():
+        return 0
+    cutoff = (time.time() if now is None else now) - max_age_days * 86400
+
+    removed = 0
+    for session in sessions_dir.iterdir():
+        if not session.is_dir():
+            continue
+        try:
+            newest = max([session.stat().st_mtime] + [p.stat().st_mtime for p in session.iterdir()])
+        except FileNotFoundError:
+            continue
+        if newest >= cutoff:
+            continue
+        removed += 1
+        if not dry_run:
+            shutil.rmtree(session, ignore_errors=True)
+    return removed
+
+
+def delete_report(storage: ReportStorage, run_id: str, history_dir: Optional[Path] = None) -> bool:
+    """
+    Delete a stored report and, given the history directory, what was
+    derived from it there (its trace, search index entry and source store
+    citations). False if the report did not exist.
+    """
+    existed = storage.delete(run_id)
+    if history_dir is not None:
+        delete_trace(trace_dir(history_dir), run_id)
+        search_path = Path(history_dir) / "search.db"
+        if search_path.exists():
+            try:
+                SearchIndex(search_path).remove([run_id])
+            except sqlite3.Error:
+                # /search still drops hits of deleted reports it comes across.
+                logger.warning("Could not remove %s from the search index", run_id, exc_info=True)
+        sources_path = Path(history_dir) / "sources.db"
+        if sources_path.exists():
+            try:
+                SourceStore(sources_path).remove_run(run_id)
+            except sqlite3.Error:
+                logger.warning("Could not remove %s from the source store", run_id, exc_info=True)
+    return existed
+
+
+def sweep_traces(
+    history_dir: Path,
+    exists: Callable[[str], bool],
+    max_age_days: float = RETENTION_MAX_AGE_DAYS,
+    now: Optional[float] = None,
+    dry_run: bool = False,
+) -> int:
+    """
+    Remove traces older than max_age_days whose run has no stored report
+    (failed or cancelled runs). Returns how many.
+    """
+    directory = trace_dir(history_dir)
+    if not max_age_days or not directory.is_dir():
+        return 0
+    cutoff = (time.time() if now is None else now) - max_age_days * 86400
+
+    removed = 0
+    for path in directory.glob("*.jsonl"):
+        try:
+            if path.stat().st_mtime >= cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        if exists(path.stem):
+            continue
+        removed += 1
+        if not dry_run:
+            path.unlink(missing_ok=True)
+    return removed
+
+
+def enforce_retention(
+    storage: ReportStorage,
+    max_bytes: int = RETENTION_MAX_BYTES,
+    max_reports: int = RETENTION_MAX_REPORTS,
+    max_age_days: float = RETENTION_MAX_AGE_DAYS,
+    sessions_dir: Optional[Path] = SESSIONS_DIR,
+    dry_run: bool = False,
+    now: Optional[float] = None,
+    history_dir: Optional[Path] = None,
+) -> Dict[str, Any]:
+    """
+    Apply the retention caps to stored reports (and old session folders).
+    Each eviction goes through delete_report: storage.delete removes the
+    report from the history index before its files, and with history_dir
+    its trace and search index entry go too, as do traces of runs that
+    never stored a report once they are past the age cap.
+    """
+    usage = storage.usage()
+    evictions = plan_evictions(usage, max_bytes, max_reports, max_age_days, now)
+    if not dry_run:
+        for eviction in evictions:
+            delete_report(storage, eviction["id"], history_dir)
+
+    freed = sum(e["bytes"] for e in evictions)
+    sessions = sweep_sessions(sessions_dir, max_age_days, now, dry_run) if sessions_dir else 0
+    traces = sweep_traces(history_dir, storage.exists, max_age_days, now, dry_run) if history_dir else 0
+    if evictions or sessions or traces:
+        logger.info(
+            "Retention: evicted %d report(s) (%d bytes), %d session(s), %d orphaned trace(s)",
+            len(evictions), freed, sessions, traces,
+        )
+    return {
+        "evicted": evictions,
+        "freed_bytes": freed,
+        "sessions_removed": sessions,
+        "traces_removed": traces,
+        "remaining_reports": len(usage) - len(evictions),
+        "remaining_bytes": sum(e["bytes"] for e in usage) - freed,
+    }
+
+
+class RetentionSweeper:
+    """Daemon thread that runs enforce_retention every interval seconds."""
+
+    def __init__(
+        self,
+        storage_factory: Callable[[], ReportStorage],
+        interval: int = RETENTION_INTERVAL_SECONDS,
+        history_dir_factory: Optional[Callable[[], Path]] = None,
+    ):
+        self.storage_factory = storage_factory
+        self.interval = interval
+        self.history_dir_factory = history_dir_factory
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "RetentionSweeper":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="retention-sweeper", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                history_dir = self.history_dir_factory() if self.history_dir_factory else None
+                enforce_retention(self.storage_factory(), history_dir=history_dir)
+            except Exception:
+                logger.exception("Retention sweep failed")
+
+
+def start_background_retention(
+    storage_factory: Callable[[], ReportStorage],
+    history_dir_factory: Optional[Callable[[], Path]] = None,
+) -> Optional[RetentionSweeper]:
+    """Start the sweeper if an interval and at least one cap are configured."""
+    if RETENTION_INTERVAL_SECONDS <= 0 or not retention_enabled():
+        return None
+    return RetentionSweeper(storage_factory, RETENTION_INTERVAL_SECONDS, history_dir_factory).start()
@@ -0,0 +1,253 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from cancellation import CancelToken, Cancelled, current_token
+from metrics import LLM_WAIT_SECONDS
+from tracing import span
+
+
+# Can be overridden with env vars:
+#   export LLM_MAX_CONCURRENCY=4            # LLM calls in flight per worker process (0 = unscheduled)
+#   export SCHEDULER_BATCH_DELAY_SECONDS=30 # how far behind interactive calls a batch call queues
+#   export SCHEDULER_USAGE_HALF_LIFE_SECONDS=120
+#   export SCHEDULER_CLIENT_WEIGHTS="team-key=3,bulk-key=0.5"
+#   export LLM_RATE_PER_MINUTE=0            # LLM requests started per minute per process (0 = no budget)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_RATE_PER_MINUTE = float(os.getenv("LLM_RATE_PER_MINUTE", "0"))
+BATCH_DELAY_SECONDS = float(os.getenv("SCHEDULER_BATCH_DELAY_SECONDS", "30"))
+USAGE_HALF_LIFE_SECONDS = float(os.getenv("SCHEDULER_USAGE_HALF_LIFE_SECONDS", "120"))
+
+# Longest a waiter without a cancellation token sleeps before re-checking
+# whether it is its turn, in case a wake-up was missed.
+WAIT_RECHECK_SECONDS = 1.0
+
+PRIORITIES = ("interactive", "batch")
+DEFAULT_CLIENT = "anonymous"
+
+
+def parse_client_weights(value: Optional[str]) -> Dict[str, float]:
+    """"a=3,b=0.5" -> {"a": 3.0, "b": 0.5}; malformed or non-positive entries are skipped."""
+    weights: Dict[str, float] = {}
+    for item in (value or "").split(","):
+        name, sep, weight = item.strip().rpartition("=")
+        if not sep or not name:
+            continue
+        try:
+            weights[name] = float(weight)
+        except ValueError:
+            continue
+        if weights[name] <= 0:
+            del weights[name]
+    return weights
+
+
+CLIENT_WEIGHTS = parse_client_weights(os.getenv("SCHEDULER_CLIENT_WEIGHTS"))
+
+
+class JobContext:
+    """Who an LLM call is made for: its priority class and client."""
+
+    def __init__(self, priority: str = "interactive", client: Optional[str] = None):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        self.priority = priority
+        self.client = client or DEFAULT_CLIENT
+
+
+_current_job: contextvars.ContextVar[JobContext] = contextvars.ContextVar("llm_job", default=JobContext())
+
+
+@contextmanager
+def job_context(priority: str = "interactive", client: Optional[str] = None) -> Iterator[JobContext]:
+    """Schedule every LLM call made inside the block as priority/client."""
+    token = _current_job.set(JobContext(priority, client))
+    try:
+        yield _current_job.get()
+    finally:
+        _current_job.reset(token)
+
+
+def current_job() -> JobContext:
+    return _current_job.get()
+
+
+class RateBudget:
+    """Token bucket: at most per_minute acquisitions a minute, bursts up to burst."""
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token; returns how long the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            token = current_token()
+            if token is None:
+                time.sleep(delay)
+            elif token.wait(delay):
+                raise Cancelled(token.reason)
+
+
+class _Waiter:
+    def __init__(self, job: JobContext, arrival: float):
+        self.job = job
+        self.arrival = arrival
+
+
+class LLMScheduler:
+    """
+    Hands out at most max_concurrency LLM-call slots, best-ranked waiter
+    first. A waiter's rank is
+
+        arrival + (batch_delay if batch) + client usage / client weight
+
+    in seconds, lowest first. Interactive calls therefore overtake batch
+    calls that arrived up to batch_delay earlier, but no further: a batch
+    call waits at most batch_delay behind newer interactive work (aging).
+    Usage is the client's LLM time with exponential decay, so a client
+    that has been using many slots queues behind light users of the same
+    class in proportion to its weight (fair share).
+
+    With a rate budget, a call that got its slot also waits for a token
+    before starting, which caps requests per minute across all jobs.
+
+    A waiter whose job is cancelled leaves the queue (raising Cancelled)
+    within the token's check interval.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        batch_delay: float = BATCH_DELAY_SECONDS,
+        usage_half_life: float = USAGE_HALF_LIFE_SECONDS,
+        client_weights: Optional[Dict[str, float]] = None,
+        rate_per_minute: float = LLM_RATE_PER_MINUTE,
+    ):
+        self.max_concurrency = max_concurrency
+        self.rate_budget = RateBudget(rate_per_minute) if rate_per_minute > 0 else None
+        self.batch_delay = batch_delay
+        self.usage_half_life = usage_half_life
+        self.client_weights = CLIENT_WEIGHTS if client_weights is None else client_weights
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting: List[_Waiter] = []
+        # client -> (decayed usage seconds, time of last update)
+        self._usage: Dict[str, Tuple[float, float]] = {}
+
+    def usage(self, client: str, now: Optional[float] = None) -> float:
+        value, updated = self._usage.get(client, (0.0, 0.0))
+        if not value:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        return value * 0.5 ** ((now - updated) / self.usage_half_life)
+
+    def _charge(self, client: str, seconds: float) -> None:
+        now = time.monotonic()
+        self._usage[client] = (self.usage(client, now) + seconds, now)
+
+    def rank(self, waiter: _Waiter, now: float) -> float:
+        delay = self.batch_delay if waiter.job.priority == "batch" else 0.0
+        weight = self.client_weights.get(waiter.job.client, 1.0)
+        return waiter.arrival + delay + self.usage(waiter.job.client, now) / weight
+
+    def _next(self) -> Optional[_Waiter]:
+        now = time.monotonic()
+        return min(self._waiting, key=lambda w: self.rank(w, now), default=None)
+
+    def set_rate(self, per_minute: float) -> None:
+        """Change the request budget (0 = none)."""
+        self.rate_budget = RateBudget(per_minute) if per_minute > 0 else None
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+    def _start_if_next(self, waiter: _Waiter) -> bool:
+        """Give waiter a slot if one is free and it is next in line. Call with the lock held."""
+        if self._active >= self.max_concurrency or self._next() is not waiter:
+            return False
+        self._waiting.remove(waiter)
+        self._active += 1
+        # Another slot may still be free for the next waiter in line.
+        self._cond.notify_all()
+        return True
+
+    def _wait_for_turn(self, waiter: _Waiter, token: Optional[CancelToken]) -> None:
+        # Every wait is bounded, so a missed notify costs at most one
+        # interval instead of hanging the caller.
+        interval = token.check_interval if token is not None else WAIT_RECHECK_SECONDS
+        try:
+            while True:
+                # Cancellation checks may hit SQLite or a socket; never make
+                # every slot acquire and release wait on them.
+                if token is not None and token.cancelled:
+                    raise Cancelled(token.reason)
+                with self._cond:
+                    if self._start_if_next(waiter):
+                        return
+                    self._cond.wait(interval)
+        except BaseException:
+            with self._cond:
+                if waiter in self._waiting:
+                    self._waiting.remove(waiter)
+                    # The next waiter in line may be able to go now.
+                    self._cond.notify_all()
+            raise
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold one LLM-call slot for the block, charged to the current job's client."""
+        if self.max_concurrency <= 0:
+            if self.rate_budget is not None:
+                self.rate_budget.acquire()
+            yield
+            return
+
+        job = current_job()
+        token = current_token()
+        waiter = _Waiter(job, time.monotonic())
+        with self._cond:
+            self._waiting.append(waiter)
+            started_now = self._start_if_next(waiter)
+        if not started_now:
+            # The span is opened outside the condition lock: recording it
+            # must never hold up other callers taking or freeing slots.
+            with span("llm.wait", priority=job.priority):
+                self._wait_for_turn(waiter, token)
+        try:
+            if self.rate_budget is not None:
+                self.rate_budget.acquire()
+        except BaseException:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+            raise
+        started = time.monotonic()
+        LLM_WAIT_SECONDS.observe(started - waiter.arrival, priority=job.priority)
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._charge(job.client, time.monotonic() - started)
+                self._cond.notify_all()
+
+
+LLM_SCHEDULER = LLMScheduler()
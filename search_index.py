@@ -0,0 +1,208 @@
+import re
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+
+from report_document import load_document
+from storage import ReportStorage
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT NOT NULL UNIQUE,
+    topic TEXT NOT NULL,
+    user_topic TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5(
+    topic, user_topic, section_titles, section_bodies, source_titles,
+    tokenize = 'porter unicode61'
+);
+"""
+
+# bm25 column weights: topic, user_topic, section_titles, section_bodies, source_titles
+_RANK = "bm25(reports_fts, 10.0, 8.0, 4.0, 1.0, 2.0)"
+
+_QUERY_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+MAX_PER_PAGE = 50
+
+
+def search_query(text: str) -> str:
+    """
+    Free text -> FTS5 query matching reports that contain every word (in
+    any form the porter stemmer folds together). No prefix terms: a short
+    prefix expands to thousands of terms and costs seconds at scale.
+    """
+    return " ".join(f'"{t.lower()}"' for t in _QUERY_TOKEN_RE.findall(text or ""))
+
+
+def document_fields(doc: Dict[str, Any]) -> Dict[str, str]:
+    """Indexed text of a structured report document."""
+    return {
+        "topic": doc.get("topic") or "",
+        "user_topic": doc.get("user_topic") or "",
+        "section_titles": "\n".join(s.get("title") or "" for s in doc.get("sections", [])),
+        "section_bodies": "\n\n".join(s.get("body") or "" for s in doc.get("sections", [])),
+        "source_titles": "\n".join(s.get("title") or "" for s in doc.get("sources", [])),
+    }
+
+
+def meta_fields(meta: Dict[str, Any]) -> Dict[str, str]:
+    """Indexed text of a report that only has metadata (no structured document)."""
+    return {
+        "topic": meta.get("refined_topic") or "",
+        "user_topic": meta.get("user_topic") or "",
+        "section_titles": "\n".join(s.get("title") or "" for s in meta.get("outline_sections", [])),
+        "section_bodies": "",
+        "source_titles": "",
+    }
+
+
+class SearchIndex:
+    """
+    Full-text index over generated reports: refined and original topic,
+    section titles, section bodies and source titles, ranked with BM25.
+
+    Reports are indexed when they are written, so a search is a single
+    FTS5 query and never reads stored reports.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _upsert(self, conn: sqlite3.Connection, run_id: str, created_at: str, fields: Dict[str, str]) -> None:
+        row = conn.execute("SELECT id FROM reports WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            rowid = conn.execute(
+                "INSERT INTO reports (run_id, topic, user_topic, created_at) VALUES (?, ?, ?, ?)",
+                (run_id, fields["topic"], fields["user_topic"], created_at or ""),
+            ).lastrowid
+        else:
+            rowid = row["id"]
+            conn.execute(
+                "UPDATE reports SET topic = ?, user_topic = ?, created_at = ? WHERE id = ?",
+                (fields["topic"], fields["user_topic"], created_at or "", rowid),
+            )
+            conn.execute("DELETE FROM reports_fts WHERE rowid = ?", (rowid,))
+        conn.execute(
+            "INSERT INTO reports_fts (rowid, topic, user_topic, section_titles, section_bodies, source_titles)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (rowid, fields["topic"], fields["user_topic"], fields["section_titles"],
+             fields["section_bodies"], fields["source_titles"]),
+        )
+
+    def index_document(self, doc: Dict[str, Any]) -> None:
+        """Add or replace a report from its structured document."""
+        with closing(self._connect()) as conn, conn:
+            self._upsert(conn, doc["id"], doc.get("created_at", ""), document_fields(doc))
+
+    def index_many(self, entries: Iterable[Dict[str, Any]], batch_size: int = 500) -> int:
+        """
+        Add or replace many reports given as {"id", "created_at", "fields"},
+        batch_size per transaction. Returns how many were indexed.
+        """
+        indexed = 0
+        with closing(self._connect()) as conn:
+            pending = 0
+            for entry in entries:
+                self._upsert(conn, entry["id"], entry.get("created_at", ""), entry["fields"])
+                indexed += 1
+                pending += 1
+                if pending >= batch_size:
+                    conn.commit()
+                    pending = 0
+            if pending:
+                conn.commit()
+        return indexed
+
+    def remove(self, run_ids: Iterable[str]) -> int:
+        removed = 0
+        with closing(self._connect()) as conn, conn:
+            for run_id in run_ids:
+                row = conn.execute("SELECT id FROM reports WHERE run_id = ?", (run_id,)).fetchone()
+                if row is None:
+                    continue
+                conn.execute("DELETE FROM reports_fts WHERE rowid = ?", (row["id"],))
+                conn.execute("DELETE FROM reports WHERE id = ?", (row["id"],))
+                removed += 1
+        return removed
+
+    def run_ids(self) -> List[str]:
+        with closing(self._connect()) as conn:
+            return [row[0] for row in conn.execute("SELECT run_id FROM reports")]
+
+    def count(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+
+    def search(self, text: str, page: int = 1, per_page: int = 20) -> Dict[str, Any]:
+        """
+        One page of reports matching text, best first:
+        {"query", "page", "per_page", "total", "results": [{"id", "topic",
+        "user_topic", "created_at", "snippet", "score"}]}. Snippets mark
+        matched words with [ and ].
+        """
+        page = max(1, page)
+        per_page = min(max(1, per_page), MAX_PER_PAGE)
+        result: Dict[str, Any] = {"query": text, "page": page, "per_page": per_page, "total": 0, "results": []}
+        query = search_query(text)
+        if not query:
+            return result
+
+        with closing(self._connect()) as conn:
+            result["total"] = conn.execute(
+                "SELECT COUNT(*) FROM reports_fts WHERE reports_fts MATCH ?", (query,)
+            ).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT r.run_id, r.topic, r.user_topic, r.created_at, {_RANK} AS score,"
+                " snippet(reports_fts, -1, '[', ']', '…', 16) AS snippet"
+                " FROM reports_fts JOIN reports r ON r.id = reports_fts.rowid"
+                f" WHERE reports_fts MATCH ? ORDER BY {_RANK} LIMIT ? OFFSET ?",
+                (query, per_page, (page - 1) * per_page),
+            ).fetchall()
+        result["results"] = [
+            {
+                "id": row["run_id"],
+                "topic": row["topic"],
+                "user_topic": row["user_topic"],
+                "created_at": row["created_at"],
+                "snippet": row["snippet"],
+                "score": round(-row["score"], 4),
+            }
+            for row in rows
+        ]
+        return result
+
+
+def backfill(index: SearchIndex, storage: ReportStorage, prune: bool = True) -> Dict[str, int]:
+    """
+    Index every stored report (from its document, else its metadata) and,
+    with prune, drop index entries of reports that no longer exist.
+    """
+    metas = storage.list_meta()
+    stored = {meta["id"] for meta in metas if meta.get("id")}
+
+    def entries() -> Iterable[Dict[str, Any]]:
+        for meta in metas:
+            if not meta.get("id"):
+                continue
+            doc = load_document(storage.load_artifact(meta["id"], "doc"))
+            fields = document_fields(doc) if doc is not None else meta_fields(meta)
+            yield {"id": meta["id"], "created_at": meta.get("created_at", ""), "fields": fields}
+
+    indexed = index.index_many(entries())
+    removed = index.remove([run_id for run_id in index.run_ids() if run_id not in stored]) if prune else 0
+    return {"indexed": indexed, "removed": removed}
+
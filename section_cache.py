@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Dict, Optional, Set, Tuple
+
+
+# Can be overridden with env vars:
+#   export SECTION_CACHE_ENABLED=0            # opt out entirely
+#   export SECTION_CACHE_THRESHOLD=0.6        # min n-gram Jaccard for topic and section
+#   export SECTION_CACHE_TTL_SECONDS=604800   # entries older than this are ignored
+#   export SECTION_CACHE_NGRAM_SIZE=1         # word n-gram size used for similarity
+SECTION_CACHE_ENABLED = os.getenv("SECTION_CACHE_ENABLED", "1") != "0"
+DEFAULT_THRESHOLD = float(os.getenv("SECTION_CACHE_THRESHOLD", "0.6"))
+DEFAULT_TTL_SECONDS = int(os.getenv("SECTION_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+NGRAM_SIZE = int(os.getenv("SECTION_CACHE_NGRAM_SIZE", "1"))
+
+# How many index candidates are verified per lookup.
+MAX_CANDIDATES = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    signature TEXT NOT NULL UNIQUE,
+    topic_norm TEXT NOT NULL,
+    section_norm TEXT NOT NULL,
+    result_json TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS terms (
+    term TEXT NOT NULL,
+    entry_id INTEGER NOT NULL REFERENCES entries(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS terms_term ON terms(term);
+CREATE INDEX IF NOT EXISTS terms_entry ON terms(entry_id);
+CREATE INDEX IF NOT EXISTS entries_created ON entries(created_at);
+"""
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "and", "as", "at", "by", "for", "from", "in", "into", "its", "of",
+    "on", "or", "the", "their", "to", "with",
+}
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def normalize_text(text: str) -> str:
+    """Lowercased, stopword-free, lightly stemmed words."""
+    words = [_stem(w) for w in _WORD_RE.findall((text or "").lower()) if w not in _STOPWORDS]
+    return " ".join(words)
+
+
+def ngrams(norm: str, n: int = NGRAM_SIZE) -> Set[str]:
+    words = norm.split()
+    if len(words) < n:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i : i + n]) for i in range(len(words) - n + 1)}
+
+
+def similarity(a: str, b: str, n: int = NGRAM_SIZE) -> float:
+    """Jaccard similarity of the word n-grams of two normalized strings."""
+    ga, gb = ngrams(a, n), ngrams(b, n)
+    if not ga or not gb:
+        return 0.0
+    return len(ga & gb) / len(ga | gb)
+
+
+def _signature(topic_norm: str, section_norm: str) -> str:
+    return hashlib.sha1(f"{topic_norm}|{section_norm}".encode("utf-8")).hexdigest()
+
+
+class SectionCache:
+    """
+    Reuses research_section results across reports on near-identical topics.
+
+    Entries are keyed by the normalized topic plus the section's title and
+    goal. A lookup first tries the exact signature, then pulls candidates
+    that share topic words from an inverted index and serves the best one
+    whose topic and section similarity both reach the threshold.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        threshold: float = DEFAULT_THRESHOLD,
+        ttl_seconds: int = DEFAULT_TTL_SECONDS,
+    ):
+        self.path = Path(path)
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _cutoff(self) -> float:
+        return time.time() - self.ttl_seconds
+
+    def get(self, topic: str, section_title: str, section_goal: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a cached section result for a similar topic/section, or None.
+        Hits carry a "cache" entry describing the match.
+        """
+        topic_norm = normalize_text(topic)
+        section_norm = normalize_text(f"{section_title} {section_goal}")
+        if not topic_norm or not section_norm:
+            return None
+
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT * FROM entries WHERE signature = ? AND created_at >= ?",
+                (_signature(topic_norm, section_norm), self._cutoff()),
+            ).fetchone()
+            if row is not None:
+                return self._hit(row, 1.0, 1.0)
+
+            terms = sorted(set(topic_norm.split()))
+            placeholders = ",".join("?" for _ in terms)
+            candidates = conn.execute(
+                f"SELECT e.* FROM terms t JOIN entries e ON e.id = t.entry_id"
+                f" WHERE t.term IN ({placeholders}) AND e.created_at >= ?"
+                f" GROUP BY e.id ORDER BY COUNT(*) DESC, e.created_at DESC LIMIT ?",
+                (*terms, self._cutoff(), MAX_CANDIDATES),
+            ).fetchall()
+
+        best: Optional[Tuple[float, float, sqlite3.Row]] = None
+        for cand in candidates:
+            topic_sim = similarity(topic_norm, cand["topic_norm"])
+            if topic_sim < self.threshold:
+                continue
+            section_sim = similarity(section_norm, cand["section_norm"])
+            if section_sim < self.threshold:
+                continue
+            if best is None or topic_sim + section_sim > best[0] + best[1]:
+                best = (topic_sim, section_sim, cand)
+
+        if best is None:
+            return None
+        return self._hit(best[2], best[0], best[1])
+
+    def _hit(self, row: sqlite3.Row, topic_sim: float, section_sim: float) -> Dict[str, Any]:
+        result = json.loads(row["result_json"])
+        result["cache"] = {
+            "entry_id": row["id"],
+            "topic_similarity": round(topic_sim, 3),
+            "section_similarity": round(section_sim, 3),
+        }
+        return result
+
+    def put(self, topic: str, section_title: str, section_goal: str, result: Dict[str, Any]) -> bool:
+        """
+        Store a successful section result. Fallback results (with "error")
+        are never cached. Returns True if stored.
+        """
+        if result.get("error"):
+            return False
+        topic_norm = normalize_text(topic)
+        section_norm = normalize_text(f"{section_title} {section_goal}")
+        if not topic_norm or not section_norm:
+            return False
+
+        payload = json.dumps(
+            {"body": result.get("body", ""), "sources": result.get("sources", [])},
+            ensure_ascii=False,
+        )
+        signature = _signature(topic_norm, section_norm)
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM entries WHERE signature = ? OR created_at < ?", (signature, self._cutoff()))
+            cur = conn.execute(
+                "INSERT INTO entries (signature, topic_norm, section_norm, result_json, created_at) VALUES (?, ?, ?, ?, ?)",
+                (signature, topic_norm, section_norm, payload, time.time()),
+            )
+            conn.executemany(
+                "INSERT INTO terms (term, entry_id) VALUES (?, ?)",
+                [(term, cur.lastrowid) for term in sorted(set(topic_norm.split()))],
+            )
+        return True
+
+    def count(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM entries WHERE created_at >= ?", (self._cutoff(),)).fetchone()[0]
@@ -1,7 +1,26 @@
 import json
-from typing import List, Dict, Any
+import os
+from typing import List, Dict, Any, Optional, Tuple
 
 from llm_client import call_llm, LLMError
+from query_ranker import select_queries
+
+
+SECTION_MAX_TOKENS = 1600
+
+# Continuation calls allowed when a reply is cut off; can be overridden:
+#   export SECTION_MAX_CONTINUATIONS=1   # 0 disables continuation
+MAX_CONTINUATIONS = int(os.getenv("SECTION_MAX_CONTINUATIONS", "1"))
+
+# Shortest repeated prefix treated as the model re-sending the end of the
+# cut-off text rather than genuinely new output.
+_MIN_OVERLAP = 20
+
+CONTINUE_PROMPT = (
+    "Your previous reply was cut off by the length limit. Continue it exactly where it stopped: "
+    "output only the remaining characters of the same JSON object, without repeating anything "
+    "and without commentary or code fences."
+)
 
 
 SECTION_SYSTEM = """You are a deep research agent.
@@ -53,15 +72,146 @@ def _robust_json_parse(raw: str) -> Dict[str, Any]:
     return json.loads(sliced)
 
 
+def _scan_json(raw: str) -> Tuple[bool, List[str], bool, List[Tuple[int, str]]]:
+    """
+    Scan raw from its first "{" tracking strings and brackets.
+
+    Returns (complete, closers, in_string, cuts): complete is True once the
+    top-level object closes; closers are the brackets still open (innermost
+    last); cuts are (index, closers) at each top-level-or-deeper comma,
+    i.e. points where the text can be cut and closed into valid JSON.
+    """
+    start = raw.find("{")
+    if start == -1:
+        return False, [], False, []
+    stack: List[str] = []
+    cuts: List[Tuple[int, str]] = []
+    in_string = escaped = False
+    for i in range(start, len(raw)):
+        ch = raw[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            stack.append("}")
+        elif ch == "[":
+            stack.append("]")
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                return True, [], False, cuts
+        elif ch == ",":
+            cuts.append((i, "".join(reversed(stack))))
+    return False, stack, in_string, cuts
+
+
+def _looks_truncated(raw: str) -> bool:
+    """Cut off by max_tokens, or a JSON object that never closes."""
+    if getattr(raw, "finish_reason", None) == "length":
+        return True
+    complete, closers, _, _ = _scan_json(raw)
+    return bool(closers) and not complete
+
+
+def _stitch(prefix: str, continuation: str) -> str:
+    """Join a cut-off reply with its continuation, dropping re-sent text."""
+    more = str(continuation)
+    stripped = more.strip()
+    if stripped.startswith("```"):
+        more = stripped.split("\n", 1)[1] if "\n" in stripped else ""
+        if more.rstrip().endswith("```"):
+            more = more.rstrip()[:-3]
+        stripped = more.strip()
+    if stripped.startswith("{"):
+        # The model started over; keep the restart if it stands on its own.
+        try:
+            json.loads(stripped)
+            return stripped
+        except json.JSONDecodeError:
+            pass
+    for k in range(min(len(prefix), len(more)), _MIN_OVERLAP - 1, -1):
+        if prefix.endswith(more[:k]):
+            return prefix + more[k:]
+    return prefix + more
+
+
+def _repair_truncated_json(raw: str) -> Optional[Dict[str, Any]]:
+    """
+    Best-effort parse of a cut-off JSON object: close the open string and
+    brackets, or cut back to an earlier comma and close from there.
+    """
+    complete, closers, in_string, cuts = _scan_json(raw)
+    if complete or not closers:
+        return None
+    text = raw[raw.find("{"):]
+    offset = raw.find("{")
+
+    closing = "".join(reversed(closers))
+    if in_string:
+        # Close the string; the last character may be a dangling escape.
+        candidates = [text + '"' + closing, text[:-1] + '"' + closing]
+    else:
+        candidates = [text + closing]
+    candidates += [text[: i - offset] + cut_closers for i, cut_closers in reversed(cuts[-50:])]
+
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, dict):
+            return data
+    return None
+
+
+def _complete_truncated(messages: List[Dict[str, str]], raw: str) -> Tuple[str, int]:
+    """
+    Ask the model to continue a cut-off reply (up to MAX_CONTINUATIONS
+    times) and stitch the parts. Returns (stitched_text, calls_made).
+    """
+    stitched = raw
+    calls = 0
+    while calls < MAX_CONTINUATIONS:
+        try:
+            more = call_llm(
+                messages
+                + [
+                    {"role": "assistant", "content": stitched},
+                    {"role": "user", "content": CONTINUE_PROMPT},
+                ],
+                temperature=0.35,
+                max_tokens=SECTION_MAX_TOKENS,
+            )
+        except LLMError:
+            break
+        calls += 1
+        stitched = _stitch(stitched, more)
+        complete, _, _, _ = _scan_json(stitched)
+        if complete:
+            break
+    return stitched, calls
+
+
 def research_section(
     topic: str,
     queries: List[str],
     section_title: str,
     section_goal: str,
+    known_sources: Optional[List[Dict[str, Any]]] = None,
 ) -> Dict[str, Any]:
     """
     Research and write a single section of the report.
 
+    known_sources: optional sources cited by earlier reports that look
+    relevant to this section; they are offered to the model as context.
+
     Returns dict:
     {
       "body": "<text with [1] citations>",
@@ -70,23 +220,38 @@ def research_section(
         ...
       ],
       "raw": "<raw LLM output>",
+      "continuations": <optional, continuation calls made for a cut-off reply>,
+      "repaired": <optional, True if a cut-off reply was closed up to parse>,
       "error": "<optional>"
     }
     """
     topic = (topic or "").strip()
     section_title = (section_title or "").strip()
     section_goal = (section_goal or "").strip()
-    queries = queries or []
+    queries = select_queries(queries or [], section_title, section_goal)
 
     queries_text = "\n".join(f"- {q}" for q in queries)
 
+    known_text = ""
+    if known_sources:
+        lines = []
+        for src in known_sources:
+            line = f"- {src.get('title', '')}"
+            if src.get("url"):
+                line += f" ({src['url']})"
+            lines.append(line)
+        known_text = (
+            "\nPreviously cited sources that may be relevant "
+            "(reuse them only where they genuinely support a claim):\n" + "\n".join(lines) + "\n"
+        )
+
     user_prompt = f"""
 Overall topic:
 {topic}
 
 Relevant research sub-queries (for context):
 {queries_text}
-
+{known_text}
 Section to write:
 "{section_title}"
 
@@ -102,17 +267,30 @@ Requirements:
 - Return ONLY JSON as described in the schema.
 """
 
+    messages = [
+        {"role": "system", "content": SECTION_SYSTEM},
+        {"role": "user", "content": user_prompt},
+    ]
+    continuations = 0
+    repaired = False
+
     try:
-        raw = call_llm(
-            [
-                {"role": "system", "content": SECTION_SYSTEM},
-                {"role": "user", "content": user_prompt},
-            ],
-            temperature=0.35,
-            max_tokens=1600,
-        )
+        raw = call_llm(messages, temperature=0.35, max_tokens=SECTION_MAX_TOKENS)
 
-        data = _robust_json_parse(raw)
+        try:
+            data = _robust_json_parse(raw)
+        except (ValueError, json.JSONDecodeError):
+            if not _looks_truncated(raw):
+                raise
+            # Cut off mid-object: continue it instead of discarding it.
+            raw, continuations = _complete_truncated(messages, raw)
+            try:
+                data = _robust_json_parse(raw)
+            except (ValueError, json.JSONDecodeError):
+                data = _repair_truncated_json(raw)
+                if data is None:
+                    raise
+                repaired = True
 
         body = str(data.get("body", "")).strip()
         sources_raw = data.get("sources", [])
@@ -149,11 +327,16 @@ Requirements:
                 f"but the research assistant failed to provide detailed text."
             )
 
-        return {
+        result = {
             "body": body,
             "sources": norm_sources,
             "raw": raw,
         }
+        if continuations:
+            result["continuations"] = continuations
+        if repaired:
+            result["repaired"] = True
+        return result
 
     except (LLMError, ValueError, json.JSONDecodeError) as e:
         fallback_body = (
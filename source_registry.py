@@ -0,0 +1,305 @@
+import os
+import random
+import re
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+
+# Jaccard similarity of title shingles above which two titles are the same
+# work. Can be overridden with env var:
+#   export SOURCE_TITLE_SIMILARITY=0.8
+DEFAULT_TITLE_THRESHOLD = float(os.getenv("SOURCE_TITLE_SIMILARITY", "0.8"))
+
+# Titles shorter than this (in words) are too generic to merge on title alone
+# ("Home", "Annual Report"); they additionally need a matching URL.
+MIN_TITLE_WORDS = 4
+
+# MinHash / LSH parameters: 32 hashes in 8 bands of 4 rows puts the
+# candidate threshold at roughly 0.6 Jaccard; candidates are then verified
+# against the exact shingle sets.
+NUM_PERM = 32
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+_MERSENNE_PRIME = (1 << 61) - 1
+
+_rng = random.Random(1729)
+_HASH_PARAMS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+_TRACKING_PARAMS = {"fbclid", "gclid", "msclkid", "mc_cid", "mc_eid", "ref", "ref_src", "igshid", "_hsenc", "_hsmi"}
+_DOI_RE = re.compile(r"(10\.\d{4,9}/[^\s?#]+)", re.IGNORECASE)
+_DOI_HOSTS = {"doi.org", "dx.doi.org"}
+_DOI_VIEW_SUFFIXES = ("/abstract", "/full", "/pdf", "/epdf")
+_TITLE_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Reduce a URL to a canonical identity string:
+    - DOIs (doi:..., doi.org/..., publisher /doi/... pages) become "doi:10.xxxx/..."
+    - scheme, "www.", default ports, fragments and trailing slashes are dropped
+    - utm_* and other tracking parameters are removed, the rest sorted
+    Placeholders without a host ("N/A") give "", malformed URLs their
+    lowercased text.
+    """
+    url = (url or "").strip()
+    if not url:
+        return ""
+
+    lowered = url.lower()
+    if lowered.startswith("doi:"):
+        return "doi:" + lowered[4:].strip()
+
+    has_scheme = "://" in url
+    if not has_scheme:
+        url = "http://" + url
+
+    try:
+        parts = urlsplit(url)
+        port_number = parts.port
+    except ValueError:
+        # Malformed (bad IPv6 literal, non-numeric port): compare as written.
+        return lowered
+    host = (parts.hostname or "").lower()
+    # Placeholders the model puts in ("N/A", "none") are no URL at all.
+    if not host or (not has_scheme and "." not in host):
+        return ""
+    if host.startswith("www."):
+        host = host[4:]
+
+    # doi.org resolvers and publisher pages like /doi/abs/10.1002/xyz
+    if host in _DOI_HOSTS or "/doi/" in parts.path.lower():
+        match = _DOI_RE.search(parts.path)
+        if match:
+            doi = match.group(1).lower().rstrip("/")
+            for suffix in _DOI_VIEW_SUFFIXES:
+                if doi.endswith(suffix):
+                    doi = doi[: -len(suffix)]
+            return "doi:" + doi
+
+    port = ""
+    if port_number and port_number not in (80, 443):
+        port = f":{port_number}"
+
+    path = re.sub(r"/{2,}", "/", parts.path).rstrip("/")
+    for suffix in ("/index.html", "/index.htm"):
+        if path.endswith(suffix):
+            path = path[: -len(suffix)]
+
+    params = [
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in _TRACKING_PARAMS
+    ]
+    query = urlencode(sorted(params))
+
+    canonical = f"{host}{port}{path}"
+    if query:
+        canonical += "?" + query
+    return canonical.lower()
+
+
+def normalize_title(title: str) -> str:
+    return " ".join(_TITLE_TOKEN_RE.findall((title or "").lower()))
+
+
+def title_shingles(title: str, k: int = 3) -> Set[str]:
+    """Character k-grams of the normalized title (whole title if shorter)."""
+    norm = normalize_title(title)
+    if len(norm) <= k:
+        return {norm} if norm else set()
+    return {norm[i : i + k] for i in range(len(norm) - k + 1)}
+
+
+def minhash_signature(shingles: Set[str]) -> Tuple[int, ...]:
+    hashed = [zlib.crc32(s.encode("utf-8")) for s in shingles]
+    return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashed) for a, b in _HASH_PARAMS)
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _has_specific_path(canonical_url: str) -> bool:
+    """A bare domain ("who.int") is too generic to identify a single source."""
+    return canonical_url.startswith("doi:") or "/" in canonical_url or "?" in canonical_url
+
+
+class SourceRegistry:
+    """
+    Global, deduplicated list of report sources.
+
+    Sources are matched on canonical URL first, then on exact or
+    near-duplicate normalized titles found through a MinHash LSH index, so a
+    lookup never compares against every registered source. Every add() is
+    recorded in `decisions`.
+    """
+
+    def __init__(self, title_threshold: float = DEFAULT_TITLE_THRESHOLD):
+        self.title_threshold = title_threshold
+        self.sources: List[Dict[str, Any]] = []
+        self.decisions: List[Dict[str, Any]] = []
+
+        self._by_url: Dict[str, int] = {}
+        self._url_of: Dict[int, str] = {}
+        self._by_title: Dict[str, int] = {}
+        self._bands: Dict[Tuple[int, Tuple[int, ...]], Set[int]] = defaultdict(set)
+        self._shingles: Dict[int, Set[str]] = {}
+        self._resolved: Dict[Tuple[str, str], Optional[int]] = {}
+
+    @classmethod
+    def from_sources(
+        cls,
+        sources: List[Dict[str, Any]],
+        title_threshold: float = DEFAULT_TITLE_THRESHOLD,
+    ) -> "SourceRegistry":
+        """
+        Registry pre-filled with an existing global source list (e.g. a
+        stored report's), keeping every global id as is. Sources are taken
+        verbatim, without merging, so existing numbering never changes.
+        """
+        registry = cls(title_threshold)
+        for src in sorted(sources, key=lambda s: s.get("global_id") or 0):
+            if src.get("global_id") != len(registry.sources) + 1:
+                raise ValueError("Global source ids must be contiguous from 1")
+            raw_title = (src.get("title") or "").strip()
+            raw_url = (src.get("url") or "").strip()
+            global_id = registry._append(src, raw_url)
+            registry._index(global_id, normalize_title(raw_title), canonicalize_url(raw_url), title_shingles(raw_title))
+            registry._resolved[(raw_title.lower(), raw_url.lower())] = global_id
+        return registry
+
+    def __len__(self) -> int:
+        return len(self.sources)
+
+    def _append(self, src: Dict[str, Any], raw_url: str) -> int:
+        global_id = len(self.sources) + 1
+        self.sources.append(
+            {
+                "global_id": global_id,
+                "title": src.get("title", "Untitled source"),
+                "url": raw_url,
+                "source_type": src.get("source_type", "unspecified"),
+                "why_relevant": src.get("why_relevant", ""),
+            }
+        )
+        return global_id
+
+    def _match(self, title_norm: str, canonical_url: str, shingles: Set[str]) -> Tuple[Optional[int], str, float]:
+        if canonical_url and canonical_url in self._by_url:
+            global_id = self._by_url[canonical_url]
+            existing = normalize_title(self.sources[global_id - 1]["title"])
+            if _has_specific_path(canonical_url) or not title_norm or not existing or existing == title_norm:
+                return global_id, "canonical_url", 1.0
+
+        long_title = len(title_norm.split()) >= MIN_TITLE_WORDS
+
+        def _title_ok(global_id: int) -> bool:
+            if long_title:
+                return True
+            existing_url = self._url_of.get(global_id, "")
+            return not canonical_url or not existing_url or existing_url == canonical_url
+
+        if title_norm and title_norm in self._by_title:
+            global_id = self._by_title[title_norm]
+            if _title_ok(global_id):
+                return global_id, "title_exact", 1.0
+
+        if not shingles:
+            return None, "", 0.0
+
+        candidates: Set[int] = set()
+        signature = minhash_signature(shingles)
+        for band in range(BANDS):
+            key = (band, signature[band * ROWS : (band + 1) * ROWS])
+            candidates |= self._bands.get(key, set())
+
+        best_id, best_sim = None, 0.0
+        for global_id in sorted(candidates):
+            sim = jaccard(shingles, self._shingles[global_id])
+            if sim > best_sim:
+                best_id, best_sim = global_id, sim
+
+        if best_id is not None and best_sim >= self.title_threshold and _title_ok(best_id):
+            return best_id, "title_similar", round(best_sim, 3)
+        return None, "", 0.0
+
+    def _index(self, global_id: int, title_norm: str, canonical_url: str, shingles: Set[str]) -> None:
+        if canonical_url:
+            self._by_url.setdefault(canonical_url, global_id)
+            self._url_of.setdefault(global_id, canonical_url)
+        if title_norm:
+            self._by_title.setdefault(title_norm, global_id)
+        if shingles and global_id not in self._shingles:
+            self._shingles[global_id] = shingles
+            signature = minhash_signature(shingles)
+            for band in range(BANDS):
+                self._bands[(band, signature[band * ROWS : (band + 1) * ROWS])].add(global_id)
+
+    def _record(self, title: str, url: str, canonical_url: str, action: str,
+                global_id: Optional[int], reason: str, similarity: float) -> None:
+        self.decisions.append(
+            {
+                "title": title,
+                "url": url,
+                "canonical_url": canonical_url,
+                "action": action,
+                "global_id": global_id,
+                "reason": reason,
+                "similarity": similarity,
+            }
+        )
+
+    def add(self, src: Dict[str, Any]) -> Optional[int]:
+        """
+        Register a section source and return its global id, or None if the
+        source has neither a title nor a URL.
+        """
+        raw_title = (src.get("title") or "").strip()
+        raw_url = (src.get("url") or "").strip()
+        raw_key = (raw_title.lower(), raw_url.lower())
+        if raw_key in self._resolved:
+            global_id = self._resolved[raw_key]
+            action = "merged" if global_id else "skipped"
+            self._record(raw_title, raw_url, canonicalize_url(raw_url), action, global_id, "exact_repeat", 1.0)
+            return global_id
+
+        title_norm = normalize_title(raw_title)
+        canonical_url = canonicalize_url(raw_url)
+
+        if not title_norm and not canonical_url:
+            self._resolved[raw_key] = None
+            self._record(raw_title, raw_url, canonical_url, "skipped", None, "empty", 0.0)
+            return None
+
+        shingles = title_shingles(raw_title)
+        global_id, reason, similarity = self._match(title_norm, canonical_url, shingles)
+
+        if global_id is None:
+            global_id = self._append(src, raw_url)
+            action, reason, similarity = "new", "", 0.0
+        else:
+            action = "merged"
+            existing = self.sources[global_id - 1]
+            if not existing["url"] and raw_url:
+                existing["url"] = raw_url
+
+        self._index(global_id, title_norm, canonical_url, shingles)
+        self._resolved[raw_key] = global_id
+        self._record(raw_title, raw_url, canonical_url, action, global_id, reason, similarity)
+        return global_id
+
+    def resolve(self, src: Dict[str, Any]) -> Optional[int]:
+        """Global id of an already registered source (no new entries)."""
+        raw_key = ((src.get("title") or "").strip().lower(), (src.get("url") or "").strip().lower())
+        if raw_key in self._resolved:
+            return self._resolved[raw_key]
+        global_id, _, _ = self._match(
+            normalize_title(src.get("title") or ""),
+            canonicalize_url(src.get("url") or ""),
+            title_shingles(src.get("title") or ""),
+        )
+        return global_id
@@ -0,0 +1,222 @@
+import re
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from source_registry import canonicalize_url, normalize_title
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    source_key TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    url TEXT NOT NULL,
+    source_type TEXT NOT NULL,
+    why_relevant TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    cite_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS citations (
+    source_id INTEGER NOT NULL REFERENCES sources(id),
+    run_id TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    section TEXT NOT NULL,
+    cited_at TEXT NOT NULL,
+    PRIMARY KEY (source_id, run_id, section)
+);
+CREATE INDEX IF NOT EXISTS citations_run ON citations(run_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS sources_fts USING fts5(title, why_relevant, context);
+"""
+
+_FTS_TOKEN_RE = re.compile(r"[A-Za-z0-9]+")
+
+
+def source_key(src: Dict[str, Any]) -> str:
+    """
+    Canonical URL, or the normalized title for sources without a real URL
+    (missing or a placeholder such as "N/A").
+    """
+    canonical_url = canonicalize_url(src.get("url") or "")
+    if canonical_url:
+        return canonical_url
+    title = normalize_title(src.get("title") or "")
+    return f"title:{title}" if title else ""
+
+
+def _fts_query(text: str) -> str:
+    """OR together the distinct words of free text as quoted FTS5 terms."""
+    terms = []
+    for token in _FTS_TOKEN_RE.findall(text or ""):
+        token = token.lower()
+        if len(token) > 2 and token not in terms:
+            terms.append(token)
+    return " OR ".join(f'"{t}"' for t in terms)
+
+
+class SourceStore:
+    """
+    Persistent knowledge base of every source cited by any report.
+
+    Sources are keyed by canonical URL and record which topics and sections
+    cited them; a full-text index over title, relevance note and citing
+    context answers "which known sources fit this section?" without
+    scanning stored reports.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def record_run(self, run_id: str, topic: str, section_blocks: List[Dict[str, Any]]) -> int:
+        """
+        Upsert the sources cited by each section of a run.
+        Returns the number of (source, section) citations recorded.
+        """
+        now = datetime.utcnow().isoformat() + "Z"
+        recorded = 0
+
+        with closing(self._connect()) as conn, conn:
+            touched = set()
+            for block in section_blocks:
+                section = block.get("title", "")
+                for src in block.get("sources", []):
+                    key = source_key(src)
+                    if not key:
+                        continue
+
+                    row = conn.execute("SELECT id FROM sources WHERE source_key = ?", (key,)).fetchone()
+                    if row is None:
+                        cur = conn.execute(
+                            "INSERT INTO sources (source_key, title, url, source_type, why_relevant, first_seen, last_seen)"
+                            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (
+                                key,
+                                src.get("title") or "Untitled source",
+                                "" if key.startswith("title:") else (src.get("url") or "").strip(),
+                                src.get("source_type") or "unspecified",
+                                src.get("why_relevant") or "",
+                                now,
+                                now,
+                            ),
+                        )
+                        source_id = cur.lastrowid
+                    else:
+                        source_id = row["id"]
+                        conn.execute("UPDATE sources SET last_seen = ? WHERE id = ?", (now, source_id))
+
+                    cur = conn.execute(
+                        "INSERT OR IGNORE INTO citations (source_id, run_id, topic, section, cited_at) VALUES (?, ?, ?, ?, ?)",
+                        (source_id, run_id, topic, section, now),
+                    )
+                    if cur.rowcount:
+                        recorded += 1
+                        conn.execute("UPDATE sources SET cite_count = cite_count + 1 WHERE id = ?", (source_id,))
+                    touched.add(source_id)
+
+            for source_id in touched:
+                self._reindex(conn, source_id)
+
+        return recorded
+
+    def remove_run(self, run_id: str) -> int:
+        """
+        Drop a deleted run's citations. Sources no other run cites are
+        removed; the rest get their count and search context updated.
+        Returns the number of citations removed.
+        """
+        with closing(self._connect()) as conn, conn:
+            source_ids = [
+                row["source_id"]
+                for row in conn.execute("SELECT DISTINCT source_id FROM citations WHERE run_id = ?", (run_id,))
+            ]
+            removed = conn.execute("DELETE FROM citations WHERE run_id = ?", (run_id,)).rowcount
+            for source_id in source_ids:
+                (remaining,) = conn.execute(
+                    "SELECT COUNT(*) FROM citations WHERE source_id = ?", (source_id,)
+                ).fetchone()
+                if remaining:
+                    conn.execute("UPDATE sources SET cite_count = ? WHERE id = ?", (remaining, source_id))
+                    self._reindex(conn, source_id)
+                else:
+                    conn.execute("DELETE FROM sources_fts WHERE rowid = ?", (source_id,))
+                    conn.execute("DELETE FROM sources WHERE id = ?", (source_id,))
+        return removed
+
+    def _reindex(self, conn: sqlite3.Connection, source_id: int) -> None:
+        row = conn.execute("SELECT title, why_relevant FROM sources WHERE id = ?", (source_id,)).fetchone()
+        context = " ".join(
+            f"{c['topic']} {c['section']}"
+            for c in conn.execute("SELECT DISTINCT topic, section FROM citations WHERE source_id = ?", (source_id,))
+        )
+        conn.execute("DELETE FROM sources_fts WHERE rowid = ?", (source_id,))
+        conn.execute(
+            "INSERT INTO sources_fts (rowid, title, why_relevant, context) VALUES (?, ?, ?, ?)",
+            (source_id, row["title"], row["why_relevant"], context),
+        )
+
+    def _row_to_source(self, conn: sqlite3.Connection, row: sqlite3.Row, with_citations: bool) -> Dict[str, Any]:
+        item = {
+            "source_key": row["source_key"],
+            "title": row["title"],
+            "url": row["url"],
+            "source_type": row["source_type"],
+            "why_relevant": row["why_relevant"],
+            "first_seen": row["first_seen"],
+            "last_seen": row["last_seen"],
+            "cite_count": row["cite_count"],
+        }
+        if with_citations:
+            item["citations"] = [
+                dict(c)
+                for c in conn.execute(
+                    "SELECT run_id, topic, section, cited_at FROM citations WHERE source_id = ? ORDER BY cited_at",
+                    (row["id"],),
+                )
+            ]
+        return item
+
+    def get(self, url_or_key: str) -> Optional[Dict[str, Any]]:
+        """Look up one source by URL (any variant) or stored source key."""
+        key = url_or_key if url_or_key.startswith("title:") else canonicalize_url(url_or_key)
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM sources WHERE source_key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            return self._row_to_source(conn, row, with_citations=True)
+
+    def search(self, text: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Known sources ranked by BM25 relevance to free text."""
+        query = _fts_query(text)
+        if not query or limit <= 0:
+            return []
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT s.* FROM sources_fts f JOIN sources s ON s.id = f.rowid"
+                " WHERE sources_fts MATCH ? ORDER BY bm25(sources_fts), s.cite_count DESC LIMIT ?",
+                (query, limit),
+            ).fetchall()
+            return [self._row_to_source(conn, row, with_citations=False) for row in rows]
+
+    def sources_for_run(self, run_id: str) -> List[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT DISTINCT s.* FROM sources s JOIN citations c ON c.source_id = s.id WHERE c.run_id = ?",
+                (run_id,),
+            ).fetchall()
+            return [self._row_to_source(conn, row, with_citations=False) for row in rows]
+
+    def count(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM sources").fetchone()[0]
@@ -1,9 +1,55 @@
 import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from contextlib import closing, contextmanager
 from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
 
 BASE_DIR = Path(__file__).resolve().parent
 SESSIONS_DIR = BASE_DIR / "storage" / "sessions"
 
+# Report storage backend, can be overridden with env vars:
+#   export REPORT_STORAGE_BACKEND=sqlite     # "filesystem" (default) or "sqlite"
+#   export REPORT_STORAGE_PATH=/data/reports.db
+#   export HISTORY_LAYOUT=flat               # "sharded" (default) or "flat" for new writes
+#   export META_LOG_COMPACT_MIN_DEAD=1000    # superseded records before auto-compaction
+REPORT_STORAGE_BACKEND = os.getenv("REPORT_STORAGE_BACKEND", "filesystem")
+REPORT_STORAGE_PATH = os.getenv("REPORT_STORAGE_PATH")
+HISTORY_LAYOUT = os.getenv("HISTORY_LAYOUT", "sharded")
+META_LOG_COMPACT_MIN_DEAD = int(os.getenv("META_LOG_COMPACT_MIN_DEAD", "1000"))
+
+# Artifact kinds a report can have (new runs only write "doc"; "html" is
+# from older runs); used to clean up without listing (potentially huge)
+# flat directories.
+ARTIFACT_KINDS = ("html", "doc")
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    """
+    Write text to path via a temp file in the same directory plus rename,
+    so readers see either the old or the new content, never a partial file.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
 
 def ensure_session_dir(session_id: str) -> Path:
     session_dir = SESSIONS_DIR / session_id
@@ -17,7 +63,7 @@ def save_html(session_id: str, kind: str, html: str) -> None:
     """
     session_dir = ensure_session_dir(session_id)
     target = session_dir / f"{kind}.html"
-    target.write_text(html, encoding="utf-8")
+    atomic_write_text(target, html)
 
 
 def load_html(session_id: str, kind: str) -> str | None:
@@ -31,7 +77,7 @@ def load_html(session_id: str, kind: str) -> str | None:
 def save_meta(session_id: str, meta: dict) -> None:
     session_dir = ensure_session_dir(session_id)
     target = session_dir / "meta.json"
-    target.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+    atomic_write_text(target, json.dumps(meta, ensure_ascii=False, indent=2))
 
 
 def load_meta(session_id: str) -> dict | None:
@@ -40,3 +86,648 @@ def load_meta(session_id: str) -> dict | None:
     if not target.exists():
         return None
     return json.loads(target.read_text(encoding="utf-8"))
+
+
+class ReportStorage:
+    """
+    Interface for persisting generated reports.
+
+    A report is a metadata dict plus named text artifacts (e.g. "doc").
+    save_report writes every artifact before the metadata, so a report only
+    becomes visible (exists / list_meta) once it is complete, and replaces
+    the whole report: artifacts not passed (e.g. a legacy "html") are
+    dropped.
+    """
+
+    def save_report(self, run_id: str, artifacts: Dict[str, str], meta: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def load_artifact(self, run_id: str, kind: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def load_meta(self, run_id: str) -> Optional[Dict[str, Any]]:
+        return self.load_metas([run_id]).get(run_id)
+
+    def load_metas(self, run_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        raise NotImplementedError
+
+    def list_meta(self) -> List[Dict[str, Any]]:
+        """All report metadata, newest first."""
+        raise NotImplementedError
+
+    def exists(self, run_id: str) -> bool:
+        return self.load_meta(run_id) is not None
+
+    def delete(self, run_id: str) -> bool:
+        raise NotImplementedError
+
+    def locate(self, run_id: str, kind: str) -> str:
+        """Human-readable location of an artifact ("meta" for metadata)."""
+        raise NotImplementedError
+
+    def version(self) -> Optional[str]:
+        """
+        Cheap token that changes whenever a report is added or deleted, for
+        caching views of list_meta(); None if the backend cannot tell.
+        """
+        return None
+
+    def touch(self, run_id: str) -> None:
+        """Record that a report was just viewed (drives LRU retention)."""
+
+    def usage(self) -> List[Dict[str, Any]]:
+        """
+        One entry per stored report: {"id", "bytes", "created", "last_accessed"},
+        with times as epoch seconds.
+        """
+        raise NotImplementedError
+
+
+def _created_ts(meta: Dict[str, Any], fallback: float) -> float:
+    """Epoch seconds of meta["created_at"] (ISO 8601), or fallback."""
+    value = (meta or {}).get("created_at") or ""
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return fallback
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _sort_newest_first(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    items.sort(key=lambda x: x.get("created_at", ""), reverse=True)
+    return items
+
+
+def _valid_run_id(run_id: str) -> bool:
+    return bool(run_id) and "/" not in run_id and "\\" not in run_id and not run_id.startswith(".")
+
+
+def shard_dir(root: Path, run_id: str) -> Path:
+    """
+    Two-level shard directory for a run id: <root>/ab/cd for "abcd...".
+    Ids shorter than four characters stay in the root.
+    """
+    if len(run_id) < 4:
+        return Path(root)
+    return Path(root) / run_id[:2] / run_id[2:4]
+
+
+class MetadataLog:
+    """
+    Append-only JSONL log of report metadata.
+
+    Each line is {"op": "put", "id": ..., "meta": {...}} or
+    {"op": "del", "id": ...}; the last record for an id wins. An in-memory
+    index maps ids to byte offsets so single lookups are one seek, and it is
+    refreshed incrementally when other processes append. Listing is one
+    sequential read. compact() rewrites the log with only live records; it
+    runs automatically once superseded records outnumber live ones.
+    """
+
+    def __init__(self, path: Path, compact_min_dead: int = META_LOG_COMPACT_MIN_DEAD):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.compact_min_dead = compact_min_dead
+        self._lock = threading.RLock()
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self._dead = 0
+        self._ino: Optional[int] = None
+        self._size = 0
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock across processes (appends vs. compaction)."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _apply(self, record: Dict[str, Any], offset: int, length: int) -> None:
+        run_id = record.get("id")
+        if not isinstance(run_id, str):
+            return
+        if run_id in self._index:
+            self._dead += 1
+        if record.get("op") == "del":
+            if self._index.pop(run_id, None) is not None:
+                self._dead += 1
+        else:
+            self._index[run_id] = (offset, length)
+
+    def _scan(self, f, start: int, on_record=None) -> int:
+        """Apply complete lines from start; returns the offset after the last one."""
+        f.seek(start)
+        offset = start
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # partial line still being written
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if isinstance(record, dict):
+                self._apply(record, offset, len(line))
+                if on_record is not None:
+                    on_record(record)
+            offset += len(line)
+        return offset
+
+    def _refresh(self) -> None:
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                self._index, self._dead, self._ino, self._size = {}, 0, None, 0
+                return
+            if st.st_ino != self._ino or st.st_size < self._size:
+                self._index, self._dead, self._size = {}, 0, 0
+                self._ino = st.st_ino
+            if st.st_size > self._size:
+                with open(self.path, "rb") as f:
+                    self._size = self._scan(f, self._size)
+
+    def _append_record(self, record: Dict[str, Any]) -> None:
+        line = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._file_lock():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self._refresh()
+            if self._dead >= self.compact_min_dead and self._dead > len(self._index):
+                self._compact_locked()
+
+    def append(self, run_id: str, meta: Dict[str, Any]) -> None:
+        self._append_record({"op": "put", "id": run_id, "meta": meta})
+
+    def append_many(self, metas: Dict[str, Dict[str, Any]]) -> None:
+        """Append several records with one write."""
+        if not metas:
+            return
+        lines = "".join(
+            json.dumps({"op": "put", "id": run_id, "meta": meta}, ensure_ascii=False, separators=(",", ":")) + "\n"
+            for run_id, meta in metas.items()
+        ).encode("utf-8")
+        with self._file_lock():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, lines)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self._refresh()
+
+    def delete(self, run_id: str) -> bool:
+        if not self.contains(run_id):
+            return False
+        self._append_record({"op": "del", "id": run_id})
+        return True
+
+    def contains(self, run_id: str) -> bool:
+        self._refresh()
+        return run_id in self._index
+
+    def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        for _ in range(2):
+            self._refresh()
+            with self._lock:
+                entry = self._index.get(run_id)
+                ino = self._ino
+            if entry is None:
+                return None
+            offset, length = entry
+            try:
+                with open(self.path, "rb") as f:
+                    if os.fstat(f.fileno()).st_ino != ino:
+                        continue  # compacted underneath us; re-index and retry
+                    f.seek(offset)
+                    record = json.loads(f.read(length))
+            except (FileNotFoundError, ValueError):
+                continue
+            if record.get("id") == run_id and record.get("op") == "put":
+                return record.get("meta")
+        return None
+
+    def items(self) -> Dict[str, Dict[str, Any]]:
+        """Live metadata by id, from one sequential read of the log."""
+        live: Dict[str, Dict[str, Any]] = {}
+
+        def _collect(record: Dict[str, Any]) -> None:
+            run_id = record.get("id")
+            if record.get("op") == "del":
+                live.pop(run_id, None)
+            elif isinstance(record.get("meta"), dict):
+                live[run_id] = record["meta"]
+
+        with self._lock:
+            try:
+                with open(self.path, "rb") as f:
+                    self._index, self._dead = {}, 0
+                    self._ino = os.fstat(f.fileno()).st_ino
+                    self._size = self._scan(f, 0, _collect)
+            except FileNotFoundError:
+                self._index, self._dead, self._ino, self._size = {}, 0, None, 0
+        return live
+
+    def stats(self) -> Dict[str, int]:
+        self._refresh()
+        return {"live": len(self._index), "dead": self._dead, "bytes": self._size}
+
+    def _compact_locked(self) -> int:
+        live = self.items()
+        lines = "".join(
+            json.dumps({"op": "put", "id": run_id, "meta": meta}, ensure_ascii=False, separators=(",", ":")) + "\n"
+            for run_id, meta in live.items()
+        )
+        atomic_write_text(self.path, lines)
+        self._refresh()
+        return len(live)
+
+    def compact(self) -> int:
+        """Rewrite the log keeping only live records; returns how many."""
+        with self._file_lock():
+            return self._compact_locked()
+
+
+class FilesystemStorage(ReportStorage):
+    """
+    Reports as <run_id>.<kind> artifact files plus an append-only metadata
+    log (<root>/meta.log).
+
+    New reports go to sharded directories (<root>/ab/cd/<run_id>.*) unless
+    layout="flat". Reads check the flat root and then the shard, so both
+    layouts work while migrate_to_sharded() moves old runs. Legacy
+    per-run <run_id>.json metadata files are folded into the log the
+    first time a root is opened (no meta.log yet) and by
+    import_legacy_meta(); listings read only the log. A stray JSON file
+    is still found by id until then.
+    """
+
+    def __init__(self, root: Path, layout: str = HISTORY_LAYOUT):
+        if layout not in ("sharded", "flat"):
+            raise ValueError(f"Unknown HISTORY_LAYOUT: {layout}")
+        self.root = Path(root)
+        self.layout = layout
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.meta_log = MetadataLog(self.root / "meta.log")
+        if not self.meta_log.path.exists():
+            self.import_legacy_meta()
+            self.meta_log.path.touch()
+
+    def _dirs(self, run_id: str) -> List[Path]:
+        # Flat first: migration moves flat -> sharded, so a file missed in
+        # the root has already been renamed into its shard.
+        sharded = shard_dir(self.root, run_id)
+        return [self.root] if sharded == self.root else [self.root, sharded]
+
+    def _write_dir(self, run_id: str) -> Path:
+        return shard_dir(self.root, run_id) if self.layout == "sharded" else self.root
+
+    def _find(self, run_id: str, filename: str) -> Optional[Path]:
+        for directory in self._dirs(run_id):
+            path = directory / filename
+            if path.exists():
+                return path
+        return None
+
+    def _artifact_path(self, run_id: str, kind: str) -> Path:
+        return self._find(run_id, f"{run_id}.{kind}") or self._write_dir(run_id) / f"{run_id}.{kind}"
+
+    def save_report(self, run_id: str, artifacts: Dict[str, str], meta: Dict[str, Any]) -> None:
+        directory = self._write_dir(run_id)
+        for kind, content in artifacts.items():
+            atomic_write_text(directory / f"{run_id}.{kind}", content)
+        self.meta_log.append(run_id, meta)
+        # Drop stale copies (other layout, legacy JSON, kinds no longer
+        # written) so reads stay unambiguous.
+        for other in self._dirs(run_id):
+            (other / f"{run_id}.json").unlink(missing_ok=True)
+            for kind in ARTIFACT_KINDS:
+                if other != directory or kind not in artifacts:
+                    (other / f"{run_id}.{kind}").unlink(missing_ok=True)
+
+    def _read(self, run_id: str, filename: str) -> Optional[str]:
+        for directory in self._dirs(run_id):
+            try:
+                return (directory / filename).read_text(encoding="utf-8")
+            except FileNotFoundError:
+                continue
+        return None
+
+    def load_artifact(self, run_id: str, kind: str) -> Optional[str]:
+        if not _valid_run_id(run_id):
+            return None
+        return self._read(run_id, f"{run_id}.{kind}")
+
+    def _parse_meta(self, text: Optional[str]) -> Optional[Dict[str, Any]]:
+        if text is None:
+            return None
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+    def _read_meta_file(self, path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            return self._parse_meta(path.read_text(encoding="utf-8"))
+        except OSError:
+            return None
+
+    def load_metas(self, run_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        found: Dict[str, Dict[str, Any]] = {}
+        for run_id in run_ids:
+            if not _valid_run_id(run_id):
+                continue
+            data = self.meta_log.get(run_id)
+            if data is None:
+                data = self._parse_meta(self._read(run_id, f"{run_id}.json"))
+            if data is not None:
+                found[run_id] = data
+        return found
+
+    def list_meta(self) -> List[Dict[str, Any]]:
+        return _sort_newest_first(list(self.meta_log.items().values()))
+
+    def version(self) -> Optional[str]:
+        # Saves and deletes append to the log and compaction replaces it.
+        try:
+            st = os.stat(self.meta_log.path)
+        except FileNotFoundError:
+            return "0"
+        return f"{st.st_ino}-{st.st_size}"
+
+    def exists(self, run_id: str) -> bool:
+        if not _valid_run_id(run_id):
+            return False
+        return self.meta_log.contains(run_id) or self._find(run_id, f"{run_id}.json") is not None
+
+    def delete(self, run_id: str) -> bool:
+        if not _valid_run_id(run_id):
+            return False
+        existed = self.exists(run_id)
+        # The log tombstone goes first so the report disappears before its files.
+        self.meta_log.delete(run_id)
+        for directory in self._dirs(run_id):
+            (directory / f"{run_id}.json").unlink(missing_ok=True)
+            for kind in ARTIFACT_KINDS:
+                (directory / f"{run_id}.{kind}").unlink(missing_ok=True)
+        return existed
+
+    def locate(self, run_id: str, kind: str) -> str:
+        if kind == "meta":
+            return f"{self.meta_log.path}#{run_id}"
+        return str(self._artifact_path(run_id, kind))
+
+    def touch(self, run_id: str) -> None:
+        # Access time lives on the doc artifact (html for legacy runs); set
+        # explicitly so it does not depend on the mount's atime policy.
+        path = None
+        if _valid_run_id(run_id):
+            path = self._find(run_id, f"{run_id}.doc") or self._find(run_id, f"{run_id}.html")
+        if path is None:
+            return
+        try:
+            os.utime(path, (time.time(), path.stat().st_mtime))
+        except OSError:
+            pass
+
+    def usage(self) -> List[Dict[str, Any]]:
+        metas = self.meta_log.items()
+        entries = []
+        for run_id, meta in metas.items():
+            size, mtime, atime = 0, None, None
+            for directory in self._dirs(run_id):
+                for name in [f"{run_id}.{kind}" for kind in ARTIFACT_KINDS] + [f"{run_id}.json"]:
+                    try:
+                        st = os.stat(directory / name)
+                    except FileNotFoundError:
+                        continue
+                    size += st.st_size
+                    mtime = st.st_mtime if mtime is None else min(mtime, st.st_mtime)
+                    atime = st.st_atime if atime is None else max(atime, st.st_atime)
+            created = _created_ts(meta, mtime or 0.0)
+            entries.append(
+                {"id": run_id, "bytes": size, "created": created, "last_accessed": max(atime or 0.0, created)}
+            )
+        return entries
+
+    def import_legacy_meta(self, remove: bool = False) -> int:
+        """
+        Append legacy per-run JSON metadata (flat or sharded) to the log in
+        one batch, optionally deleting the files afterwards. Returns the
+        number of runs imported.
+        """
+        found: Dict[str, Dict[str, Any]] = {}
+        paths: List[Path] = []
+        for meta_path in list(self.root.glob("*.json")) + list(self.root.glob("*/*/*.json")):
+            data = self._read_meta_file(meta_path)
+            if data is None or not _valid_run_id(meta_path.stem):
+                continue
+            if meta_path.stem not in found:
+                found[meta_path.stem] = data
+            paths.append(meta_path)
+        self.meta_log.append_many(found)
+        if remove:
+            for meta_path in paths:
+                meta_path.unlink(missing_ok=True)
+        return len(found)
+
+    def compact(self) -> int:
+        return self.meta_log.compact()
+
+
+def migrate_to_sharded(root: Path, dry_run: bool = False) -> int:
+    """
+    Move flat <root>/<run_id>.* report files into shard directories in place.
+
+    The root is listed once; artifacts move before any legacy metadata file
+    and every move is an atomic rename, so a report stays readable
+    throughout (reads check both layouts). Safe to re-run; returns the
+    number of runs moved.
+    """
+    root = Path(root)
+    suffixes = tuple(f".{kind}" for kind in ARTIFACT_KINDS) + (".json",)
+    runs: Dict[str, List[str]] = {}
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if not entry.is_file() or entry.name.startswith("."):
+                continue
+            for suffix in suffixes:
+                if entry.name.endswith(suffix):
+                    run_id = entry.name[: -len(suffix)]
+                    if _valid_run_id(run_id) and shard_dir(root, run_id) != root:
+                        runs.setdefault(run_id, []).append(entry.name)
+                    break
+
+    if dry_run:
+        return len(runs)
+
+    for run_id, names in sorted(runs.items()):
+        target_dir = shard_dir(root, run_id)
+        target_dir.mkdir(parents=True, exist_ok=True)
+        for name in sorted(names, key=lambda n: n.endswith(".json")):
+            os.replace(root / name, target_dir / name)
+    return len(runs)
+
+
+class SqliteStorage(ReportStorage):
+    """Reports and artifacts as rows of a single SQLite database."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS reports (
+        run_id TEXT PRIMARY KEY,
+        meta_json TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        last_accessed REAL
+    );
+    CREATE INDEX IF NOT EXISTS reports_created ON reports(created_at);
+    CREATE TABLE IF NOT EXISTS artifacts (
+        run_id TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        content TEXT NOT NULL,
+        PRIMARY KEY (run_id, kind)
+    );
+    CREATE TABLE IF NOT EXISTS changes (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        counter INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO changes (id, counter) VALUES (0, 0);
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(self.SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(reports)")}
+            if "last_accessed" not in columns:
+                conn.execute("ALTER TABLE reports ADD COLUMN last_accessed REAL")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.path), timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def save_report(self, run_id: str, artifacts: Dict[str, str], meta: Dict[str, Any]) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM artifacts WHERE run_id = ?", (run_id,))
+            conn.executemany(
+                "INSERT INTO artifacts (run_id, kind, content) VALUES (?, ?, ?)",
+                [(run_id, kind, content) for kind, content in artifacts.items()],
+            )
+            # Upsert rather than replace, so saving a run again (section
+            # regeneration) keeps its creation time and last access.
+            conn.execute(
+                "INSERT INTO reports (run_id, meta_json, created_at) VALUES (?, ?, ?)"
+                " ON CONFLICT(run_id) DO UPDATE SET meta_json = excluded.meta_json",
+                (run_id, json.dumps(meta, ensure_ascii=False), meta.get("created_at", "")),
+            )
+            self._bump_changes(conn)
+
+    def load_artifact(self, run_id: str, kind: str) -> Optional[str]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT content FROM artifacts WHERE run_id = ? AND kind = ?", (run_id, kind)
+            ).fetchone()
+        return row[0] if row else None
+
+    def load_metas(self, run_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        run_ids = list(run_ids)
+        if not run_ids:
+            return {}
+        placeholders = ",".join("?" for _ in run_ids)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT run_id, meta_json FROM reports WHERE run_id IN ({placeholders})", run_ids
+            ).fetchall()
+        return {run_id: json.loads(meta_json) for run_id, meta_json in rows}
+
+    def list_meta(self) -> List[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT meta_json FROM reports ORDER BY created_at DESC").fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    @staticmethod
+    def _bump_changes(conn: sqlite3.Connection) -> None:
+        # Runs inside the save/delete transaction, so the counter and the
+        # reports it describes commit together.
+        conn.execute("UPDATE changes SET counter = counter + 1 WHERE id = 0")
+
+    def version(self) -> Optional[str]:
+        # Every save and delete bumps the counter, so it never repeats
+        # (unlike row counts and rowids, which a delete can hand back).
+        with closing(self._connect()) as conn:
+            (counter,) = conn.execute("SELECT counter FROM changes WHERE id = 0").fetchone()
+        return str(counter)
+
+    def exists(self, run_id: str) -> bool:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT 1 FROM reports WHERE run_id = ?", (run_id,)).fetchone() is not None
+
+    def delete(self, run_id: str) -> bool:
+        with closing(self._connect()) as conn, conn:
+            cur = conn.execute("DELETE FROM reports WHERE run_id = ?", (run_id,))
+            conn.execute("DELETE FROM artifacts WHERE run_id = ?", (run_id,))
+            if cur.rowcount > 0:
+                self._bump_changes(conn)
+        return cur.rowcount > 0
+
+    def locate(self, run_id: str, kind: str) -> str:
+        return f"{self.path}#{run_id}.{kind}"
+
+    def touch(self, run_id: str) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute("UPDATE reports SET last_accessed = ? WHERE run_id = ?", (time.time(), run_id))
+
+    def usage(self) -> List[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT r.run_id, r.meta_json, r.last_accessed,"
+                " length(CAST(r.meta_json AS BLOB)) + COALESCE(SUM(length(CAST(a.content AS BLOB))), 0)"
+                " FROM reports r LEFT JOIN artifacts a ON a.run_id = r.run_id GROUP BY r.run_id"
+            ).fetchall()
+        entries = []
+        for run_id, meta_json, last_accessed, size in rows:
+            created = _created_ts(json.loads(meta_json), 0.0)
+            entries.append(
+                {"id": run_id, "bytes": size, "created": created, "last_accessed": max(last_accessed or 0.0, created)}
+            )
+        return entries
+
+
+_storages: Dict[Tuple[str, str], ReportStorage] = {}
+_storages_lock = threading.Lock()
+
+
+def get_storage(root: Path, backend: Optional[str] = None) -> ReportStorage:
+    """
+    Storage for reports under root (the history directory), using the
+    configured backend. Instances are cached per backend and root.
+    """
+    backend = (backend or REPORT_STORAGE_BACKEND).lower()
+    key = (backend, str(root))
+    with _storages_lock:
+        storage = _storages.get(key)
+        if storage is None:
+            if backend == "sqlite":
+                storage = SqliteStorage(Path(REPORT_STORAGE_PATH) if REPORT_STORAGE_PATH else Path(root) / "reports.db")
+            elif backend == "filesystem":
+                storage = FilesystemStorage(Path(root))
+            else:
+                raise ValueError(f"Unknown REPORT_STORAGE_BACKEND: {backend}")
+            _storages[key] = storage
+        return storage
@@ -0,0 +1,28 @@
+"""Shared test configuration."""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# Importing app starts batch worker threads; tests run items explicitly
+# with BatchWorkers.process_next() instead.
+os.environ.setdefault("BATCH_WORKER_THREADS", "0")
+
+# Admission locks and duration stats and the metric snapshots default to
+# the system temp dir, shared with any server on this machine. Give the
+# test run its own before any module reads the settings.
+_RUNTIME_DIR = tempfile.mkdtemp(prefix="research_agent_tests_")
+atexit.register(shutil.rmtree, _RUNTIME_DIR, True)
+os.environ["ADMISSION_DIR"] = os.path.join(_RUNTIME_DIR, "admission")
+os.environ["METRICS_DIR"] = os.path.join(_RUNTIME_DIR, "metrics")
+
+
+@pytest.fixture(autouse=True)
+def _isolated_admission(tmp_path, monkeypatch):
+    """Every test starts with free admission slots and no recorded durations."""
+    app = sys.modules.get("app")
+    if app is not None:
+        monkeypatch.setattr(app.admission, "directory", tmp_path / "admission")
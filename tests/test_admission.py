@@ -0,0 +1,180 @@
+"""Unit tests for admission module."""
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from admission import AdmissionController, AdmissionRejected, INITIAL_DURATION_SECONDS
+
+
+class TestAdmissionController:
+    """Test cases for cross-process report admission."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir)
+
+    def _controller(self, **kwargs):
+        options = dict(max_active=1, max_queued=0, max_per_client=0, queue_timeout=1, poll_interval=0.01)
+        options.update(kwargs)
+        return AdmissionController(self.test_dir, **options)
+
+    def test_rejects_when_full(self):
+        """Test work beyond active + queued slots is rejected at once."""
+        controller = self._controller()
+        with controller.admit("a"):
+            with pytest.raises(AdmissionRejected) as exc:
+                with controller.admit("b"):
+                    pass
+        assert exc.value.reason == "busy"
+        assert exc.value.retry_after == INITIAL_DURATION_SECONDS
+        # The slot is free again afterwards.
+        with controller.admit("b"):
+            pass
+
+    def test_batch_leaves_reserve_for_interactive(self):
+        """Test batch work never queues nor takes the reserved slot."""
+        controller = self._controller(max_active=2, max_queued=1, interactive_reserve=1)
+        with controller.admit("bulk", priority="batch"):
+            with pytest.raises(AdmissionRejected) as exc:
+                with controller.admit("bulk", priority="batch"):
+                    pass
+            assert exc.value.reason == "busy"
+            with controller.admit("user"):
+                pass
+
+    def test_queued_report_waits_for_slot(self):
+        """Test a queued report runs as soon as the active one finishes."""
+        controller = self._controller(max_queued=1, queue_timeout=5)
+        order = []
+        release = threading.Event()
+
+        def first():
+            with controller.admit("a"):
+                order.append("first")
+                release.wait(5)
+
+        thread = threading.Thread(target=first)
+        thread.start()
+        while not order:
+            time.sleep(0.01)
+
+        def second():
+            with controller.admit("b"):
+                order.append("second")
+
+        waiter = threading.Thread(target=second)
+        waiter.start()
+        time.sleep(0.1)
+        assert order == ["first"]
+        release.set()
+        waiter.join(5)
+        thread.join(5)
+        assert order == ["first", "second"]
+
+    def test_queue_timeout(self):
+        """Test a report that waits too long is rejected with reason timeout."""
+        controller = self._controller(max_queued=1, queue_timeout=0.05)
+        with controller.admit("a"):
+            with pytest.raises(AdmissionRejected) as exc:
+                with controller.admit("b"):
+                    pass
+        assert exc.value.reason == "timeout"
+
+    def test_per_client_limit(self):
+        """Test one client cannot take more than its share."""
+        controller = self._controller(max_active=3, max_per_client=1)
+        with controller.admit("a"):
+            with pytest.raises(AdmissionRejected) as exc:
+                with controller.admit("a"):
+                    pass
+            assert exc.value.reason == "client"
+            with controller.admit("b"):
+                pass
+
+    def test_retry_after_tracks_durations(self):
+        """Test Retry-After follows the moving average of report durations."""
+        controller = self._controller(max_active=2)
+        for _ in range(50):
+            controller.record_duration(10)
+        assert controller.average_duration() == pytest.approx(10, abs=0.01)
+        assert controller.retry_after("busy") == 5
+        assert controller.retry_after("client") == 10
+
+    def test_failed_reports_not_recorded(self):
+        """Test reports that fail do not pull the duration estimate down."""
+        controller = self._controller()
+        for _ in range(5):
+            with pytest.raises(RuntimeError):
+                with controller.admit("a"):
+                    raise RuntimeError("boom")
+        assert controller.average_duration() == INITIAL_DURATION_SECONDS
+        with controller.admit("a"):
+            pass
+        assert controller.average_duration() < INITIAL_DURATION_SECONDS
+
+    def test_slot_released_on_error(self):
+        """Test a failing report frees its slot."""
+        controller = self._controller()
+        with pytest.raises(RuntimeError):
+            with controller.admit("a"):
+                raise RuntimeError("boom")
+        with controller.admit("a"):
+            pass
+
+    def test_disabled(self):
+        """Test max_active=0 admits everything."""
+        controller = self._controller(max_active=0)
+        with controller.admit("a"), controller.admit("a"):
+            pass
+
+
+class TestGenerateAdmission:
+    """Test cases for admission control on /generate."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        from app import app
+
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.controller = AdmissionController(self.test_dir, max_active=1, max_queued=0, max_per_client=0)
+        self.admission_patcher = patch('app.admission', self.controller)
+        self.admission_patcher.start()
+        self.history_patcher = patch('app.HISTORY_DIR', self.test_dir)
+        self.history_patcher.start()
+        self.client = app.test_client()
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        self.history_patcher.stop()
+        self.admission_patcher.stop()
+        shutil.rmtree(self.test_dir)
+
+    @patch('app.generate_full_report')
+    def test_429_with_retry_after(self, mock_generate):
+        """Test an overloaded server answers 429 without starting the pipeline."""
+        with self.controller.admit("other"):
+            response = self.client.post('/generate', json={"topic": "Topic"})
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == str(int(INITIAL_DURATION_SECONDS))
+        assert response.get_json()["retry_after"] == INITIAL_DURATION_SECONDS
+        assert not mock_generate.called
+
+    @patch('app.generate_full_report')
+    def test_admitted(self, mock_generate):
+        """Test requests within the limits are generated."""
+        mock_generate.return_value = {"id": "run1"}
+        response = self.client.post('/generate', json={"topic": "Topic"})
+        assert response.status_code == 200
+        assert mock_generate.called
@@ -2,6 +2,7 @@
 import pytest
 import sys
 import json
+import os
 import tempfile
 import shutil
 from pathlib import Path
@@ -10,6 +11,7 @@ from unittest.mock import patch, Mock
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app import app, load_history_items, HISTORY_DIR
+from storage import get_storage
 
 
 class TestApp:
@@ -54,6 +56,44 @@ class TestApp:
         assert response.status_code == 200
         assert b'Test Topic' in response.data or b'Refined Topic' in response.data
 
+    def _save_reports(self, count):
+        storage = get_storage(self.test_history_dir)
+        for i in range(count):
+            storage.save_report(f"run{i}", {"html": "x"}, {
+                "id": f"run{i}", "refined_topic": f"Report {i:02d}", "created_at": f"2024-01-01T00:00:{i:02d}Z",
+            })
+        return storage
+
+    def test_index_paginates_history(self):
+        """Test the history panel shows one page of reports, newest first."""
+        self._save_reports(5)
+        with patch('app.HISTORY_PAGE_SIZE', 2):
+            first = self.app.get('/').data
+            last = self.app.get('/?page=3').data
+            clamped = self.app.get('/?page=99').data
+        assert b'Report 04' in first and b'Report 03' in first and b'Report 02' not in first
+        assert b'Page 1 of 3' in first and b'?page=2' in first
+        assert b'Report 00' in last and b'Report 01' not in last
+        assert clamped == last
+
+    def test_index_etag_and_cache(self):
+        """Test unchanged pages are served from cache and revalidate to 304 until reports change."""
+        storage = self._save_reports(1)
+        response = self.app.get('/')
+        etag = response.headers['ETag']
+        assert 'no-cache' in response.headers['Cache-Control']
+
+        with patch('app.load_history_items') as mock_load:
+            assert self.app.get('/', headers={'If-None-Match': etag}).status_code == 304
+            assert self.app.get('/').headers['ETag'] == etag
+        assert not mock_load.called
+
+        storage.delete("run0")
+        response = self.app.get('/', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert b'Report 00' not in response.data
+        assert response.headers['ETag'] != etag
+
     def test_generate_route_missing_topic(self):
         """Test generate route with missing topic."""
         response = self.app.post('/generate',
@@ -128,6 +168,73 @@ class TestApp:
         assert response.status_code == 200
         assert b'Test Report' in response.data
 
+    def test_view_report_records_access(self):
+        """Test viewing a report refreshes its access time for retention."""
+        run_id = "test123"
+        html_path = self.test_history_dir / f"{run_id}.html"
+        html_path.write_text("<html>Test Report</html>", encoding='utf-8')
+        (self.test_history_dir / f"{run_id}.json").write_text(json.dumps({"id": run_id}), encoding='utf-8')
+        os.utime(html_path, (1, 1))
+
+        response = self.app.get(f'/report/{run_id}')
+        assert response.status_code == 200
+        assert html_path.stat().st_atime > 1
+
+    def test_report_asset_route(self):
+        """Test versioned report assets are served with immutable caching."""
+        from html_writer import CSS_ASSET, REPORT_CSS
+
+        response = self.app.get(f'/assets/{CSS_ASSET}')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/css'
+        assert response.data.decode('utf-8') == REPORT_CSS
+        assert 'immutable' in response.headers['Cache-Control']
+        assert self.app.get('/assets/report.missing.css').status_code == 404
+
+    @patch('app.regenerate_section')
+    def test_regenerate_section_route(self, mock_regenerate):
+        """Test regenerating one section through the API."""
+        mock_regenerate.return_value = {"id": "run1", "index": 2, "title": "Evidence"}
+        response = self.app.post('/report/run1/sections/2/regenerate')
+        assert response.status_code == 200
+        assert json.loads(response.data)["report_url"] == "/report/run1"
+        mock_regenerate.assert_called_once_with("run1", 2)
+
+        mock_regenerate.side_effect = LookupError("Unknown run")
+        assert self.app.post('/report/nope/sections/0/regenerate').status_code == 404
+
+        mock_regenerate.side_effect = None
+        mock_regenerate.return_value = {"id": "run1", "index": 2, "title": "Evidence", "error": "bad json"}
+        assert self.app.post('/report/run1/sections/2/regenerate').status_code == 502
+
+    @patch('app.regenerate_section')
+    def test_regenerate_section_one_at_a_time(self, mock_regenerate):
+        """Test a second regeneration of the same report is refused while one runs."""
+        from jobs import JobRegistry
+
+        mock_regenerate.return_value = {"id": "run1", "index": 0, "title": "Intro"}
+        jobs = JobRegistry(self.test_history_dir / "jobs.db")
+        jobs.claim("regen:run1", "run1", reuse_seconds=0)
+        assert self.app.post('/report/run1/sections/0/regenerate').status_code == 409
+        assert not mock_regenerate.called
+        assert self.app.post('/report/run2/sections/0/regenerate').status_code == 200
+
+        jobs.update("regen:run1", "run1", "done")
+        assert self.app.post('/report/run1/sections/0/regenerate').status_code == 200
+        assert jobs.get("regen:run1")["status"] == "done"
+
+    @patch('app.regenerate_section')
+    def test_regenerate_section_admission(self, mock_regenerate):
+        """Test regenerations are admitted like interactive reports."""
+        from admission import AdmissionRejected
+
+        with patch('app.admission.admit', side_effect=AdmissionRejected("busy", 7)) as mock_admit:
+            response = self.app.post('/report/run1/sections/0/regenerate')
+        assert response.status_code == 429
+        assert response.headers['Retry-After'] == '7'
+        assert not mock_regenerate.called
+        assert mock_admit.call_args[0][0]
+
     def test_view_report_route_missing_html(self):
         """Test view report when HTML is missing."""
         run_id = "test123"
@@ -188,3 +295,14 @@ class TestApp:
             call_args = mock_generate.call_args
             assert call_args[0][2] == "research"  # Always research
 
+
+    @patch('app.generate_full_report')
+    def test_generate_route_cache_opt_out(self, mock_generate):
+        """Test that "cache": false disables the section cache."""
+        mock_generate.return_value = {"id": "test123", "topic": "Topic", "html_path": "path", "meta_path": "meta"}
+
+        self.app.post('/generate',
+                      data=json.dumps({"topic": "Test Topic", "cache": False}),
+                      content_type='application/json')
+
+        assert mock_generate.call_args[1]["use_cache"] is False
@@ -0,0 +1,141 @@
+"""Unit tests for batch_runner module."""
+import json
+import sys
+from pathlib import Path
+from unittest.mock import patch, Mock
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from batch_runner import read_items, run_batch, load_finished
+from llm_client import _usage_meter, track_usage
+from scheduler import current_job
+
+
+def _write_input(path, lines):
+    path.write_text("".join((line if isinstance(line, str) else json.dumps(line)) + "\n" for line in lines))
+
+
+def _fake_generate(fail_on=()):
+    """generate_full_report stand-in that reports token usage like call_llm."""
+
+    def generate(topic, run_id, report_type, use_cache=True):
+        assert current_job().priority == "batch"
+        _usage_meter.get().add({"prompt_tokens": 1000, "completion_tokens": 500})
+        if topic in fail_on:
+            raise RuntimeError("model down")
+        return {"id": run_id}
+
+    return generate
+
+
+def _records(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+class TestBatchRunner:
+    """Test cases for JSONL-driven bulk generation."""
+
+    def test_read_items_reports_bad_lines(self, tmp_path):
+        """Test invalid lines are yielded with an error instead of raising."""
+        source = tmp_path / "in.jsonl"
+        _write_input(source, [{"topic": "A"}, "not json", {"id": 3}, ""])
+        items = list(read_items(source))
+        assert items[0] == {"topic": "A", "line": 1}
+        assert "invalid JSON" in items[1]["error"]
+        assert items[2] == {"line": 3, "error": "missing topic"}
+
+    @patch('batch_runner.generate_full_report')
+    def test_runs_and_streams_results(self, mock_generate, tmp_path):
+        """Test every item gets an output line with usage and cost."""
+        mock_generate.side_effect = _fake_generate(fail_on={"B"})
+        source, output = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+        _write_input(source, [{"topic": "A"}, {"topic": "B"}, {"topic": "a "}, "oops"])
+
+        summary = run_batch(source, output, concurrency=2, prompt_price=1.0, completion_price=2.0)
+
+        records = {r["topic"]: r for r in _records(output) if r["topic"]}
+        assert records["A"]["status"] == "ok" and records["A"]["run_id"]
+        assert records["A"]["prompt_tokens"] == 1000 and records["A"]["llm_calls"] == 1
+        assert records["B"]["status"] == "error" and records["B"]["error"] == "model down"
+        # "a " is the same job as "A" and runs only once.
+        assert mock_generate.call_count == 2
+        assert summary["ok"] == 1 and summary["error"] == 1 and summary["invalid"] == 1
+        assert summary["skipped"] == 1
+        assert summary["prompt_tokens"] == 2000
+        assert summary["cost"] == pytest.approx(2 * (1000 * 1.0 + 500 * 2.0) / 1_000_000)
+        assert summary["cost_per_report"] == pytest.approx(summary["cost"])
+        assert summary["interrupted"] is False
+
+    @patch('batch_runner.generate_full_report')
+    def test_resume_skips_finished(self, mock_generate, tmp_path):
+        """Test a rerun only processes items without a final result."""
+        source, output = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+        _write_input(source, [{"topic": "A"}, {"topic": "B", "id": "b"}])
+        mock_generate.side_effect = _fake_generate(fail_on={"B"})
+        run_batch(source, output, concurrency=1)
+        # Simulate a line cut off by a crash.
+        with open(output, "a") as f:
+            f.write('{"key": "partial')
+
+        mock_generate.reset_mock()
+        mock_generate.side_effect = _fake_generate()
+        summary = run_batch(source, output, concurrency=1)
+
+        assert [c.args[0] for c in mock_generate.call_args_list] == ["B"]
+        assert summary["skipped"] == 1 and summary["ok"] == 1
+        assert "b" in load_finished(output)
+
+    @patch('batch_runner.generate_full_report')
+    def test_no_resume_overwrites(self, mock_generate, tmp_path):
+        """Test --no-resume starts the output over."""
+        mock_generate.side_effect = _fake_generate()
+        source, output = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+        _write_input(source, [{"topic": "A"}])
+        run_batch(source, output)
+        run_batch(source, output, resume=False)
+        assert len(_records(output)) == 1
+        assert mock_generate.call_count == 2
+
+    @patch('batch_runner.generate_full_report')
+    def test_manage_command(self, mock_generate, tmp_path, capsys):
+        """Test the manage.py batch command prints throughput and cost."""
+        from manage import main
+
+        mock_generate.side_effect = _fake_generate()
+        source, output = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+        _write_input(source, [{"topic": "A"}, {"topic": "B"}])
+        with patch('pipeline.HISTORY_DIR', tmp_path):
+            assert main(["--history-dir", str(tmp_path), "batch", str(source), str(output),
+                         "--prompt-price", "3"]) == 0
+        printed = capsys.readouterr().out
+        assert "Finished: 2 ok, 0 failed" in printed
+        assert "reports/min" in printed
+        assert "LLM: 2 call(s), 2000 prompt + 1000 completion tokens, $0.0060" in printed
+
+
+class TestUsageTracking:
+    """Test cases for per-job LLM usage accounting."""
+
+    @patch('llm_client.requests.post')
+    @patch('llm_client.OPENROUTER_API_KEY', 'test-key')
+    def test_track_usage(self, mock_post):
+        """Test call_llm adds response usage and cost to the active meter."""
+        from llm_client import call_llm
+
+        ok = Mock(status_code=200)
+        ok.json.return_value = {
+            "choices": [{"message": {"content": "x"}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "cost": 0.002},
+        }
+        mock_post.return_value = ok
+        with track_usage() as usage:
+            text = call_llm([{"role": "user", "content": "p"}])
+            call_llm([{"role": "user", "content": "p"}])
+        assert text.usage["prompt_tokens"] == 10
+        assert usage.to_dict() == {"llm_calls": 2, "prompt_tokens": 20, "completion_tokens": 10, "cost": 0.004}
+        assert mock_post.call_args[1]['json']['usage'] == {"include": True}
+        # Outside the block nothing is tracked.
+        call_llm([{"role": "user", "content": "p"}])
+        assert usage.calls == 2
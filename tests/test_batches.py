@@ -0,0 +1,243 @@
+"""Unit tests for batches module."""
+import shutil
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from batches import BatchStore, BatchWorkers
+from scheduler import current_job
+
+
+class TestBatchStore:
+    """Test cases for the shared batch store."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.store = BatchStore(self.test_dir / "batches.db")
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir)
+
+    def _create(self, *topics):
+        return self.store.create("client", [{"topic": t, "use_cache": True} for t in topics])
+
+    def test_identical_topics_run_once(self):
+        """Test duplicates within a batch are not claimed and mirror the original."""
+        batch_id = self._create("Quantum computing", "Fusion", "quantum  computing?")
+        first = self.store.claim_next()
+        second = self.store.claim_next()
+        assert [first["idx"], second["idx"]] == [0, 1]
+        assert self.store.claim_next() is None
+
+        self.store.finish(batch_id, 0, "done", run_id="run0")
+        status = self.store.status(batch_id)
+        assert status["items"][2]["status"] == "done"
+        assert status["items"][2]["run_id"] == "run0"
+        assert status["items"][2]["deduplicated"] is True
+        assert status["counts"] == {"pending": 0, "running": 1, "done": 2, "failed": 0, "cancelled": 0}
+        assert status["completed"] == 2 and status["progress"] == 0.667
+        assert status["finished"] is False
+
+    def test_claims_in_submission_order(self):
+        """Test earlier batches are worked off first."""
+        first = self._create("A")
+        self._create("B")
+        assert self.store.claim_next()["batch_id"] == first
+
+    def test_deferred_item_waits(self):
+        """Test a deferred item is not claimed before its delay passes."""
+        batch_id = self._create("A")
+        item = self.store.claim_next()
+        self.store.defer(batch_id, item["idx"], 60)
+        assert self.store.claim_next() is None
+        self.store.defer(batch_id, item["idx"], 0)
+        assert self.store.claim_next()["attempts"] == 2
+
+    def test_abandoned_item_requeued(self):
+        """Test items claimed by a dead process become pending again."""
+        self._create("A")
+        self.store.claim_next()
+        with patch('batches._pid_alive', return_value=False):
+            assert self.store.claim_next()["topic"] == "A"
+
+    def test_cancel(self):
+        """Test cancelling marks unfinished items and ignores later outcomes."""
+        batch_id = self._create("A", "B")
+        self.store.claim_next()
+        assert self.store.cancel(batch_id) == 2
+        assert self.store.claim_next() is None
+        assert self.store.is_cancelled(batch_id, 0)
+        self.store.finish(batch_id, 0, "done", run_id="late")
+        status = self.store.status(batch_id)
+        assert status["counts"]["cancelled"] == 2 and status["finished"] is True
+        assert status["items"][0]["run_id"] is None
+
+    def test_unknown_batch(self):
+        """Test status of an unknown id is None."""
+        assert self.store.status("missing") is None
+
+
+class TestBatchWorkers:
+    """Test cases for running batch items."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.store = BatchStore(self.test_dir / "batches.db")
+        self.batch_id = self.store.create("client", [{"topic": "A", "use_cache": True}])
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir)
+
+    def test_outcome_recorded(self):
+        """Test a finished job's run id and status are stored."""
+        workers = BatchWorkers(lambda: self.store, lambda item, token: {"status": "done", "run_id": "r1"})
+        assert workers.process_next() is True
+        assert workers.process_next() is False
+        item = self.store.status(self.batch_id)["items"][0]
+        assert item["status"] == "done" and item["report_url"] == "/report/r1"
+
+    def test_rejected_item_retried(self):
+        """Test items turned away by admission go back to pending."""
+        workers = BatchWorkers(lambda: self.store, lambda item, token: {"status": "rejected", "retry_after": 0})
+        workers.process_next()
+        assert self.store.status(self.batch_id)["counts"]["pending"] == 1
+
+    def test_item_fails_after_max_attempts(self):
+        """Test an item that never gets capacity fails instead of staying pending."""
+        workers = BatchWorkers(
+            lambda: self.store, lambda item, token: {"status": "timeout"}, poll_interval=0, max_attempts=3
+        )
+        for _ in range(3):
+            assert workers.process_next() is True
+        assert workers.process_next() is False
+        status = self.store.status(self.batch_id)
+        assert status["finished"]
+        item = status["items"][0]
+        assert item["status"] == "failed" and item["error"].startswith("Gave up after 3 attempts")
+
+    def test_error_fails_item(self):
+        """Test an exception from the runner fails only that item."""
+
+        def explode(item, token):
+            raise RuntimeError("boom")
+
+        workers = BatchWorkers(lambda: self.store, explode)
+        workers.process_next()
+        item = self.store.status(self.batch_id)["items"][0]
+        assert item["status"] == "failed" and item["error"] == "boom"
+
+    def test_threads_run_pending_items(self):
+        """Test started workers pick up items already pending, without a request."""
+        done = threading.Event()
+
+        def run(item, token):
+            done.set()
+            return {"status": "done", "run_id": "r1"}
+
+        workers = BatchWorkers(lambda: self.store, run, threads=1, poll_interval=0.01).start()
+        try:
+            assert done.wait(5)
+        finally:
+            workers.stop()
+
+    def test_token_follows_cancellation(self):
+        """Test the item's token fires once its batch is cancelled."""
+        seen = {}
+
+        def run(item, token):
+            seen["before"] = token.cancelled
+            self.store.cancel(item["batch_id"])
+            token.check_interval = 0
+            seen["after"] = token.cancelled
+            return {"status": "cancelled", "run_id": None, "error": token.reason}
+
+        BatchWorkers(lambda: self.store, run).process_next()
+        assert seen == {"before": False, "after": True}
+        assert self.store.status(self.batch_id)["counts"]["cancelled"] == 1
+
+
+class TestBatchEndpoints:
+    """Test cases for /generate/batch."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        from app import app, batch_workers
+
+        self.test_history_dir = Path(tempfile.mkdtemp())
+        self.app_history_patcher = patch('app.HISTORY_DIR', self.test_history_dir)
+        self.app_history_patcher.start()
+        # Items are run explicitly with process_next() instead of by threads.
+        self.start_patcher = patch.object(batch_workers, 'start')
+        self.mock_start = self.start_patcher.start()
+        self.workers = batch_workers
+        self.client = app.test_client()
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        self.start_patcher.stop()
+        self.app_history_patcher.stop()
+        shutil.rmtree(self.test_history_dir)
+
+    def test_validation(self):
+        """Test malformed submissions are rejected."""
+        assert self.client.post('/generate/batch', json={}).status_code == 400
+        assert self.client.post('/generate/batch', json={"topics": ["A", " "]}).status_code == 400
+        with patch('app.BATCH_MAX_ITEMS', 1):
+            assert self.client.post('/generate/batch', json={"topics": ["A", "B"]}).status_code == 400
+
+    @patch('app.generate_full_report')
+    def test_submit_and_track(self, mock_generate):
+        """Test a batch returns at once, runs as batch jobs and reports progress."""
+
+        def generate(topic, run_id, report_type, use_cache=True):
+            assert current_job().priority == "batch"
+            if topic == "B":
+                raise RuntimeError("model down")
+            return {"id": run_id}
+
+        mock_generate.side_effect = generate
+        response = self.client.post('/generate/batch', json={
+            "topics": ["A", {"topic": "B", "cache": False}, "a"],
+        })
+        assert response.status_code == 202
+        data = response.get_json()
+        assert data["total"] == 3
+        assert response.headers["Location"] == data["status_url"]
+        assert self.mock_start.called
+        assert mock_generate.call_count == 0
+
+        status = self.client.get(data["status_url"]).get_json()
+        assert status["counts"]["pending"] == 3 and status["progress"] == 0
+
+        while self.workers.process_next():
+            pass
+
+        status = self.client.get(data["status_url"]).get_json()
+        assert mock_generate.call_count == 2
+        assert status["finished"] is True
+        assert status["counts"] == {"pending": 0, "running": 0, "done": 2, "failed": 1, "cancelled": 0}
+        items = status["items"]
+        assert items[0]["report_url"] == f"/report/{items[0]['run_id']}"
+        assert items[1]["error"] == "model down"
+        assert items[2]["run_id"] == items[0]["run_id"] and items[2]["deduplicated"] is True
+
+    def test_unknown_batch(self):
+        """Test status of an unknown batch is a 404."""
+        assert self.client.get('/generate/batch/missing').status_code == 404
+        assert self.client.post('/generate/batch/missing/cancel').status_code == 404
+
+    def test_cancel_batch(self):
+        """Test cancelling a batch stops its pending items from running."""
+        data = self.client.post('/generate/batch', json={"topics": ["A", "B"]}).get_json()
+        response = self.client.post(f"{data['status_url']}/cancel")
+        assert response.get_json()["cancelled"] == 2
+        assert self.workers.process_next() is False
+        assert self.client.get(data["status_url"]).get_json()["counts"]["cancelled"] == 2
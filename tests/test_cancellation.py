@@ -0,0 +1,313 @@
+"""Unit tests for cancellation module."""
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from cancellation import CancelToken, Cancelled, cancel_scope, check_cancelled, sleep
+from jobs import JobRegistry, run_job
+from scheduler import LLMScheduler
+
+
+class TestCancelToken:
+    """Test cases for cancellation tokens."""
+
+    def test_cancel_and_check(self):
+        """Test cancellation points raise with the reason once cancelled."""
+        token = CancelToken()
+        with cancel_scope(token):
+            check_cancelled()
+            token.cancel("stop")
+            with pytest.raises(Cancelled, match="stop"):
+                check_cancelled()
+        # Outside a scope nothing is cancelled.
+        check_cancelled()
+
+    def test_checks_are_polled(self):
+        """Test added checks cancel the token, at most every check_interval."""
+        calls = []
+        gone = []
+
+        def check():
+            calls.append(1)
+            return bool(gone)
+
+        token = CancelToken(check_interval=60)
+        token.add_check(check, "Client disconnected")
+        assert token.cancelled is False
+        gone.append(True)
+        assert token.cancelled is False
+        assert len(calls) == 1
+        token.check_interval = 0
+        assert token.cancelled is True
+        assert token.reason == "Client disconnected"
+
+    def test_sleep_ends_early(self):
+        """Test sleeps inside a cancelled scope stop at once."""
+        token = CancelToken(check_interval=0.01)
+        threading.Timer(0.05, token.cancel).start()
+        started = time.monotonic()
+        with cancel_scope(token), pytest.raises(Cancelled):
+            sleep(5)
+        assert time.monotonic() - started < 1
+
+    def test_scheduler_waiter_leaves_queue(self):
+        """Test a cancelled job stops waiting for an LLM slot."""
+        scheduler = LLMScheduler(max_concurrency=1)
+        token = CancelToken(check_interval=0.01)
+        errors = []
+
+        def wait_for_slot():
+            with cancel_scope(token):
+                try:
+                    with scheduler.slot():
+                        pass
+                except Cancelled as e:
+                    errors.append(e)
+
+        with scheduler.slot():
+            thread = threading.Thread(target=wait_for_slot)
+            thread.start()
+            while scheduler.waiting == 0:
+                time.sleep(0.001)
+            token.cancel()
+            thread.join(5)
+        assert errors and scheduler.waiting == 0
+
+    def test_scheduler_polls_checks_without_lock(self):
+        """Test slow cancellation checks do not hold the scheduler lock."""
+        scheduler = LLMScheduler(max_concurrency=1)
+        token = CancelToken(check_interval=0.01)
+        lock_free = []
+
+        def probe():
+            acquired = scheduler._cond.acquire(timeout=0)
+            if acquired:
+                scheduler._cond.release()
+            lock_free.append(acquired)
+
+        def check():
+            thread = threading.Thread(target=probe)
+            thread.start()
+            thread.join()
+            return len(lock_free) >= 3
+
+        token.add_check(check, "stop")
+
+        def wait_for_slot():
+            with cancel_scope(token), pytest.raises(Cancelled):
+                with scheduler.slot():
+                    pass
+
+        with scheduler.slot():
+            thread = threading.Thread(target=wait_for_slot)
+            thread.start()
+            thread.join(5)
+        assert lock_free and all(lock_free)
+        assert scheduler.waiting == 0
+
+    @patch('llm_client.requests.post')
+    @patch('llm_client.OPENROUTER_API_KEY', 'test-key')
+    def test_call_llm_not_started(self, mock_post):
+        """Test call_llm makes no request once its job is cancelled."""
+        from llm_client import call_llm
+
+        token = CancelToken()
+        token.cancel()
+        with cancel_scope(token), pytest.raises(Cancelled):
+            call_llm([{"role": "user", "content": "p"}])
+        assert not mock_post.called
+
+    @patch('llm_client.requests.post')
+    @patch('llm_client.OPENROUTER_API_KEY', 'test-key')
+    def test_call_llm_abandons_request_in_flight(self, mock_post):
+        """Test a job cancelled mid-request stops waiting for the response."""
+        from llm_client import call_llm
+
+        release = threading.Event()
+        mock_post.side_effect = lambda *args, **kwargs: release.wait(5)
+        token = CancelToken(check_interval=0.01)
+        threading.Timer(0.05, token.cancel, args=("Client disconnected",)).start()
+        started = time.monotonic()
+        try:
+            with cancel_scope(token), pytest.raises(Cancelled):
+                call_llm([{"role": "user", "content": "p"}])
+        finally:
+            release.set()
+        assert time.monotonic() - started < 2
+        assert mock_post.called
+
+    def test_pipeline_skips_remaining_stages(self, tmp_path):
+        """Test stages after the cancellation point do not start."""
+        from pipeline import generate_full_report
+
+        token = CancelToken()
+
+        def refine(topic, n_queries=10):
+            token.cancel("Client disconnected")
+            return {"topic": topic, "queries": [topic]}
+
+        with patch('pipeline.HISTORY_DIR', tmp_path), \
+                patch('pipeline.refine_topic_to_queries', side_effect=refine), \
+                patch('pipeline.build_outline') as mock_outline:
+            with cancel_scope(token), pytest.raises(Cancelled):
+                generate_full_report("Topic", "run1")
+        assert not mock_outline.called
+
+
+class TestJobCancellation:
+    """Test cases for cancelling report jobs."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.jobs = JobRegistry(self.test_dir / "jobs.db")
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir)
+
+    def test_cancel_request_reaches_job(self):
+        """Test JobRegistry.cancel() stops the owner at its next cancellation point."""
+
+        def generate(run_id):
+            assert self.jobs.cancel(run_id)
+            check_cancelled()
+            raise AssertionError("not cancelled")
+
+        job = run_job(self.jobs, "k", "run1", generate, nullcontext, lambda run_id: True,
+                      token=CancelToken(check_interval=0))
+        assert job["status"] == "cancelled"
+        assert self.jobs.get("k")["status"] == "cancelled"
+        assert not self.jobs.cancel("run1")
+
+    def test_owner_disconnect_keeps_shared_job(self):
+        """Test the owner's client going away does not cancel a job another submission waits for."""
+        owner_token = CancelToken(check_interval=0)
+        results = {}
+
+        def generate(run_id):
+            deadline = time.monotonic() + 5
+            while self.jobs.waiters("k", run_id) < 2 and time.monotonic() < deadline:
+                time.sleep(0.005)
+            owner_token.cancel("Client disconnected")
+            for _ in range(20):
+                check_cancelled()
+                time.sleep(0.005)
+            return {"id": run_id}
+
+        def waiter():
+            results["waiter"] = run_job(self.jobs, "k", "run2", lambda run_id: {"id": run_id}, nullcontext,
+                                        lambda run_id: True, token=CancelToken(check_interval=0))
+
+        owner = threading.Thread(target=lambda: results.update(owner=run_job(
+            self.jobs, "k", "run1", generate, nullcontext, lambda run_id: True, token=owner_token)))
+        owner.start()
+        while self.jobs.get("k") is None:
+            time.sleep(0.005)
+        attached = threading.Thread(target=waiter)
+        attached.start()
+        owner.join(5)
+        attached.join(5)
+
+        assert results["owner"]["status"] == "done"
+        assert results["waiter"]["status"] == "done"
+        assert results["waiter"]["run_id"] == "run1" and results["waiter"]["deduplicated"]
+        assert self.jobs.get("k")["status"] == "done"
+        assert self.jobs.waiters("k", "run1") == 0
+
+    def test_last_submission_leaving_cancels_job(self):
+        """Test the job stops once every submission waiting for it has gone."""
+        token = CancelToken(check_interval=0)
+
+        def generate(run_id):
+            token.cancel("Client disconnected")
+            check_cancelled()
+            raise AssertionError("not cancelled")
+
+        job = run_job(self.jobs, "k", "run1", generate, nullcontext, lambda run_id: True, token=token)
+        assert job["status"] == "cancelled"
+        assert self.jobs.get("k")["error"] == "All clients disconnected"
+
+    def test_attached_submission_takes_over(self):
+        """Test a waiter whose shared job is cancelled runs the job itself."""
+        self.jobs.claim("k", "run1")
+        threading.Timer(0.05, self.jobs.cancel, args=("run1",)).start()
+        job = run_job(self.jobs, "k", "run2", lambda run_id: {"id": run_id}, nullcontext, lambda run_id: True)
+        assert job["status"] == "done" and job["run_id"] == "run2"
+        assert job["deduplicated"] is False
+
+
+class TestCancelEndpoints:
+    """Test cases for cancellation through the web app."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        from app import app
+
+        self.test_history_dir = Path(tempfile.mkdtemp())
+        self.app_history_patcher = patch('app.HISTORY_DIR', self.test_history_dir)
+        self.app_history_patcher.start()
+        self.client = app.test_client()
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        self.app_history_patcher.stop()
+        shutil.rmtree(self.test_history_dir)
+
+    @patch('app.generate_full_report')
+    def test_cancel_running_generation(self, mock_generate):
+        """Test POST /report/<id>/cancel stops the /generate call using that id."""
+        run_id = "a" * 32
+        started = threading.Event()
+
+        def generate(topic, run_id, report_type, use_cache=True):
+            started.set()
+            while True:
+                check_cancelled()
+                time.sleep(0.01)
+
+        mock_generate.side_effect = generate
+        responses = {}
+
+        def submit():
+            responses["generate"] = self.client.post('/generate', json={"topic": "T", "run_id": run_id})
+
+        with patch('app.CancelToken', lambda: CancelToken(check_interval=0)):
+            thread = threading.Thread(target=submit)
+            thread.start()
+            assert started.wait(5)
+            cancel = self.client.post(f'/report/{run_id}/cancel')
+            thread.join(5)
+
+        assert cancel.status_code == 200
+        assert responses["generate"].status_code == 409
+        assert self.client.post(f'/report/{run_id}/cancel').status_code == 404
+
+    def test_run_id_validation(self):
+        """Test client-chosen run ids must look like generated ones."""
+        response = self.client.post('/generate', json={"topic": "T", "run_id": "../etc"})
+        assert response.status_code == 400
+
+    def test_disconnect_check(self):
+        """Test a hung-up client is detected from the request socket."""
+        from app import _disconnect_check
+
+        server, client = socket.socketpair()
+        try:
+            check = _disconnect_check({"gunicorn.socket": server})
+            assert check() is False
+            client.close()
+            assert check() is True
+        finally:
+            server.close()
+        assert _disconnect_check({})() is False
@@ -0,0 +1,68 @@
+"""Unit tests for citations module."""
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from citations import build_citation_map, renumber_citations, normalize_citations
+
+
+def _resolver(mapping):
+    return lambda src: mapping.get(src.get("title"))
+
+
+class TestCitations:
+    """Test cases for citation renumbering."""
+
+    def test_build_citation_map(self):
+        """Test local ids are mapped to global ids."""
+        sources = [{"id": 1, "title": "A"}, {"id": 2, "title": "B"}]
+        assert build_citation_map(sources, _resolver({"A": 3, "B": 1})) == {1: 3, 2: 1}
+
+    def test_build_citation_map_first_source_wins(self):
+        """Test that a reused local id keeps the first source."""
+        sources = [{"id": 1, "title": "A"}, {"id": 1, "title": "B"}]
+        assert build_citation_map(sources, _resolver({"A": 1, "B": 2})) == {1: 1}
+
+    def test_build_citation_map_skips_bad_ids_and_unresolved(self):
+        """Test that non-numeric ids and unresolved sources are skipped."""
+        sources = [{"id": "x", "title": "A"}, {"id": 2, "title": "Missing"}]
+        assert build_citation_map(sources, _resolver({"A": 1})) == {}
+
+    def test_renumber_citations(self):
+        """Test that citations are rewritten in one pass."""
+        body, dangling, cited = renumber_citations("See [1], [2] and [1] again.", {1: 5, 2: 7})
+        assert body == "See [5], [7] and [5] again."
+        assert dangling == []
+        assert cited == {1, 2}
+
+    def test_renumber_citations_no_chained_replacement(self):
+        """Test that a rewritten id is not rewritten again."""
+        body, _, _ = renumber_citations("[1] [2]", {1: 2, 2: 1})
+        assert body == "[2] [1]"
+
+    def test_renumber_citations_dangling(self):
+        """Test that unknown citations are left as-is and reported."""
+        body, dangling, cited = renumber_citations("A [3] B [1] C [3]", {1: 1})
+        assert body == "A [3] B [1] C [3]"
+        assert dangling == [3]
+        assert cited == {1}
+
+    def test_normalize_citations_reports_issues(self):
+        """Test that dangling and unused citations are reported per section."""
+        blocks = [
+            {"title": "One", "body": "Claim [1].", "sources": [{"id": 1, "title": "A"}]},
+            {"title": "Two", "body": "Claim [9].", "sources": [{"id": 1, "title": "B"}]},
+        ]
+        sections, issues = normalize_citations(blocks, _resolver({"A": 1, "B": 2}))
+
+        assert sections == [
+            {"title": "One", "body": "Claim [1]."},
+            {"title": "Two", "body": "Claim [9]."},
+        ]
+        assert issues == [{"section": "Two", "dangling": [9], "unused": [1]}]
+
+    def test_normalize_citations_empty(self):
+        """Test normalizing no sections."""
+        assert normalize_citations([], _resolver({})) == ([], [])
@@ -0,0 +1,139 @@
+"""Unit tests for exporters module."""
+import io
+import json
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from exporters import iter_markdown, iter_json, write_export, resolve_format
+from report_document import build_document, dump_document
+
+
+def _doc():
+    return build_document(
+        run_id="run1",
+        topic="Refined Topic",
+        user_topic="Topic",
+        outline=[],
+        sections=[
+            {"title": "Intro", "goal": "Context", "body": "First [1] claim.\n\nSecond [2] and [1]."},
+            {"title": "Outlook", "goal": "Future", "body": "No citations."},
+        ],
+        sources=[
+            {"global_id": 1, "title": "Study *A*", "url": "https://a.example", "source_type": "study",
+             "why_relevant": "Core"},
+            {"global_id": 2, "title": "Article B", "url": "", "source_type": "article", "why_relevant": ""},
+        ],
+        created_at="2024-01-01T00:00:00Z",
+    )
+
+
+class TestMarkdownExport:
+    """Test cases for the Markdown renderer."""
+
+    def test_structure_and_citations(self):
+        """Test headings, paragraphs and linked citations."""
+        md = "".join(iter_markdown(_doc()))
+        assert md.startswith("# Refined Topic\n\n## Intro\n\n")
+        assert "First [[1]](#ref-1) claim.\n\n" in md
+        assert "Second [[2]](#ref-2) and [[1]](#ref-1)." in md
+        assert "## References" in md
+
+    def test_references(self):
+        """Test reference entries carry anchors and escape Markdown."""
+        md = "".join(iter_markdown(_doc()))
+        assert '<a id="ref-1"></a>1. **Study \\*A\\*** — _study_. Core <https://a.example>' in md
+        assert '<a id="ref-2"></a>2. **Article B** — _article_\n' in md
+
+    def test_streams_in_chunks(self):
+        """Test output is produced incrementally."""
+        assert len(list(iter_markdown(_doc()))) > 3
+
+
+class TestJsonExport:
+    """Test cases for the JSON renderer."""
+
+    def test_valid_json(self):
+        """Test streamed chunks form one JSON document."""
+        data = json.loads("".join(iter_json(_doc())))
+        assert data["id"] == "run1"
+        assert data["topic"] == "Refined Topic"
+        assert [s["citations"] for s in data["sections"]] == [[1, 2], []]
+        assert data["sources"][0] == {
+            "id": 1, "title": "Study *A*", "url": "https://a.example", "source_type": "study", "why_relevant": "Core"
+        }
+
+    def test_empty_document(self):
+        """Test a document without sections or sources."""
+        doc = build_document("r", "T", "T", [], [], [], "")
+        data = json.loads("".join(iter_json(doc)))
+        assert data["sections"] == [] and data["sources"] == []
+
+    def test_write_export(self):
+        """Test writing to a file object."""
+        out = io.StringIO()
+        write_export(_doc(), "json", out)
+        assert json.loads(out.getvalue())["id"] == "run1"
+
+    def test_resolve_format(self):
+        """Test format names and aliases."""
+        assert resolve_format("md") == "markdown"
+        assert resolve_format("JSON") == "json"
+        assert resolve_format("pdf") is None
+
+
+class TestExportEndpoint:
+    """Test cases for /report/<run_id>/export."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        from app import app
+        from storage import get_storage
+
+        self.test_history_dir = Path(tempfile.mkdtemp())
+        self.app_history_patcher = patch('app.HISTORY_DIR', self.test_history_dir)
+        self.app_history_patcher.start()
+        self.client = app.test_client()
+        get_storage(self.test_history_dir).save_report(
+            "run1", {"doc": dump_document(_doc()), "html": "<html></html>"}, {"id": "run1"}
+        )
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        self.app_history_patcher.stop()
+        shutil.rmtree(self.test_history_dir)
+
+    @pytest.mark.parametrize("fmt,mimetype", [("markdown", "text/markdown"), ("json", "application/json"),
+                                              ("html", "text/html")])
+    def test_format_param(self, fmt, mimetype):
+        """Test format= selects the renderer."""
+        response = self.client.get(f'/report/run1/export?format={fmt}')
+        assert response.status_code == 200
+        assert response.mimetype == mimetype
+        assert 'attachment; filename="run1.' in response.headers['Content-Disposition']
+        assert b"Refined Topic" in response.data
+
+    def test_accept_negotiation(self):
+        """Test the Accept header is used without format=."""
+        response = self.client.get('/report/run1/export', headers={"Accept": "application/json"})
+        assert response.mimetype == "application/json"
+        assert json.loads(response.data)["id"] == "run1"
+        assert self.client.get('/report/run1/export').mimetype == "text/markdown"
+
+    def test_unsupported_format(self):
+        """Test unknown formats are rejected."""
+        assert self.client.get('/report/run1/export?format=pdf').status_code == 400
+
+    def test_missing_report_or_document(self):
+        """Test 404 for unknown runs and runs without a document."""
+        from storage import get_storage
+
+        assert self.client.get('/report/nope/export?format=json').status_code == 404
+        get_storage(self.test_history_dir).save_report("old1", {"html": "<html></html>"}, {"id": "old1"})
+        assert self.client.get('/report/old1/export?format=json').status_code == 404
@@ -431,3 +431,90 @@ class TestHTMLWriter:
         assert 'href="#ref-1"' in result
         assert 'href="#ref-2"' in result
 
+
+
+class TestReportAssets:
+    """Test cases for inline vs. external report CSS/JS."""
+
+    def test_external_mode_links_versioned_assets(self):
+        """Test external mode references content-hashed asset files."""
+        from html_writer import render_html, CSS_ASSET, JS_ASSET, REPORT_CSS
+
+        result = render_html("Topic", [{"title": "S", "body": "B"}], [], asset_mode="external")
+        assert f'href="/assets/{CSS_ASSET}"' in result
+        assert f'src="/assets/{JS_ASSET}"' in result
+        assert "<style>" not in result
+        assert REPORT_CSS not in result
+
+    def test_inline_mode_embeds_assets(self):
+        """Test inline mode embeds the stylesheet and script."""
+        from html_writer import render_html, REPORT_CSS, REPORT_JS
+
+        result = render_html("Topic", [], [], asset_mode="inline")
+        assert REPORT_CSS in result
+        assert REPORT_JS in result
+
+    def test_save_html_is_standalone(self):
+        """Test exported files always inline their assets."""
+        from html_writer import REPORT_CSS
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "report.html")
+            save_html("Topic", [], [], path)
+            content = open(path, encoding="utf-8").read()
+        assert REPORT_CSS in content
+        assert "/assets/" not in content
+
+    def test_asset_names_follow_content(self):
+        """Test asset filenames change with their content."""
+        from html_writer import _asset_name, get_asset, CSS_ASSET, REPORT_CSS
+
+        assert _asset_name("report", "a", "css") != _asset_name("report", "b", "css")
+        assert get_asset(CSS_ASSET) == (REPORT_CSS, "text/css")
+        assert get_asset("report.unknown.css") is None
+
+    def test_unknown_mode(self):
+        """Test an unknown asset mode is rejected."""
+        from html_writer import asset_tags
+
+        with pytest.raises(ValueError):
+            asset_tags("bogus")
+
+
+class TestStreamingRenderer:
+    """Test cases for the single-pass streaming renderer."""
+
+    SECTIONS = [
+        {"title": "One", "body": "A [1] b [2].\n\nC [1]."},
+        {"title": "Two", "body": "D."},
+    ]
+    SOURCES = [
+        {"global_id": 1, "title": "S1", "url": "https://one.example", "source_type": "study", "why_relevant": "R"},
+        {"global_id": 2, "title": "S2", "url": "", "source_type": "article", "why_relevant": "R"},
+    ]
+
+    def test_chunks_match_render_html(self):
+        """Test the streamed chunks join to exactly the rendered page."""
+        from html_writer import iter_html, render_html
+
+        chunks = list(iter_html("Topic", self.SECTIONS, self.SOURCES, "inline"))
+        assert len(chunks) == 1 + len(self.SECTIONS) + 1 + len(self.SOURCES) + 1
+        assert "".join(chunks) == render_html("Topic", self.SECTIONS, self.SOURCES, asset_mode="inline")
+
+    def test_write_html_to_file_object(self):
+        """Test writing straight to a file object."""
+        import io
+        from html_writer import write_html
+
+        out = io.StringIO()
+        write_html(out, "Topic", self.SECTIONS, self.SOURCES, "external")
+        assert out.getvalue().startswith("<!DOCTYPE html>")
+        assert out.getvalue().count('class="citation-link"') == 3
+
+    def test_many_citations_in_one_paragraph(self):
+        """Test long citation runs are linked in order."""
+        body = " ".join(f"claim [{i}]" for i in range(1, 5001))
+        result = _render_sections([{"title": "Long", "body": body}])
+        assert result.count('class="citation-link"') == 5000
+        assert result.index('data-ref="1"') < result.index('data-ref="5000"')
+        assert 'href="#ref-4999"' in result
@@ -0,0 +1,175 @@
+"""Unit tests for jobs module."""
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from jobs import JobRegistry, job_key, normalize_topic
+
+
+class TestJobKey:
+    """Test cases for job identity."""
+
+    def test_normalized_topic(self):
+        """Test case, spacing and trailing punctuation do not matter."""
+        assert normalize_topic("  Quantum   Computing? ") == "quantum computing"
+        assert job_key("Quantum computing", cache=True) == job_key("quantum  COMPUTING.", cache=True)
+
+    def test_options_matter(self):
+        """Test different report options are different jobs."""
+        assert job_key("Topic", cache=True) != job_key("Topic", cache=False)
+
+
+class TestJobRegistry:
+    """Test cases for the shared job registry."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.jobs = JobRegistry(self.test_dir / "jobs.db")
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir)
+
+    def test_attach_while_running(self):
+        """Test a second claim of a live job attaches to its run id."""
+        job, owned = self.jobs.claim("k", "run1")
+        assert owned and job["status"] == "queued"
+        job, owned = self.jobs.claim("k", "run2")
+        assert not owned and job["run_id"] == "run1"
+
+    def test_new_job_after_completion(self):
+        """Test finished jobs are not reused unless a window is set."""
+        self.jobs.claim("k", "run1")
+        self.jobs.update("k", "run1", "done")
+        job, owned = self.jobs.claim("k", "run2")
+        assert owned and job["run_id"] == "run2"
+
+    def test_reuse_within_window(self):
+        """Test a recently finished job is reused inside the freshness window."""
+        self.jobs.claim("k", "run1")
+        self.jobs.update("k", "run1", "done")
+        job, owned = self.jobs.claim("k", "run2", reuse_seconds=60)
+        assert not owned and job["run_id"] == "run1" and job["status"] == "done"
+
+    def test_failed_job_not_reused(self):
+        """Test a failed job is replaced by the next submission."""
+        self.jobs.claim("k", "run1")
+        self.jobs.update("k", "run1", "failed", error="boom")
+        _, owned = self.jobs.claim("k", "run2", reuse_seconds=60)
+        assert owned
+
+    def test_abandoned_job_replaced(self):
+        """Test jobs of dead owners or past the stale age are taken over."""
+        self.jobs.claim("k", "run1")
+        with patch('jobs._pid_alive', return_value=False):
+            _, owned = self.jobs.claim("k", "run2")
+        assert owned
+
+        stale = JobRegistry(self.test_dir / "jobs.db", stale_seconds=0)
+        _, owned = stale.claim("k", "run3")
+        assert owned
+
+    def test_update_ignores_replaced_run(self):
+        """Test an old owner cannot overwrite the job that replaced it."""
+        self.jobs.claim("k", "run1")
+        with patch('jobs._pid_alive', return_value=False):
+            self.jobs.claim("k", "run2")
+        self.jobs.update("k", "run1", "done")
+        assert self.jobs.get("k")["status"] == "queued"
+
+    def test_leave_cancels_only_when_nobody_waits(self):
+        """Test a job is cancelled when its last waiting submission leaves."""
+        self.jobs.claim("k", "run1", waiter_id="owner")
+        self.jobs.claim("k", "run2", waiter_id="attached")
+        assert self.jobs.waiters("k", "run1") == 2
+        assert self.jobs.leave("k", "run1", "owner") is False
+        assert self.jobs.get("k")["status"] == "queued"
+        assert self.jobs.leave("k", "run1", "attached") is True
+        assert self.jobs.get("k")["status"] == "cancelled"
+
+    def test_wait_returns_outcome(self):
+        """Test waiters see the job's final status."""
+        self.jobs.claim("k", "run1")
+
+        def finish():
+            time.sleep(0.05)
+            self.jobs.update("k", "run1", "done")
+
+        thread = threading.Thread(target=finish)
+        thread.start()
+        job = self.jobs.wait("k", "run1", timeout=5, poll_interval=0.01)
+        thread.join()
+        assert job["status"] == "done"
+
+    def test_wait_timeout(self):
+        """Test waiting gives up after the timeout."""
+        self.jobs.claim("k", "run1")
+        assert self.jobs.wait("k", "run1", timeout=0, poll_interval=0.01)["status"] == "timeout"
+
+
+class TestGenerateDeduplication:
+    """Test cases for duplicate submissions to /generate."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        from app import app
+
+        self.test_history_dir = Path(tempfile.mkdtemp())
+        self.app_history_patcher = patch('app.HISTORY_DIR', self.test_history_dir)
+        self.app_history_patcher.start()
+        self.app = app
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        self.app_history_patcher.stop()
+        shutil.rmtree(self.test_history_dir)
+
+    @patch('app.generate_full_report')
+    def test_concurrent_duplicates_share_run(self, mock_generate):
+        """Test an identical submission attaches to the running job."""
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_generate(topic, run_id, report_type, use_cache=True):
+            started.set()
+            release.wait(5)
+            return {"id": run_id}
+
+        mock_generate.side_effect = slow_generate
+        responses = {}
+
+        def submit(name, topic):
+            responses[name] = self.app.test_client().post('/generate', json={"topic": topic})
+
+        first = threading.Thread(target=submit, args=("first", "Quantum computing"))
+        first.start()
+        assert started.wait(5)
+        second = threading.Thread(target=submit, args=("second", "quantum computing "))
+        second.start()
+        time.sleep(0.05)
+        release.set()
+        first.join(5)
+        second.join(5)
+
+        assert mock_generate.call_count == 1
+        assert responses["first"].status_code == 200
+        assert responses["second"].status_code == 200
+        assert responses["second"].get_json()["id"] == responses["first"].get_json()["id"]
+        assert responses["second"].get_json()["deduplicated"] is True
+
+    @patch('app.generate_full_report')
+    def test_sequential_submissions_run_again(self, mock_generate):
+        """Test a finished job is regenerated when reuse is off."""
+        mock_generate.side_effect = lambda topic, run_id, report_type, use_cache=True: {"id": run_id}
+        client = self.app.test_client()
+        first = client.post('/generate', json={"topic": "Topic"}).get_json()
+        second = client.post('/generate', json={"topic": "Topic"}).get_json()
+        assert mock_generate.call_count == 2
+        assert first["id"] != second["id"]
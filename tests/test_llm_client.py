@@ -55,6 +55,22 @@ class TestLLMClient:
         call_args = mock_post.call_args
         assert call_args[1]['json']['messages'][0]['content'] == "Test prompt"
 
+    @patch('llm_client.requests.post')
+    @patch('llm_client.OPENROUTER_API_KEY', 'test-key')
+    def test_call_llm_finish_reason(self, mock_post):
+        """Test the returned text carries the response's finish_reason."""
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {
+            "choices": [{"message": {"content": "Cut off"}, "finish_reason": "length"}]
+        }
+        mock_post.return_value = mock_response
+
+        result = call_llm([{"role": "user", "content": "Prompt"}])
+
+        assert result == "Cut off"
+        assert result.finish_reason == "length"
+
     @patch('llm_client.requests.post')
     @patch('llm_client.OPENROUTER_API_KEY', 'test-key')
     def test_call_llm_with_custom_params(self, mock_post):
@@ -0,0 +1,175 @@
+"""Unit tests for metrics module."""
+import json
+import os
+import sys
+from pathlib import Path
+from unittest.mock import patch, Mock
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from metrics import MetricsRegistry
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return MetricsRegistry(tmp_path, flush_seconds=0)
+
+
+class TestMetricsRegistry:
+    """Test cases for the multiprocess metrics registry."""
+
+    def test_counter_render(self, registry):
+        """Test counters render in Prometheus text format."""
+        requests_total = registry.counter("app_requests_total", "Requests.", ("status",))
+        requests_total.inc(status=200)
+        requests_total.inc(2, status=200)
+        requests_total.inc(status=500)
+
+        text = registry.render()
+        assert "# TYPE app_requests_total counter" in text
+        assert 'app_requests_total{status="200"} 3' in text
+        assert 'app_requests_total{status="500"} 1' in text
+
+    def test_counter_rejects_negative_and_bad_labels(self, registry):
+        """Test counters only go up and need their declared labels."""
+        counter = registry.counter("c_total", "C.", ("a",))
+        with pytest.raises(ValueError):
+            counter.inc(-1, a="x")
+        with pytest.raises(ValueError):
+            counter.inc(b="x")
+
+    def test_histogram_buckets(self, registry):
+        """Test histogram buckets are cumulative with sum and count."""
+        hist = registry.histogram("lat_seconds", "Latency.", ("stage",), buckets=(1, 5))
+        hist.observe(0.5, stage="a")
+        hist.observe(3, stage="a")
+        hist.observe(10, stage="a")
+
+        text = registry.render()
+        assert 'lat_seconds_bucket{stage="a",le="1"} 1' in text
+        assert 'lat_seconds_bucket{stage="a",le="5"} 2' in text
+        assert 'lat_seconds_bucket{stage="a",le="+Inf"} 3' in text
+        assert 'lat_seconds_sum{stage="a"} 13.5' in text
+        assert 'lat_seconds_count{stage="a"} 3' in text
+
+    def test_gauge_track_inprogress(self, registry):
+        """Test gauges go up and back down around a block."""
+        gauge = registry.gauge("active", "Active.")
+        with gauge.track_inprogress():
+            assert "active 1" in registry.render()
+        assert "active 0" in registry.render()
+
+    def test_merges_other_live_processes(self, registry, tmp_path):
+        """Test values from other workers' files are summed."""
+        counter = registry.counter("jobs_total", "Jobs.")
+        counter.inc()
+        other_pid = os.getppid()
+        (tmp_path / f"{other_pid}.json").write_text(json.dumps({"jobs_total": {"[]": 4}}))
+
+        assert "jobs_total 5" in registry.render()
+
+    def test_archives_dead_processes(self, registry, tmp_path):
+        """Test exited workers' counters and histograms are kept and their gauges dropped."""
+        registry.counter("jobs_total", "Jobs.").inc()
+        registry.gauge("active", "Active.")
+        registry.histogram("latency", "Latency.", buckets=(1,)).observe(0.5)
+        dead = tmp_path / "999999999.json"
+        dead.write_text(json.dumps({
+            "jobs_total": {"[]": 4},
+            "active": {"[]": 2},
+            "latency": {"[]": {"counts": [1, 1], "sum": 3.5}},
+        }))
+
+        with patch('metrics._pid_alive', return_value=False):
+            text = registry.render()
+        assert not dead.exists()
+        assert "jobs_total 5" in text
+        assert "\nactive " not in text
+        assert "latency_count 3" in text and "latency_sum 4" in text
+        # Folded once: later scrapes neither lose nor double-count it.
+        assert "jobs_total 5" in registry.render()
+
+    def test_flush_is_throttled(self, tmp_path):
+        """Test updates within the flush interval share one delayed write."""
+        registry = MetricsRegistry(tmp_path, flush_seconds=60)
+        counter = registry.counter("c_total", "C.")
+        counter.inc()
+        assert registry.path.exists()
+        counter.inc()
+        assert json.loads(registry.path.read_text())["c_total"]["[]"] == 1
+        registry.flush()
+        assert json.loads(registry.path.read_text())["c_total"]["[]"] == 2
+
+    def test_label_escaping(self, registry):
+        """Test label values are escaped."""
+        registry.counter("e_total", "E.", ("v",)).inc(v='a"b\\c')
+        assert 'e_total{v="a\\"b\\\\c"} 1' in registry.render()
+
+
+class TestInstrumentation:
+    """Test cases for the instrumented code paths."""
+
+    @patch('llm_client.requests.post')
+    @patch('llm_client.OPENROUTER_API_KEY', 'test-key')
+    def test_call_llm_observed(self, mock_post):
+        """Test call_llm latency is recorded by model and outcome."""
+        from llm_client import call_llm, LLMError
+        from metrics import LLM_CALL_SECONDS
+
+        ok = Mock(status_code=200)
+        ok.json.return_value = {"choices": [{"message": {"content": "x"}, "finish_reason": "stop"}]}
+        mock_post.return_value = ok
+        before = LLM_CALL_SECONDS.count(model="m1", outcome="ok")
+        call_llm([{"role": "user", "content": "p"}], model="m1")
+        assert LLM_CALL_SECONDS.count(model="m1", outcome="ok") == before + 1
+
+        bad = Mock(status_code=200)
+        bad.json.return_value = {"unexpected": True}
+        mock_post.return_value = bad
+        before = LLM_CALL_SECONDS.count(model="m1", outcome="bad_response")
+        with pytest.raises(LLMError):
+            call_llm([{"role": "user", "content": "p"}], model="m1")
+        assert LLM_CALL_SECONDS.count(model="m1", outcome="bad_response") == before + 1
+
+    @patch('pipeline.refine_topic_to_queries')
+    @patch('pipeline.build_outline')
+    @patch('pipeline.research_section')
+    def test_pipeline_stages_observed(self, mock_research, mock_outline, mock_refine, tmp_path):
+        """Test pipeline stages, fallbacks and report outcomes are recorded."""
+        from metrics import REPORTS, SECTION_FALLBACKS, STAGE_SECONDS
+        from pipeline import generate_full_report
+
+        mock_refine.return_value = {"topic": "T", "queries": ["q"]}
+        mock_outline.return_value = [{"title": "S1", "goal": "G1"}, {"title": "S2", "goal": "G2"}]
+        mock_research.side_effect = [
+            {"body": "Fine.", "sources": []},
+            {"body": "Fallback.", "sources": [], "error": "bad json"},
+        ]
+        sections = STAGE_SECONDS.count(stage="section")
+        fallbacks = SECTION_FALLBACKS.value()
+        reports = REPORTS.value(outcome="ok")
+
+        with patch('pipeline.HISTORY_DIR', tmp_path):
+            generate_full_report("Topic", "metrics1", use_cache=False)
+
+        assert STAGE_SECONDS.count(stage="section") == sections + 2
+        assert STAGE_SECONDS.count(stage="persist") >= 1
+        assert SECTION_FALLBACKS.value() == fallbacks + 1
+        assert REPORTS.value(outcome="ok") == reports + 1
+
+    def test_metrics_endpoint(self, tmp_path):
+        """Test /metrics serves the registry and counts requests."""
+        from app import app
+
+        client = app.test_client()
+        with patch('app.HISTORY_DIR', tmp_path):
+            client.get('/report/does-not-exist')
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/plain'
+        text = response.data.decode('utf-8')
+        assert 'research_agent_http_requests_total{endpoint="/report/<run_id>",method="GET",status="404"}' in text
+        assert "# TYPE research_agent_stage_duration_seconds histogram" in text
+        assert "# TYPE research_agent_active_reports gauge" in text
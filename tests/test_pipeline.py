@@ -13,7 +13,6 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from pipeline import (
     generate_full_report,
     _generate_research_report,
-    _source_key,
     HISTORY_DIR
 )
 
@@ -36,25 +35,6 @@ class TestPipeline:
         if self.test_history_dir.exists():
             shutil.rmtree(self.test_history_dir)
 
-    def test_source_key(self):
-        """Test source key generation."""
-        src1 = {"title": "Test", "url": "https://example.com"}
-        src2 = {"title": "test", "url": "HTTPS://EXAMPLE.COM"}
-        src3 = {"title": "Different", "url": "https://example.com"}
-
-        key1 = _source_key(src1)
-        key2 = _source_key(src2)
-        key3 = _source_key(src3)
-
-        assert key1 == key2  # Case insensitive
-        assert key1 != key3  # Different titles
-
-    def test_source_key_empty(self):
-        """Test source key with empty values."""
-        src = {"title": "", "url": ""}
-        key = _source_key(src)
-        assert key == ("", "")
-
     @patch('pipeline.refine_topic_to_queries')
     @patch('pipeline.build_outline')
     @patch('pipeline.research_section')
@@ -88,7 +68,7 @@ class TestPipeline:
         result = _generate_research_report("User Topic", run_id)
 
         assert result["id"] == run_id
-        assert "html_path" in result
+        assert "doc_path" in result
         assert "meta_path" in result
         assert mock_refine.called
         assert mock_outline.called
@@ -164,7 +144,7 @@ class TestPipeline:
         result = generate_full_report("Topic", "test123", "research")
 
         assert result["id"] == "test123"
-        mock_research.assert_called_once_with("Topic", "test123", report_type="research")
+        mock_research.assert_called_once_with("Topic", "test123", report_type="research", use_cache=True)
 
     @patch('pipeline._generate_research_report')
     def test_generate_full_report_defaults_to_research(self, mock_research):
@@ -173,7 +153,7 @@ class TestPipeline:
 
         generate_full_report("Topic", "test123", "invalid")
 
-        mock_research.assert_called_once_with("Topic", "test123", report_type="research")
+        mock_research.assert_called_once_with("Topic", "test123", report_type="research", use_cache=True)
 
     @patch('pipeline._generate_research_report')
     def test_generate_full_report_metadata_saved(self, mock_research):
@@ -188,3 +168,108 @@ class TestPipeline:
             assert meta["id"] == "test123"
             assert meta["report_type"] == "research"
 
+
+
+class TestRegenerateSection:
+    """Test cases for regenerating one section of a stored run."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.test_history_dir = Path(tempfile.mkdtemp())
+        self.history_patcher = patch('pipeline.HISTORY_DIR', self.test_history_dir)
+        self.history_patcher.start()
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        self.history_patcher.stop()
+        shutil.rmtree(self.test_history_dir)
+
+    def _src(self, local_id, title, url):
+        return {"id": local_id, "title": title, "url": url, "source_type": "study", "why_relevant": "R"}
+
+    @patch('pipeline.refine_topic_to_queries')
+    @patch('pipeline.build_outline')
+    @patch('pipeline.research_section')
+    def _generate(self, mock_research, mock_outline, mock_refine):
+        mock_refine.return_value = {"topic": "Refined", "queries": ["q1", "q2"]}
+        mock_outline.return_value = [
+            {"title": "Intro", "goal": "Context", "priority": 1},
+            {"title": "Evidence", "goal": "Studies", "priority": 2},
+        ]
+        mock_research.side_effect = [
+            {"body": "Intro [1].", "sources": [self._src(1, "Source A", "https://a.com/1")]},
+            {"body": "Fallback text.", "sources": [], "error": "bad json"},
+        ]
+        generate_full_report("Topic", "regen1", "research", use_cache=False)
+
+    @patch('pipeline.research_section')
+    def test_regenerates_one_section(self, mock_research):
+        """Test one call replaces the section and merges sources without renumbering."""
+        from pipeline import regenerate_section
+        from report_document import load_document
+        from storage import get_storage
+
+        self._generate()
+        mock_research.return_value = {
+            "body": "New [1] and [2].",
+            "sources": [self._src(1, "Source B", "https://b.com/2"), self._src(2, "Source A", "https://a.com/1")],
+        }
+
+        result = regenerate_section("regen1", 1)
+
+        assert mock_research.call_count == 1
+        args, kwargs = mock_research.call_args
+        assert args[:4] == ("Refined", ["q1", "q2"], "Evidence", "Studies")
+        assert result["title"] == "Evidence"
+
+        storage = get_storage(self.test_history_dir)
+        doc = load_document(storage.load_artifact("regen1", "doc"))
+        assert doc["sections"][0]["body"] == "Intro [1]."
+        assert doc["sections"][1]["body"] == "New [2] and [1]."
+        assert [s["title"] for s in doc["sources"]] == ["Source A", "Source B"]
+        assert storage.load_artifact("regen1", "html") is None
+        meta = storage.load_meta("regen1")
+        assert meta["regenerated_sections"][0]["index"] == 1
+
+    @patch('pipeline.research_section')
+    def test_failed_regeneration_keeps_report(self, mock_research):
+        """Test a failed attempt leaves the stored report untouched."""
+        from pipeline import regenerate_section
+        from storage import get_storage
+
+        self._generate()
+        storage = get_storage(self.test_history_dir)
+        before = storage.load_artifact("regen1", "doc")
+        mock_research.return_value = {"body": "Fallback", "sources": [], "error": "again"}
+
+        result = regenerate_section("regen1", 1)
+        assert result["error"] == "again"
+        assert storage.load_artifact("regen1", "doc") == before
+
+    @patch('pipeline.research_section')
+    def test_deleted_during_regeneration(self, mock_research):
+        """Test a run deleted while its section is researched is not brought back."""
+        from pipeline import regenerate_section
+        from storage import get_storage
+
+        self._generate()
+        storage = get_storage(self.test_history_dir)
+
+        def research(*args, **kwargs):
+            storage.delete("regen1")
+            return {"body": "New.", "sources": []}
+
+        mock_research.side_effect = research
+        with pytest.raises(LookupError):
+            regenerate_section("regen1", 1)
+        assert not storage.exists("regen1")
+
+    def test_missing_run_or_section(self):
+        """Test unknown runs and out-of-range sections raise LookupError."""
+        from pipeline import regenerate_section
+
+        with pytest.raises(LookupError):
+            regenerate_section("missing", 0)
+        self._generate()
+        with pytest.raises(LookupError):
+            regenerate_section("regen1", 5)
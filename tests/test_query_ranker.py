@@ -0,0 +1,83 @@
+"""Unit tests for query_ranker module."""
+import pytest
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from query_ranker import rank_queries, select_queries, estimate_tokens
+
+
+QUERIES = [
+    "history of deep learning in medical imaging",
+    "economic cost of radiology staffing shortages",
+    "regulatory approval of AI diagnostic devices",
+    "ethical concerns about algorithmic bias in diagnosis",
+    "technical architecture of convolutional networks for radiology",
+]
+
+
+class TestQueryRanker:
+    """Test cases for query ranking and selection."""
+
+    def test_rank_queries_prefers_matching_terms(self):
+        """Test that the query sharing the most section terms ranks first."""
+        ranked = rank_queries(QUERIES, "Regulatory Landscape", "FDA approval of AI diagnostic devices")
+        assert ranked[0][1] == "regulatory approval of AI diagnostic devices"
+        assert ranked[0][0] > ranked[-1][0]
+
+    def test_rank_queries_ties_keep_original_order(self):
+        """Test that unrelated queries keep their input order."""
+        ranked = rank_queries(["alpha", "beta", "gamma"], "unrelated", "nothing")
+        assert [q for _, q in ranked] == ["alpha", "beta", "gamma"]
+        assert all(score == 0 for score, _ in ranked)
+
+    def test_rank_queries_empty(self):
+        """Test ranking an empty query list."""
+        assert rank_queries([], "Title", "Goal") == []
+
+    def test_select_queries_top_k(self):
+        """Test that at most top_k queries are returned."""
+        selected = select_queries(QUERIES, "Ethics", "bias in diagnosis", top_k=2, token_budget=0)
+        assert len(selected) == 2
+        assert selected[0] == "ethical concerns about algorithmic bias in diagnosis"
+
+    def test_select_queries_token_budget(self):
+        """Test that the selection stays within the token budget."""
+        budget = 25
+        selected = select_queries(QUERIES, "Radiology", "radiology networks", top_k=0, token_budget=budget)
+        assert sum(estimate_tokens(f"- {q}") for q in selected) <= budget
+        assert len(selected) < len(QUERIES)
+
+    def test_select_queries_always_keeps_best(self):
+        """Test that the best query is kept even if it exceeds the budget."""
+        selected = select_queries(QUERIES, "Economics", "staffing cost", top_k=3, token_budget=1)
+        assert selected == ["economic cost of radiology staffing shortages"]
+
+    def test_select_queries_no_limits(self):
+        """Test that disabling both limits keeps every query."""
+        selected = select_queries(QUERIES, "Title", "Goal", top_k=0, token_budget=0)
+        assert sorted(selected) == sorted(QUERIES)
+
+    def test_select_queries_skips_blank(self):
+        """Test that blank queries are ignored."""
+        assert select_queries(["", "  "], "Title", "Goal") == []
+
+    def test_select_queries_skips_non_strings(self):
+        """Test that null or numeric entries are dropped instead of raising."""
+        selected = select_queries([None, 42, "radiology staffing"], "Radiology", "staffing")
+        assert selected == ["radiology staffing"]
+
+    @patch('section_researcher.call_llm')
+    def test_research_section_prompt_uses_selected_queries(self, mock_call_llm):
+        """Test that research_section only embeds the relevant queries."""
+        from section_researcher import research_section
+
+        mock_call_llm.return_value = '{"body": "Text", "sources": []}'
+        with patch('section_researcher.select_queries', wraps=select_queries) as mock_select:
+            research_section("Topic", QUERIES, "Ethics", "bias in diagnosis")
+            mock_select.assert_called_once()
+
+        prompt = mock_call_llm.call_args[0][0][1]["content"]
+        assert "ethical concerns about algorithmic bias in diagnosis" in prompt
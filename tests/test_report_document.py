@@ -0,0 +1,152 @@
+"""Unit tests for report_document module and document rendering."""
+import json
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import html_writer
+from html_writer import render_document, clear_render_cache
+from report_document import build_document, dump_document, load_document, document_hash
+
+
+def _doc(body="Body [1]."):
+    return build_document(
+        run_id="run1",
+        topic="Refined Topic",
+        user_topic="Topic",
+        outline=[{"title": "Intro", "goal": "Set context", "priority": 1}],
+        sections=[{"title": "Intro", "goal": "Set context", "body": body}],
+        sources=[{"global_id": 1, "title": "Source", "url": "https://example.com", "source_type": "study",
+                  "why_relevant": "R"}],
+        created_at="2024-01-01T00:00:00Z",
+    )
+
+
+class TestReportDocument:
+    """Test cases for building and serializing report documents."""
+
+    def test_round_trip(self):
+        """Test a document survives dump/load unchanged."""
+        doc = _doc()
+        assert load_document(dump_document(doc)) == doc
+        assert doc["sections"][0]["goal"] == "Set context"
+        assert doc["sources"][0]["global_id"] == 1
+
+    def test_hash_is_stable(self):
+        """Test equal documents hash equally and changes change the hash."""
+        assert document_hash(_doc()) == document_hash(_doc())
+        assert document_hash(_doc()) != document_hash(_doc("Other [1]."))
+
+    def test_load_rejects_invalid(self):
+        """Test invalid or foreign documents load as None."""
+        assert load_document(None) is None
+        assert load_document("not json") is None
+        assert load_document(json.dumps({"version": 999})) is None
+
+
+class TestRenderDocument:
+    """Test cases for on-demand rendering with the LRU cache."""
+
+    def setup_method(self):
+        clear_render_cache()
+
+    def test_renders_sections_and_references(self):
+        """Test rendering produces the report HTML."""
+        result = render_document(_doc())
+        assert "Refined Topic" in result
+        assert 'href="#ref-1"' in result
+        assert 'id="ref-1"' in result
+
+    def test_cache_hit_skips_rendering(self):
+        """Test a repeated render of the same document is served from cache."""
+        doc = _doc()
+        first = render_document(doc)
+        with patch('html_writer.iter_html') as mock_render:
+            assert render_document(dict(doc)) == first
+            assert not mock_render.called
+
+    def test_cache_keys_on_template_version(self):
+        """Test a template change invalidates cached output."""
+        doc = _doc()
+        render_document(doc)
+        with patch('html_writer.TEMPLATE_VERSION', 'new-theme'), \
+                patch('html_writer.iter_html', return_value=iter(['rethemed'])) as mock_render:
+            assert render_document(doc) == 'rethemed'
+            assert mock_render.called
+
+    def test_cache_is_bounded_by_bytes(self):
+        """Test least recently used pages are evicted once the cache holds too many bytes."""
+        page_bytes = len(render_document(_doc("Body x")).encode("utf-8"))
+        clear_render_cache()
+        with patch('html_writer.RENDER_CACHE_BYTES', 8 * page_bytes + 100):
+            docs = [_doc(f"Body {i}") for i in range(10)]
+            for doc in docs:
+                render_document(doc)
+            assert html_writer._render_cache_bytes <= 8 * page_bytes + 100
+            assert len(html_writer._render_cache) == 8
+            assert (document_hash(docs[0]), html_writer.TEMPLATE_VERSION,
+                    html_writer.REPORT_ASSET_MODE) not in html_writer._render_cache
+
+    def test_large_page_streamed_not_cached(self):
+        """Test a page bigger than an eighth of the budget is never held in the cache."""
+        doc = _doc("Long body. " * 200)
+        with patch('html_writer.RENDER_CACHE_BYTES', 1000):
+            chunks = list(html_writer.iter_document(doc))
+        assert len(chunks) > 1
+        assert "Long body." in "".join(chunks)
+        assert not html_writer._render_cache
+
+
+class TestPipelineDocument:
+    """Test that the pipeline persists the document and the app renders it."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.test_history_dir = Path(tempfile.mkdtemp())
+        self.history_patcher = patch('pipeline.HISTORY_DIR', self.test_history_dir)
+        self.history_patcher.start()
+        self.app_history_patcher = patch('app.HISTORY_DIR', self.test_history_dir)
+        self.app_history_patcher.start()
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        self.history_patcher.stop()
+        self.app_history_patcher.stop()
+        shutil.rmtree(self.test_history_dir)
+
+    @patch('pipeline.refine_topic_to_queries')
+    @patch('pipeline.build_outline')
+    @patch('pipeline.research_section')
+    def test_document_saved_and_rendered(self, mock_research, mock_outline, mock_refine):
+        """Test the stored document drives /report/<run_id>."""
+        from app import app
+        from pipeline import generate_full_report
+        from storage import get_storage
+
+        mock_refine.return_value = {"topic": "Refined Topic", "queries": ["q1"]}
+        mock_outline.return_value = [{"title": "Intro", "goal": "Set context", "priority": 1}]
+        mock_research.return_value = {
+            "body": "Body [1].",
+            "sources": [{"id": 1, "title": "Source", "url": "https://example.com", "source_type": "study",
+                         "why_relevant": "R"}],
+        }
+
+        generate_full_report("Topic", "docrun1", "research", use_cache=False)
+        storage = get_storage(self.test_history_dir)
+        doc = load_document(storage.load_artifact("docrun1", "doc"))
+        assert doc["topic"] == "Refined Topic"
+        assert doc["sections"] == [{"title": "Intro", "goal": "Set context", "body": "Body [1]."}]
+        assert doc["sources"][0]["title"] == "Source"
+
+        # Edit the document only: the view reflects it without regenerating.
+        doc["sections"][0]["body"] = "Edited body [1]."
+        storage.save_report("docrun1", {"doc": dump_document(doc)}, storage.load_meta("docrun1"))
+        response = app.test_client().get('/report/docrun1')
+        assert response.status_code == 200
+        assert response.is_streamed
+        assert response.mimetype == "text/html"
+        assert b"Edited body" in response.data
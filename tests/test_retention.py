@@ -0,0 +1,205 @@
+"""Unit tests for retention module."""
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from retention import plan_evictions, enforce_retention, sweep_sessions
+from storage import FilesystemStorage, SqliteStorage
+
+DAY = 86400
+
+
+def _entry(run_id, size=100, created=0.0, last_accessed=None):
+    return {
+        "id": run_id,
+        "bytes": size,
+        "created": created,
+        "last_accessed": created if last_accessed is None else last_accessed,
+    }
+
+
+class TestPlanEvictions:
+    """Test cases for choosing reports to evict."""
+
+    def test_no_caps_keeps_everything(self):
+        """Test disabled caps evict nothing."""
+        assert plan_evictions([_entry("a"), _entry("b")]) == []
+
+    def test_count_cap_evicts_least_recently_viewed(self):
+        """Test the count cap evicts by last access, not creation."""
+        usage = [
+            _entry("old_but_viewed", created=1, last_accessed=50),
+            _entry("newer_unviewed", created=10),
+            _entry("newest", created=20),
+        ]
+        evictions = plan_evictions(usage, max_reports=2)
+        assert [(e["id"], e["reason"]) for e in evictions] == [("newer_unviewed", "count")]
+
+    def test_size_cap(self):
+        """Test the size cap evicts until the total fits."""
+        usage = [_entry("a", 400, created=1), _entry("b", 400, created=2), _entry("c", 400, created=3)]
+        evictions = plan_evictions(usage, max_bytes=500)
+        assert [e["id"] for e in evictions] == ["a", "b"]
+        assert {e["reason"] for e in evictions} == {"size"}
+
+    def test_age_cap(self):
+        """Test reports older than the age cap are evicted regardless of access."""
+        now = 100 * DAY
+        usage = [_entry("old", created=now - 10 * DAY, last_accessed=now), _entry("new", created=now - DAY)]
+        evictions = plan_evictions(usage, max_age_days=7, now=now)
+        assert [(e["id"], e["reason"]) for e in evictions] == [("old", "age")]
+
+
+@pytest.fixture(params=["filesystem", "sqlite"])
+def report_storage(request, tmp_path):
+    if request.param == "sqlite":
+        return SqliteStorage(tmp_path / "reports.db")
+    return FilesystemStorage(tmp_path)
+
+
+class TestEnforceRetention:
+    """Test cases for applying retention to a storage backend."""
+
+    def _save(self, storage, run_id, created_at="2024-01-01T00:00:00Z"):
+        storage.save_report(run_id, {"html": "x" * 1000}, {"id": run_id, "created_at": created_at})
+
+    def test_usage_reports_size_and_times(self, report_storage):
+        """Test usage entries carry size, creation and access times."""
+        self._save(report_storage, "run001")
+        [entry] = report_storage.usage()
+        assert entry["id"] == "run001"
+        assert entry["bytes"] >= 1000
+        assert entry["created"] == pytest.approx(1704067200)
+        assert entry["last_accessed"] >= entry["created"]
+
+    def test_touch_protects_recently_viewed(self, report_storage, tmp_path):
+        """Test a viewed report survives eviction of an older-viewed one."""
+        self._save(report_storage, "run001", "2024-01-01T00:00:00Z")
+        self._save(report_storage, "run002", "2024-01-02T00:00:00Z")
+        if isinstance(report_storage, FilesystemStorage):
+            # Make run002's write time look old so only touch() distinguishes them.
+            path = Path(report_storage.locate("run002", "html"))
+            os.utime(path, (1, 1))
+        report_storage.touch("run001")
+
+        result = enforce_retention(report_storage, max_reports=1, sessions_dir=None)
+        assert [e["id"] for e in result["evicted"]] == ["run002"]
+        assert report_storage.exists("run001")
+        assert not report_storage.exists("run002")
+        assert [m["id"] for m in report_storage.list_meta()] == ["run001"]
+
+    def test_dry_run_deletes_nothing(self, report_storage):
+        """Test dry runs only report what would be evicted."""
+        self._save(report_storage, "run001")
+        self._save(report_storage, "run002")
+        result = enforce_retention(report_storage, max_reports=1, sessions_dir=None, dry_run=True)
+        assert len(result["evicted"]) == 1
+        assert len(report_storage.list_meta()) == 2
+
+    def test_filesystem_eviction_removes_files(self, tmp_path):
+        """Test evicted filesystem reports leave no files behind."""
+        storage = FilesystemStorage(tmp_path)
+        self._save(storage, "abcdef")
+        enforce_retention(storage, max_bytes=1, sessions_dir=None)
+        assert not list(tmp_path.rglob("abcdef*"))
+        assert storage.meta_log.items() == {}
+
+    def test_eviction_removes_trace(self, report_storage, tmp_path):
+        """Test an evicted report's trace is deleted with it."""
+        traces = tmp_path / "traces"
+        traces.mkdir()
+        self._save(report_storage, "run001")
+        (traces / "run001.jsonl").write_text("{}\n")
+        enforce_retention(report_storage, max_bytes=1, sessions_dir=None, history_dir=tmp_path)
+        assert not (traces / "run001.jsonl").exists()
+
+    def test_eviction_removes_search_entry(self, report_storage, tmp_path):
+        """Test evicted reports stop matching searches at once."""
+        from search_index import SearchIndex, meta_fields
+
+        index = SearchIndex(tmp_path / "search.db")
+        for run_id in ("run001", "run002"):
+            self._save(report_storage, run_id)
+            meta = {"refined_topic": f"Glacier {run_id}"}
+            index.index_many([{"id": run_id, "fields": meta_fields(meta)}])
+        report_storage.touch("run002")
+
+        enforce_retention(report_storage, max_reports=1, sessions_dir=None, history_dir=tmp_path)
+        result = index.search("glacier")
+        assert result["total"] == 1
+        assert [hit["id"] for hit in result["results"]] == ["run002"]
+
+    def test_eviction_removes_source_citations(self, report_storage, tmp_path):
+        """Test evicted reports' sources are no longer offered as known sources."""
+        from source_store import SourceStore
+
+        store = SourceStore(tmp_path / "sources.db")
+        shared = {"title": "Glacier mass balance survey", "url": "https://example.com/glacier"}
+        own = {"title": "Permafrost thaw study", "url": "https://example.com/permafrost"}
+        self._save(report_storage, "run001")
+        store.record_run("run001", "Ice", [{"title": "Evidence", "sources": [shared, own]}])
+        self._save(report_storage, "run002")
+        store.record_run("run002", "Ice", [{"title": "Evidence", "sources": [shared]}])
+        report_storage.touch("run002")
+
+        enforce_retention(report_storage, max_reports=1, sessions_dir=None, history_dir=tmp_path)
+        assert store.get("https://example.com/permafrost") is None
+        assert store.search("permafrost") == []
+        remaining = store.get("https://example.com/glacier")
+        assert remaining["cite_count"] == 1
+        assert [c["run_id"] for c in remaining["citations"]] == ["run002"]
+
+    def test_sweeps_orphaned_traces(self, report_storage, tmp_path):
+        """Test old traces of runs without a stored report are removed."""
+        traces = tmp_path / "traces"
+        traces.mkdir()
+        self._save(report_storage, "kept01", "2999-01-01T00:00:00Z")
+        for name in ("kept01", "failed", "recent"):
+            (traces / f"{name}.jsonl").write_text("{}\n")
+        for name in ("kept01", "failed"):
+            os.utime(traces / f"{name}.jsonl", (1, 1))
+
+        result = enforce_retention(report_storage, max_age_days=30, sessions_dir=None, history_dir=tmp_path)
+        assert result["traces_removed"] == 1
+        assert sorted(p.stem for p in traces.iterdir()) == ["kept01", "recent"]
+
+    def test_manage_retention(self, tmp_path, capsys):
+        """Test the retention CLI command."""
+        from manage import main
+
+        storage = FilesystemStorage(tmp_path)
+        self._save(storage, "run001")
+        self._save(storage, "run002")
+        assert main(["--history-dir", str(tmp_path), "retention", "--max-reports", "1"]) == 0
+        assert "Evicted 1 report(s)" in capsys.readouterr().out
+
+
+class TestSweepSessions:
+    """Test cases for removing old session folders."""
+
+    def test_removes_only_old_sessions(self, tmp_path):
+        """Test sessions untouched for longer than the age cap are removed."""
+        now = time.time()
+        old = tmp_path / "old"
+        old.mkdir()
+        (old / "meta.json").write_text("{}")
+        for path in (old / "meta.json", old):
+            os.utime(path, (now - 30 * DAY, now - 30 * DAY))
+        (tmp_path / "new").mkdir()
+        (tmp_path / "new" / "meta.json").write_text("{}")
+
+        assert sweep_sessions(tmp_path, max_age_days=7, now=now, dry_run=True) == 1
+        assert old.exists()
+        assert sweep_sessions(tmp_path, max_age_days=7, now=now) == 1
+        assert not old.exists()
+        assert (tmp_path / "new").exists()
+
+    def test_disabled_without_age_cap(self, tmp_path):
+        """Test no sessions are removed when no age cap is set."""
+        (tmp_path / "s").mkdir()
+        assert sweep_sessions(tmp_path, max_age_days=0) == 0
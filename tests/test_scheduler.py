@@ -0,0 +1,238 @@
+"""Unit tests for scheduler module."""
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from unittest.mock import patch, Mock
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from scheduler import LLMScheduler, job_context, current_job, parse_client_weights
+
+
+def _lock_free(cond):
+    """Whether another thread could take cond's lock right now."""
+    acquired = cond.acquire(timeout=0)
+    if acquired:
+        cond.release()
+    return acquired
+
+
+class TestLLMScheduler:
+    """Test cases for priority and fair-share slot scheduling."""
+
+    def _queue(self, scheduler, waiters):
+        """Hold the only slot, queue waiters in order, then release; returns run order."""
+        order = []
+        threads = []
+        with scheduler.slot():
+            for name, priority, client in waiters:
+                def run(name=name, priority=priority, client=client):
+                    with job_context(priority, client):
+                        with scheduler.slot():
+                            order.append(name)
+
+                thread = threading.Thread(target=run)
+                thread.start()
+                threads.append(thread)
+                deadline = time.monotonic() + 5
+                while scheduler.waiting < len(threads) and time.monotonic() < deadline:
+                    time.sleep(0.001)
+        for thread in threads:
+            thread.join(5)
+        return order
+
+    def test_free_slot_is_immediate(self):
+        """Test calls run straight away while slots are free."""
+        scheduler = LLMScheduler(max_concurrency=2)
+        with scheduler.slot(), scheduler.slot():
+            assert scheduler.waiting == 0
+
+    def test_interactive_before_batch(self):
+        """Test interactive calls overtake batch calls queued before them."""
+        scheduler = LLMScheduler(max_concurrency=1, batch_delay=30)
+        order = self._queue(scheduler, [
+            ("batch-1", "batch", "bulk"),
+            ("batch-2", "batch", "bulk"),
+            ("interactive", "interactive", "user"),
+        ])
+        assert order == ["interactive", "batch-1", "batch-2"]
+
+    def test_batch_ages_past_interactive(self):
+        """Test a batch call waiting longer than the batch delay goes first."""
+        scheduler = LLMScheduler(max_concurrency=1, batch_delay=0.05)
+        order = []
+        with scheduler.slot():
+            def run(name, priority):
+                with job_context(priority, name):
+                    with scheduler.slot():
+                        order.append(name)
+
+            batch = threading.Thread(target=run, args=("batch", "batch"))
+            batch.start()
+            time.sleep(0.1)
+            interactive = threading.Thread(target=run, args=("interactive", "interactive"))
+            interactive.start()
+            while scheduler.waiting < 2:
+                time.sleep(0.001)
+        batch.join(5)
+        interactive.join(5)
+        assert order == ["batch", "interactive"]
+
+    def test_fair_share_between_clients(self):
+        """Test a client that used many slots queues behind a light client."""
+        scheduler = LLMScheduler(max_concurrency=1, usage_half_life=3600)
+        scheduler._charge("heavy", 60)
+        order = self._queue(scheduler, [
+            ("heavy", "interactive", "heavy"),
+            ("light", "interactive", "light"),
+        ])
+        assert order == ["light", "heavy"]
+
+    def test_client_weights(self):
+        """Test a heavier weight shrinks the effect of past usage."""
+        scheduler = LLMScheduler(max_concurrency=1, usage_half_life=3600, client_weights={"vip": 1000})
+        scheduler._charge("vip", 60)
+        scheduler._charge("other", 10)
+        order = self._queue(scheduler, [
+            ("other", "interactive", "other"),
+            ("vip", "interactive", "vip"),
+        ])
+        assert order == ["vip", "other"]
+
+    def test_usage_decays(self):
+        """Test usage halves every half-life."""
+        scheduler = LLMScheduler(usage_half_life=10)
+        scheduler._usage["c"] = (8.0, 100.0)
+        assert scheduler.usage("c", now=120.0) == pytest.approx(2.0)
+
+    def test_slot_released_on_error(self):
+        """Test a failing call frees its slot."""
+        scheduler = LLMScheduler(max_concurrency=1)
+        with pytest.raises(RuntimeError):
+            with scheduler.slot():
+                raise RuntimeError("boom")
+        with scheduler.slot():
+            pass
+
+    @patch('scheduler.WAIT_RECHECK_SECONDS', 0.01)
+    def test_waiter_recovers_from_missed_notify(self):
+        """Test a waiter re-checks its turn even if no one wakes it."""
+        scheduler = LLMScheduler(max_concurrency=1)
+        ran = threading.Event()
+
+        def waiter():
+            with scheduler.slot():
+                ran.set()
+
+        with scheduler._cond:
+            scheduler._active = 1
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        while scheduler.waiting == 0:
+            time.sleep(0.001)
+        with scheduler._cond:
+            # A holder that went away without notifying.
+            scheduler._active = 0
+        assert ran.wait(2)
+        thread.join(5)
+
+    def test_wait_span_opened_without_lock(self):
+        """Test the llm.wait span is recorded outside the scheduler lock."""
+        scheduler = LLMScheduler(max_concurrency=1)
+        lock_free = []
+
+        @contextmanager
+        def probing_span(name, **attrs):
+            probe = threading.Thread(target=lambda: lock_free.append(_lock_free(scheduler._cond)))
+            probe.start()
+            probe.join()
+            yield
+
+        with patch('scheduler.span', probing_span):
+            with scheduler.slot():
+                def waiter():
+                    with scheduler.slot():
+                        pass
+
+                thread = threading.Thread(target=waiter)
+                thread.start()
+                while not lock_free:
+                    time.sleep(0.001)
+        thread.join(5)
+        assert lock_free == [True]
+
+    def test_parse_client_weights(self):
+        """Test the weights env var format."""
+        assert parse_client_weights("a=3, b=0.5,bad,c=x,d=0") == {"a": 3.0, "b": 0.5}
+        assert parse_client_weights(None) == {}
+
+
+class TestJobContext:
+    """Test cases for the per-job scheduling context."""
+
+    def test_default_and_nesting(self):
+        """Test the default context and restoring it after a block."""
+        assert current_job().priority == "interactive"
+        with job_context("batch", "bulk"):
+            assert current_job().priority == "batch"
+            assert current_job().client == "bulk"
+        assert current_job().priority == "interactive"
+
+    def test_unknown_priority(self):
+        """Test unknown priority classes are rejected."""
+        with pytest.raises(ValueError):
+            with job_context("urgent"):
+                pass
+
+    @patch('llm_client.requests.post')
+    @patch('llm_client.OPENROUTER_API_KEY', 'test-key')
+    def test_call_llm_takes_slot(self, mock_post):
+        """Test call_llm goes through the scheduler with the job's priority."""
+        from llm_client import call_llm
+        from metrics import LLM_WAIT_SECONDS
+
+        ok = Mock(status_code=200)
+        ok.json.return_value = {"choices": [{"message": {"content": "x"}, "finish_reason": "stop"}]}
+        mock_post.return_value = ok
+        before = LLM_WAIT_SECONDS.count(priority="batch")
+        with patch('llm_client.LLM_SCHEDULER', LLMScheduler(max_concurrency=1)):
+            with job_context("batch", "bulk"):
+                call_llm([{"role": "user", "content": "p"}])
+        assert LLM_WAIT_SECONDS.count(priority="batch") == before + 1
+
+    def test_generate_rejects_unknown_priority(self):
+        """Test /generate validates the priority option."""
+        from app import app
+
+        response = app.test_client().post('/generate', json={"topic": "T", "priority": "urgent"})
+        assert response.status_code == 400
+
+
+class TestRateBudget:
+    """Test cases for the LLM request budget."""
+
+    def test_bucket_delays_past_budget(self):
+        """Test requests beyond the burst wait for new tokens."""
+        from scheduler import RateBudget
+
+        budget = RateBudget(per_minute=60, burst=2)
+        assert budget.reserve() == 0
+        assert budget.reserve() == 0
+        assert budget.reserve() == pytest.approx(1.0, abs=0.05)
+
+    def test_scheduler_applies_budget(self):
+        """Test slots wait for the rate budget once configured."""
+        scheduler = LLMScheduler(max_concurrency=2)
+        scheduler.set_rate(60)
+        with patch('scheduler.time.sleep') as mock_sleep:
+            with scheduler.slot():
+                pass
+            with scheduler.slot():
+                pass
+        assert mock_sleep.call_count == 1
+        scheduler.set_rate(0)
+        assert scheduler.rate_budget is None
@@ -0,0 +1,167 @@
+"""Unit tests for search_index module."""
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from report_document import build_document, dump_document
+from search_index import SearchIndex, backfill, search_query
+from storage import get_storage
+
+
+def _doc(run_id, topic, body="", sections=("Overview",), sources=()):
+    return build_document(
+        run_id=run_id,
+        topic=topic,
+        user_topic=topic.lower(),
+        outline=[],
+        sections=[{"title": title, "goal": "", "body": body} for title in sections],
+        sources=[{"title": title} for title in sources],
+        created_at="2024-01-01T00:00:00Z",
+    )
+
+
+class TestSearchIndex:
+    """Test cases for the report full-text index."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.index = SearchIndex(self.test_dir / "search.db")
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir)
+
+    def test_search_query(self):
+        """Test free text becomes an AND query of quoted terms."""
+        assert search_query('Quantum "error" corr') == '"quantum" "error" "corr"'
+        assert search_query("  ?! ") == ""
+
+    def test_ranks_topic_above_body(self):
+        """Test a match in the topic outranks one in a section body."""
+        self.index.index_document(_doc("body", "Ocean currents", body="Notes on solar panels."))
+        self.index.index_document(_doc("topic", "Solar panels"))
+        result = self.index.search("solar")
+        assert [hit["id"] for hit in result["results"]] == ["topic", "body"]
+        assert result["total"] == 2
+        assert "[solar]" in result["results"][1]["snippet"].lower()
+
+    def test_indexes_sections_and_sources(self):
+        """Test section titles and source titles are searchable."""
+        self.index.index_document(_doc("r1", "Batteries", sections=("Lithium supply",), sources=("Cobalt report",)))
+        assert self.index.search("lithium")["total"] == 1
+        assert self.index.search("cobalt")["total"] == 1
+        assert self.index.search("lithium cobalt")["total"] == 1
+        assert self.index.search("lithium nickel")["total"] == 0
+
+    def test_pagination(self):
+        """Test pages slice the ranked results."""
+        for n in range(5):
+            self.index.index_document(_doc(f"r{n}", f"Fusion energy {n}"))
+        first = self.index.search("fusion", page=1, per_page=2)
+        third = self.index.search("fusion", page=3, per_page=2)
+        assert first["total"] == 5 and len(first["results"]) == 2
+        assert len(third["results"]) == 1
+        assert not {h["id"] for h in first["results"]} & {h["id"] for h in third["results"]}
+
+    def test_reindex_replaces(self):
+        """Test indexing a report again replaces its text."""
+        self.index.index_document(_doc("r1", "Old topic"))
+        self.index.index_document(_doc("r1", "New topic"))
+        assert self.index.count() == 1
+        assert self.index.search("old")["total"] == 0
+        assert self.index.search("new")["results"][0]["topic"] == "New topic"
+
+    def test_remove(self):
+        """Test removed reports no longer match."""
+        self.index.index_document(_doc("r1", "Topic"))
+        assert self.index.remove(["r1", "missing"]) == 1
+        assert self.index.search("topic")["total"] == 0
+
+    def test_backfill(self):
+        """Test existing history is indexed and stale entries pruned."""
+        storage = get_storage(self.test_dir / "history")
+        doc = _doc("withdoc", "Coral reefs", body="Bleaching events.")
+        storage.save_report("withdoc", {"doc": dump_document(doc), "html": "<p></p>"}, {"id": "withdoc"})
+        storage.save_report("legacy", {"html": "<p></p>"}, {
+            "id": "legacy", "refined_topic": "Deep sea mining", "user_topic": "mining",
+            "outline_sections": [{"title": "Nodules"}],
+        })
+        self.index.index_document(_doc("gone", "Coral gone"))
+
+        assert backfill(self.index, storage) == {"indexed": 2, "removed": 1}
+        assert self.index.search("bleaching")["results"][0]["id"] == "withdoc"
+        assert self.index.search("nodules")["results"][0]["id"] == "legacy"
+        assert self.index.search("coral")["total"] == 1
+
+
+class TestSearchEndpoint:
+    """Test cases for GET /search and report indexing."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        from app import app
+
+        self.test_history_dir = Path(tempfile.mkdtemp())
+        self.app_history_patcher = patch('app.HISTORY_DIR', self.test_history_dir)
+        self.pipeline_history_patcher = patch('pipeline.HISTORY_DIR', self.test_history_dir)
+        self.app_history_patcher.start()
+        self.pipeline_history_patcher.start()
+        self.client = app.test_client()
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        self.pipeline_history_patcher.stop()
+        self.app_history_patcher.stop()
+        shutil.rmtree(self.test_history_dir)
+
+    def _store(self, run_id, topic):
+        doc = _doc(run_id, topic)
+        get_storage(self.test_history_dir).save_report(
+            run_id, {"doc": dump_document(doc), "html": "<p></p>"}, {"id": run_id}
+        )
+        SearchIndex(self.test_history_dir / "search.db").index_document(doc)
+
+    def test_missing_query(self):
+        """Test an empty query is a 400."""
+        assert self.client.get('/search?q=%20').status_code == 400
+
+    def test_results(self):
+        """Test ranked results carry report links and paging info."""
+        self._store("r1", "Glacier retreat")
+        self._store("r2", "Glacier tourism")
+        data = self.client.get('/search?q=glacier&per_page=1').get_json()
+        assert data["total"] == 2 and data["pages"] == 2
+        assert data["results"][0]["report_url"] == f"/report/{data['results'][0]['id']}"
+
+    def test_deleted_reports_dropped(self):
+        """Test hits of deleted reports are left out and unindexed."""
+        self._store("r1", "Glacier retreat")
+        get_storage(self.test_history_dir).delete("r1")
+        data = self.client.get('/search?q=glacier').get_json()
+        assert data["results"] == [] and data["total"] == 0
+        assert SearchIndex(self.test_history_dir / "search.db").count() == 0
+
+    def test_pipeline_indexes_report(self):
+        """Test a report is searchable as soon as it is written."""
+        from pipeline import _index_for_search
+
+        _index_for_search(_doc("r1", "Volcano monitoring"))
+        assert SearchIndex(self.test_history_dir / "search.db").search("volcano")["total"] == 1
+
+    def test_manage_command(self, capsys):
+        """Test the manage.py search-index backfill command."""
+        from manage import main
+
+        doc = _doc("r1", "Wind farms")
+        get_storage(self.test_history_dir).save_report(
+            "r1", {"doc": dump_document(doc), "html": "<p></p>"}, {"id": "r1"}
+        )
+        assert main(["--history-dir", str(self.test_history_dir), "search-index"]) == 0
+        assert "Indexed 1 report(s)" in capsys.readouterr().out
+        data = self.client.get('/search?q=wind').get_json()
+        assert [hit["id"] for hit in data["results"]] == ["r1"]
@@ -0,0 +1,129 @@
+"""Unit tests for section_cache module."""
+import pytest
+import sys
+import time
+import tempfile
+import shutil
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from section_cache import SectionCache, normalize_text, similarity
+
+
+RESULT = {"body": "Cached body [1]", "sources": [{"id": 1, "title": "S", "url": "https://s.org"}], "raw": "{}"}
+
+
+class TestSectionCache:
+    """Test cases for the similar-topic section cache."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.cache = SectionCache(self.test_dir / "cache.db", threshold=0.6, ttl_seconds=3600)
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir)
+
+    def test_normalize_text(self):
+        """Test stopwords are dropped and plurals folded."""
+        assert normalize_text("AI for Radiology Diagnostics") == "ai radiology diagnostic"
+        assert normalize_text("The Studies of Glass") == "study glass"
+
+    def test_similarity(self):
+        """Test word n-gram Jaccard similarity."""
+        assert similarity("ai radiology", "ai radiology diagnostic") == pytest.approx(2 / 3)
+        assert similarity("ai radiology", "ai cardiology") == pytest.approx(1 / 3)
+        assert similarity("", "ai") == 0.0
+
+    def test_exact_hit(self):
+        """Test an identical topic and section is served from cache."""
+        assert self.cache.put("AI in radiology", "Background", "History of the field", RESULT)
+        hit = self.cache.get("AI in radiology", "Background", "History of the field")
+        assert hit["body"] == "Cached body [1]"
+        assert hit["sources"] == RESULT["sources"]
+        assert "raw" not in hit
+        assert hit["cache"]["topic_similarity"] == 1.0
+
+    def test_similar_topic_hit(self):
+        """Test a near-identical topic reuses the stored section."""
+        self.cache.put("AI in radiology", "Background and History", "History of AI in radiology", RESULT)
+        hit = self.cache.get("AI for radiology diagnostics", "Background and History", "History of AI in radiology")
+        assert hit is not None
+        assert 0.6 <= hit["cache"]["topic_similarity"] < 1.0
+
+    def test_different_topic_miss(self):
+        """Test a different topic does not hit."""
+        self.cache.put("AI in radiology", "Background", "History", RESULT)
+        assert self.cache.get("AI in cardiology", "Background", "History") is None
+
+    def test_different_section_miss(self):
+        """Test a different section of the same topic does not hit."""
+        self.cache.put("AI in radiology", "Background", "History of the field", RESULT)
+        assert self.cache.get("AI in radiology", "Regulation", "Approval pathways and policy") is None
+
+    def test_errors_not_cached(self):
+        """Test fallback results are never stored."""
+        assert not self.cache.put("Topic", "Title", "Goal", {"body": "fallback", "sources": [], "error": "boom"})
+        assert self.cache.count() == 0
+
+    def test_ttl_expiry(self):
+        """Test expired entries are ignored."""
+        self.cache.put("AI in radiology", "Background", "History", RESULT)
+        expired = SectionCache(self.test_dir / "cache.db", threshold=0.6, ttl_seconds=0)
+        time.sleep(0.01)
+        assert expired.get("AI in radiology", "Background", "History") is None
+
+    def test_put_replaces_same_signature(self):
+        """Test storing the same key twice keeps one entry."""
+        self.cache.put("Topic here", "Title", "Goal", RESULT)
+        self.cache.put("Topic here", "Title", "Goal", {"body": "New", "sources": []})
+        assert self.cache.count() == 1
+        assert self.cache.get("Topic here", "Title", "Goal")["body"] == "New"
+
+
+class TestPipelineSectionCache:
+    """Test that the pipeline serves sections from the cache."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.test_history_dir = Path(tempfile.mkdtemp())
+        self.history_patcher = patch('pipeline.HISTORY_DIR', self.test_history_dir)
+        self.history_patcher.start()
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        self.history_patcher.stop()
+        shutil.rmtree(self.test_history_dir)
+
+    @patch('pipeline.refine_topic_to_queries')
+    @patch('pipeline.build_outline')
+    @patch('pipeline.research_section')
+    def test_second_run_uses_cache(self, mock_research, mock_outline, mock_refine):
+        """Test a repeated topic skips the section LLM call."""
+        from pipeline import generate_full_report
+
+        mock_refine.return_value = {"topic": "AI in radiology", "queries": ["q1"]}
+        mock_outline.return_value = [{"title": "Background", "goal": "History", "priority": 1}]
+        mock_research.return_value = {"body": "Body [1]", "sources": [{"id": 1, "title": "S", "url": "https://s.org"}]}
+
+        generate_full_report("AI in radiology", "run1", "research")
+        generate_full_report("AI in radiology", "run2", "research")
+        assert mock_research.call_count == 1
+
+    @patch('pipeline.refine_topic_to_queries')
+    @patch('pipeline.build_outline')
+    @patch('pipeline.research_section')
+    def test_opt_out_bypasses_cache(self, mock_research, mock_outline, mock_refine):
+        """Test use_cache=False always calls the LLM."""
+        from pipeline import generate_full_report
+
+        mock_refine.return_value = {"topic": "AI in radiology", "queries": ["q1"]}
+        mock_outline.return_value = [{"title": "Background", "goal": "History", "priority": 1}]
+        mock_research.return_value = {"body": "Body", "sources": []}
+
+        generate_full_report("AI in radiology", "run1", "research")
+        generate_full_report("AI in radiology", "run2", "research", use_cache=False)
+        assert mock_research.call_count == 2
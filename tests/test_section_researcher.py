@@ -7,7 +7,7 @@ from unittest.mock import patch
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from section_researcher import research_section, _robust_json_parse
-from llm_client import LLMError
+from llm_client import LLMError, LLMText
 
 
 class TestSectionResearcher:
@@ -183,3 +183,105 @@ class TestSectionResearcher:
         assert result["body"] == "Content"
         assert "error" not in result
 
+
+    @patch('section_researcher.call_llm')
+    def test_research_section_includes_known_sources(self, mock_call_llm):
+        """Test that known sources are offered as prompt context."""
+        mock_call_llm.return_value = '{"body": "Content", "sources": []}'
+
+        research_section("Topic", [], "Title", "Goal",
+                         known_sources=[{"title": "Prior Study", "url": "https://prior.org/s"}])
+
+        prompt = mock_call_llm.call_args[0][0][1]["content"]
+        assert "Previously cited sources" in prompt
+        assert "- Prior Study (https://prior.org/s)" in prompt
+
+    @patch('section_researcher.call_llm')
+    def test_research_section_without_known_sources(self, mock_call_llm):
+        """Test that the known-sources block is omitted when empty."""
+        mock_call_llm.return_value = '{"body": "Content", "sources": []}'
+
+        research_section("Topic", [], "Title", "Goal", known_sources=[])
+
+        prompt = mock_call_llm.call_args[0][0][1]["content"]
+        assert "Previously cited sources" not in prompt
+
+
+class TestTruncationContinuation:
+    """Test cases for recovering cut-off section replies."""
+
+    FULL = ('{"body": "Screening accuracy improved [1] across sites [2].", "sources": ['
+            '{"id": 1, "title": "Trial One", "url": "https://one.example", "source_type": "trial", '
+            '"why_relevant": "Primary"}, '
+            '{"id": 2, "title": "Trial Two", "url": "https://two.example", "source_type": "trial", '
+            '"why_relevant": "Replication"}]}')
+
+    @patch('section_researcher.call_llm')
+    def test_continuation_is_stitched(self, mock_call_llm):
+        """Test a cut-off reply is completed by one continuation call."""
+        cut = 150
+        mock_call_llm.side_effect = [LLMText(self.FULL[:cut], "length"), LLMText(self.FULL[cut:], "stop")]
+
+        result = research_section("Topic", [], "Title", "Goal")
+
+        assert mock_call_llm.call_count == 2
+        assert "error" not in result
+        assert [s["title"] for s in result["sources"]] == ["Trial One", "Trial Two"]
+        assert result["continuations"] == 1
+        follow_up = mock_call_llm.call_args_list[1][0][0]
+        assert follow_up[-2] == {"role": "assistant", "content": self.FULL[:cut]}
+
+    @patch('section_researcher.call_llm')
+    def test_overlapping_continuation(self, mock_call_llm):
+        """Test text the model repeats from the cut-off point is dropped."""
+        cut = 150
+        mock_call_llm.side_effect = [self.FULL[:cut], self.FULL[cut - 30:]]
+
+        result = research_section("Topic", [], "Title", "Goal")
+
+        assert len(result["sources"]) == 2
+        assert result["body"] == "Screening accuracy improved [1] across sites [2]."
+
+    @patch('section_researcher.call_llm')
+    def test_repairs_when_continuation_fails(self, mock_call_llm):
+        """Test the partial reply is closed up if the continuation call fails."""
+        cut = self.FULL.index('{"id": 2')
+        mock_call_llm.side_effect = [LLMText(self.FULL[:cut + 20], "length"), LLMError("timeout")]
+
+        result = research_section("Topic", [], "Title", "Goal")
+
+        assert "error" not in result
+        assert result["repaired"] is True
+        assert result["body"].startswith("Screening accuracy")
+        assert [s["title"] for s in result["sources"]] == ["Trial One"]
+
+    @patch('section_researcher.call_llm')
+    def test_truncated_inside_body(self, mock_call_llm):
+        """Test a reply cut inside the body keeps the partial text."""
+        mock_call_llm.side_effect = [LLMText('{"body": "Partial text [1] that', "length"), LLMError("down")]
+
+        result = research_section("Topic", [], "Title", "Goal")
+
+        assert result["body"] == "Partial text [1] that"
+        assert result["sources"] == []
+
+    @patch('section_researcher.MAX_CONTINUATIONS', 0)
+    @patch('section_researcher.call_llm')
+    def test_continuation_disabled(self, mock_call_llm):
+        """Test no extra call is made when continuations are disabled."""
+        mock_call_llm.return_value = LLMText(self.FULL[:150], "length")
+
+        result = research_section("Topic", [], "Title", "Goal")
+
+        assert mock_call_llm.call_count == 1
+        assert result.get("repaired") is True
+
+    @patch('section_researcher.call_llm')
+    def test_complete_invalid_json_not_continued(self, mock_call_llm):
+        """Test non-truncated garbage still falls back without extra calls."""
+        mock_call_llm.return_value = LLMText("Not JSON", "stop")
+
+        result = research_section("Topic", [], "Title", "Goal")
+
+        assert mock_call_llm.call_count == 1
+        assert "error" in result
@@ -0,0 +1,168 @@
+"""Unit tests for source_registry module."""
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from source_registry import SourceRegistry, canonicalize_url, normalize_title
+
+
+class TestCanonicalizeUrl:
+    """Test cases for URL canonicalization."""
+
+    def test_scheme_www_and_trailing_slash(self):
+        """Test that http/https, www. and trailing slashes are ignored."""
+        assert canonicalize_url("http://www.Example.com/a/b/") == canonicalize_url("https://example.com/a/b")
+
+    def test_tracking_params_removed(self):
+        """Test that utm_* and click ids are dropped and params sorted."""
+        url = "https://example.com/page?utm_source=x&b=2&fbclid=abc&a=1#frag"
+        assert canonicalize_url(url) == "example.com/page?a=1&b=2"
+
+    def test_doi_variants(self):
+        """Test that DOI spellings collapse to one identity."""
+        expected = "doi:10.1000/xyz123"
+        assert canonicalize_url("https://doi.org/10.1000/XYZ123") == expected
+        assert canonicalize_url("http://dx.doi.org/10.1000/xyz123") == expected
+        assert canonicalize_url("doi:10.1000/xyz123") == expected
+        assert canonicalize_url("https://onlinelibrary.wiley.com/doi/abs/10.1000/xyz123/abstract") == expected
+
+    def test_default_port_dropped(self):
+        """Test that default ports are removed but others kept."""
+        assert canonicalize_url("https://example.com:443/x") == "example.com/x"
+        assert canonicalize_url("https://example.com:8443/x") == "example.com:8443/x"
+
+    def test_empty(self):
+        """Test empty URL."""
+        assert canonicalize_url("") == ""
+        assert canonicalize_url(None) == ""
+
+    def test_malformed_url(self):
+        """Test unparsable URLs fall back to their lowercased text instead of raising."""
+        assert canonicalize_url(" https://[Bad/x ") == "https://[bad/x"
+        assert canonicalize_url("https://example.com:abc/x") == "https://example.com:abc/x"
+
+    def test_placeholder_is_no_url(self):
+        """Test placeholders without a real host count as no URL."""
+        assert canonicalize_url("N/A") == ""
+        assert canonicalize_url("none") == ""
+        assert canonicalize_url("example.com/a") == "example.com/a"
+
+
+class TestSourceRegistry:
+    """Test cases for source deduplication."""
+
+    def test_new_sources_get_sequential_ids(self):
+        """Test that distinct sources get global ids 1..N."""
+        registry = SourceRegistry()
+        assert registry.add({"title": "Alpha study of things", "url": "https://a.com/1"}) == 1
+        assert registry.add({"title": "Beta review of stuff", "url": "https://b.com/2"}) == 2
+        assert [s["global_id"] for s in registry.sources] == [1, 2]
+
+    def test_canonical_url_match(self):
+        """Test that URL variants of one page merge."""
+        registry = SourceRegistry()
+        first = registry.add({"title": "Report", "url": "https://www.example.com/report/?utm_source=x"})
+        second = registry.add({"title": "Report (PDF)", "url": "http://example.com/report"})
+        assert first == second
+        assert len(registry) == 1
+        assert registry.decisions[-1]["reason"] == "canonical_url"
+
+    def test_case_variants_merged(self):
+        """Test that title and URL case differences do not split a source."""
+        registry = SourceRegistry()
+        first = registry.add({"title": "Test", "url": "https://example.com/page"})
+        second = registry.add({"title": "test", "url": "HTTPS://EXAMPLE.COM/page"})
+        assert first == second
+
+    def test_bare_domain_with_different_titles_not_merged(self):
+        """Test that a generic homepage URL does not merge unrelated sources."""
+        registry = SourceRegistry()
+        first = registry.add({"title": "Global tuberculosis report", "url": "https://who.int"})
+        second = registry.add({"title": "World malaria report", "url": "https://www.who.int/"})
+        assert first != second
+
+    def test_near_duplicate_title_merged(self):
+        """Test that slightly different titles of one work merge."""
+        registry = SourceRegistry()
+        first = registry.add({"title": "Deep learning for chest radiograph diagnosis: a retrospective study", "url": ""})
+        second = registry.add({"title": "Deep Learning for Chest Radiograph Diagnosis - A Retrospective Study.", "url": "https://journal.org/x"})
+        third = registry.add({"title": "Deep learning for chest radiograph diagnosis a retrospective studies", "url": ""})
+        assert first == second == third
+        assert registry.sources[0]["url"] == "https://journal.org/x"
+        assert registry.decisions[-1]["reason"] == "title_similar"
+        assert registry.decisions[-1]["similarity"] >= registry.title_threshold
+
+    def test_short_title_needs_matching_url(self):
+        """Test that short generic titles with different URLs stay separate."""
+        registry = SourceRegistry()
+        first = registry.add({"title": "Annual Report", "url": "https://a.org/annual"})
+        second = registry.add({"title": "Annual Report", "url": "https://b.org/annual"})
+        assert first != second
+
+    def test_placeholder_urls_not_merged(self):
+        """Test sources whose URL is a placeholder are matched on title only."""
+        registry = SourceRegistry()
+        first = registry.add({"title": "WHO Global report 2023", "url": "N/A"})
+        second = registry.add({"title": "Lancet cohort study", "url": "N/A"})
+        assert first != second
+        assert registry.sources[0]["url"] == "N/A"
+
+    def test_malformed_url_does_not_raise(self):
+        """Test a malformed source URL still registers the source."""
+        registry = SourceRegistry()
+        assert registry.add({"title": "Broken link study", "url": "https://[bad/x"}) == 1
+        assert registry.add({"title": "Another broken link", "url": "https://example.com:abc/x"}) == 2
+
+    def test_different_titles_not_merged(self):
+        """Test that unrelated titles stay separate."""
+        registry = SourceRegistry()
+        first = registry.add({"title": "Economic effects of automation on labour markets", "url": ""})
+        second = registry.add({"title": "Clinical outcomes of robotic surgery in urology", "url": ""})
+        assert first != second
+
+    def test_empty_source_skipped(self):
+        """Test that sources without title and URL are skipped and recorded."""
+        registry = SourceRegistry()
+        assert registry.add({"title": "", "url": ""}) is None
+        assert registry.decisions[0]["action"] == "skipped"
+        assert len(registry) == 0
+
+    def test_every_decision_recorded(self):
+        """Test that each add() produces one decision."""
+        registry = SourceRegistry()
+        src = {"title": "Same Source", "url": "https://example.com/s"}
+        registry.add(src)
+        registry.add(dict(src))
+        assert [d["action"] for d in registry.decisions] == ["new", "merged"]
+
+    def test_resolve(self):
+        """Test resolving registered and unknown sources."""
+        registry = SourceRegistry()
+        registry.add({"title": "Source A", "url": "https://a.com/x"})
+        assert registry.resolve({"title": "Source A", "url": "https://a.com/x"}) == 1
+        assert registry.resolve({"title": "Other", "url": "http://a.com/x/"}) == 1
+        assert registry.resolve({"title": "Unknown", "url": "https://z.com/q"}) is None
+        assert len(registry) == 1
+
+    def test_from_sources_keeps_numbering(self):
+        """Test seeding from a stored source list keeps ids and merges new sources."""
+        stored = [
+            {"global_id": 1, "title": "Source A", "url": "https://a.com/x"},
+            {"global_id": 2, "title": "Source B", "url": "https://a.com/x?utm_source=feed"},
+        ]
+        registry = SourceRegistry.from_sources(stored)
+        assert [s["global_id"] for s in registry.sources] == [1, 2]
+        assert registry.decisions == []
+        assert registry.add({"title": "Source A", "url": "http://www.a.com/x/"}) == 1
+        assert registry.add({"title": "Brand new source", "url": "https://new.com/p"}) == 3
+
+    def test_from_sources_requires_contiguous_ids(self):
+        """Test gaps in stored ids are rejected."""
+        with pytest.raises(ValueError):
+            SourceRegistry.from_sources([{"global_id": 2, "title": "Source B", "url": ""}])
+
+    def test_normalize_title(self):
+        """Test title normalization."""
+        assert normalize_title("  Hello, World!  ") == "hello world"
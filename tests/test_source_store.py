@@ -0,0 +1,150 @@
+"""Unit tests for source_store module."""
+import pytest
+import sys
+import tempfile
+import shutil
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from source_store import SourceStore, source_key
+
+
+BLOCKS = [
+    {
+        "title": "Clinical Evidence",
+        "sources": [
+            {"id": 1, "title": "Deep learning for mammography screening", "url": "https://example.com/mammo?utm_source=x",
+             "source_type": "study", "why_relevant": "Large screening trial"},
+            {"id": 2, "title": "Radiologist workload survey", "url": "", "source_type": "survey", "why_relevant": "Staffing"},
+        ],
+    },
+    {
+        "title": "Regulation",
+        "sources": [
+            {"id": 1, "title": "Deep learning for mammography screening", "url": "http://www.example.com/mammo/",
+             "source_type": "study", "why_relevant": "Large screening trial"},
+        ],
+    },
+]
+
+
+class TestSourceStore:
+    """Test cases for the persistent source store."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.store = SourceStore(self.test_dir / "sources.db")
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir)
+
+    def test_source_key(self):
+        """Test keys use canonical URLs, falling back to titles."""
+        assert source_key({"url": "https://www.example.com/a/"}) == "example.com/a"
+        assert source_key({"title": "A Title!", "url": ""}) == "title:a title"
+        assert source_key({"title": "", "url": ""}) == ""
+
+    def test_placeholder_and_malformed_urls(self):
+        """Test placeholder URLs fall back to title keys and malformed ones do not raise."""
+        blocks = [{"title": "Evidence", "sources": [
+            {"title": "WHO Global report 2023", "url": "N/A"},
+            {"title": "Lancet cohort study", "url": "N/A"},
+            {"title": "Broken link study", "url": "https://[bad/x"},
+            {"title": "Bad port study", "url": "https://example.com:abc/x"},
+        ]}]
+        assert self.store.record_run("run1", "Health", blocks) == 4
+        assert self.store.count() == 4
+        who = self.store.get("title:who global report 2023")
+        assert who["title"] == "WHO Global report 2023" and who["url"] == ""
+
+    def test_record_run_dedups_by_canonical_url(self):
+        """Test URL variants are stored as one source."""
+        recorded = self.store.record_run("run1", "AI in radiology", BLOCKS)
+        assert recorded == 3
+        assert self.store.count() == 2
+
+    def test_get_returns_citing_topics_and_sections(self):
+        """Test lookup by any URL variant includes citation context."""
+        self.store.record_run("run1", "AI in radiology", BLOCKS)
+        src = self.store.get("https://example.com/mammo")
+        assert src["title"] == "Deep learning for mammography screening"
+        assert src["cite_count"] == 2
+        assert {c["section"] for c in src["citations"]} == {"Clinical Evidence", "Regulation"}
+        assert all(c["topic"] == "AI in radiology" for c in src["citations"])
+
+    def test_get_missing(self):
+        """Test lookup of an unknown source."""
+        assert self.store.get("https://nowhere.org") is None
+
+    def test_record_run_is_idempotent(self):
+        """Test re-recording the same run does not double count."""
+        self.store.record_run("run1", "Topic", BLOCKS)
+        assert self.store.record_run("run1", "Topic", BLOCKS) == 0
+        assert self.store.get("example.com/mammo")["cite_count"] == 2
+
+    def test_accumulates_across_runs(self):
+        """Test sources accumulate citations from several runs."""
+        self.store.record_run("run1", "AI in radiology", BLOCKS[:1])
+        self.store.record_run("run2", "Breast cancer screening", BLOCKS[1:])
+        src = self.store.get("example.com/mammo")
+        assert {c["run_id"] for c in src["citations"]} == {"run1", "run2"}
+        assert len(self.store.sources_for_run("run2")) == 1
+
+    def test_remove_run(self):
+        """Test removing a run drops its citations and sources nobody else cites."""
+        self.store.record_run("run1", "AI in radiology", BLOCKS[:1])
+        self.store.record_run("run2", "Breast cancer screening", BLOCKS[1:])
+        assert self.store.remove_run("run1") == 2
+        assert self.store.count() == 1
+        assert self.store.get("example.com/mammo")["cite_count"] == 1
+        assert self.store.search("Radiologist workload") == []
+        assert self.store.remove_run("run1") == 0
+
+    def test_search_ranks_relevant_sources(self):
+        """Test full-text search over titles and citing context."""
+        self.store.record_run("run1", "AI in radiology", BLOCKS)
+        hits = self.store.search("mammography screening evidence")
+        assert hits[0]["title"] == "Deep learning for mammography screening"
+        assert self.store.search("Regulation")[0]["url"].startswith("https://example.com/mammo")
+
+    def test_search_no_terms(self):
+        """Test searching with no usable terms."""
+        assert self.store.search("a of") == []
+        assert self.store.search("") == []
+
+
+class TestPipelineSourceStore:
+    """Test that the pipeline reads from and writes to the store."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.test_history_dir = Path(tempfile.mkdtemp())
+        self.history_patcher = patch('pipeline.HISTORY_DIR', self.test_history_dir)
+        self.history_patcher.start()
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        self.history_patcher.stop()
+        shutil.rmtree(self.test_history_dir)
+
+    @patch('pipeline.refine_topic_to_queries')
+    @patch('pipeline.build_outline')
+    @patch('pipeline.research_section')
+    def test_known_sources_passed_to_sections(self, mock_research, mock_outline, mock_refine):
+        """Test a second run receives sources recorded by the first."""
+        from pipeline import generate_full_report
+
+        mock_refine.return_value = {"topic": "Mammography AI", "queries": ["q1"]}
+        mock_outline.return_value = [{"title": "Clinical Evidence", "goal": "Screening trials", "priority": 1}]
+        mock_research.return_value = {"body": "Text [1]", "sources": BLOCKS[0]["sources"][:1]}
+
+        generate_full_report("Topic", "run1", "research", use_cache=False)
+        assert mock_research.call_args[1]["known_sources"] == []
+
+        generate_full_report("Topic", "run2", "research", use_cache=False)
+        known = mock_research.call_args[1]["known_sources"]
+        assert known[0]["title"] == "Deep learning for mammography screening"
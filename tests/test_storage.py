@@ -15,7 +15,14 @@ from storage import (
     load_html,
     save_meta,
     load_meta,
-    SESSIONS_DIR
+    SESSIONS_DIR,
+    atomic_write_text,
+    get_storage,
+    FilesystemStorage,
+    SqliteStorage,
+    shard_dir,
+    migrate_to_sharded,
+    MetadataLog,
 )
 
 
@@ -145,3 +152,355 @@ class TestStorage:
         loaded = load_html(session_id, "report")
         assert loaded == html2
 
+
+
+class TestAtomicWrite:
+    """Test cases for atomic file writes."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir)
+
+    def test_atomic_write_creates_parents_and_leaves_no_temp(self):
+        """Test the target is written and no temp file remains."""
+        target = self.test_dir / "a" / "b.txt"
+        atomic_write_text(target, "hello")
+        assert target.read_text(encoding='utf-8') == "hello"
+        assert [p.name for p in target.parent.iterdir()] == ["b.txt"]
+
+    def test_atomic_write_failure_keeps_old_content(self):
+        """Test a failed write leaves the previous file intact."""
+        target = self.test_dir / "b.txt"
+        atomic_write_text(target, "old")
+        with patch('storage.os.replace', side_effect=OSError("disk full")):
+            with pytest.raises(OSError):
+                atomic_write_text(target, "new")
+        assert target.read_text(encoding='utf-8') == "old"
+        assert [p.name for p in self.test_dir.iterdir()] == ["b.txt"]
+
+
+@pytest.fixture(params=["filesystem", "sqlite"])
+def report_storage(request, tmp_path):
+    """A fresh storage backend of each kind."""
+    if request.param == "sqlite":
+        return SqliteStorage(tmp_path / "reports.db")
+    return FilesystemStorage(tmp_path)
+
+
+class TestReportStorage:
+    """Behaviour shared by every report storage backend."""
+
+    def _meta(self, run_id, created_at="2024-01-01T00:00:00Z"):
+        return {"id": run_id, "refined_topic": f"Topic {run_id}", "created_at": created_at}
+
+    def test_save_and_load(self, report_storage):
+        """Test artifacts and metadata round-trip."""
+        report_storage.save_report("run1", {"html": "<html>1</html>"}, self._meta("run1"))
+
+        assert report_storage.exists("run1")
+        assert report_storage.load_artifact("run1", "html") == "<html>1</html>"
+        assert report_storage.load_meta("run1")["refined_topic"] == "Topic run1"
+
+    def test_missing(self, report_storage):
+        """Test lookups of unknown reports."""
+        assert not report_storage.exists("nope")
+        assert report_storage.load_artifact("nope", "html") is None
+        assert report_storage.load_meta("nope") is None
+
+    def test_list_meta_newest_first(self, report_storage):
+        """Test listing returns every report sorted by creation time."""
+        for i in range(3):
+            report_storage.save_report(f"run{i}", {"html": "x"}, self._meta(f"run{i}", f"2024-01-0{i+1}T00:00:00Z"))
+        assert [m["id"] for m in report_storage.list_meta()] == ["run2", "run1", "run0"]
+
+    def test_load_metas_batch(self, report_storage):
+        """Test batched metadata reads skip unknown ids."""
+        report_storage.save_report("a", {"html": "x"}, self._meta("a"))
+        report_storage.save_report("b", {"html": "x"}, self._meta("b"))
+        found = report_storage.load_metas(["a", "b", "missing"])
+        assert set(found) == {"a", "b"}
+
+    def test_overwrite(self, report_storage):
+        """Test saving a run again replaces it."""
+        report_storage.save_report("run1", {"html": "old"}, self._meta("run1"))
+        report_storage.save_report("run1", {"html": "new"}, self._meta("run1"))
+        assert report_storage.load_artifact("run1", "html") == "new"
+        assert len(report_storage.list_meta()) == 1
+
+    def test_save_drops_artifacts_not_written(self, report_storage):
+        """Test saving a legacy run again with only a doc removes its html."""
+        report_storage.save_report("run1", {"html": "<html></html>"}, self._meta("run1"))
+        report_storage.save_report("run1", {"doc": "{}"}, self._meta("run1"))
+        assert report_storage.load_artifact("run1", "html") is None
+        assert report_storage.load_artifact("run1", "doc") == "{}"
+
+    def test_save_again_keeps_last_access(self, report_storage):
+        """Test saving a viewed run again does not make it look never viewed."""
+        report_storage.save_report("run1", {"doc": "{}"}, self._meta("run1"))
+        report_storage.touch("run1")
+        viewed = report_storage.usage()[0]["last_accessed"]
+        report_storage.save_report("run1", {"doc": "{ }"}, self._meta("run1"))
+        [entry] = report_storage.usage()
+        assert entry["last_accessed"] >= viewed
+        assert report_storage.list_meta()[0]["created_at"] == "2024-01-01T00:00:00Z"
+
+    def test_delete(self, report_storage):
+        """Test deleting removes metadata and artifacts."""
+        report_storage.save_report("run1", {"html": "x"}, self._meta("run1"))
+        assert report_storage.delete("run1")
+        assert not report_storage.exists("run1")
+        assert report_storage.load_artifact("run1", "html") is None
+        assert not report_storage.delete("run1")
+
+    def test_version_tracks_adds_and_deletes(self, report_storage):
+        """Test the version changes when reports are added or deleted, not when viewed."""
+        empty = report_storage.version()
+        report_storage.save_report("run1", {"html": "x"}, self._meta("run1"))
+        saved = report_storage.version()
+        assert saved != empty
+        report_storage.touch("run1")
+        report_storage.list_meta()
+        assert report_storage.version() == saved
+        report_storage.delete("run1")
+        assert report_storage.version() not in (saved, None)
+
+    def test_version_after_deleting_newest_then_saving(self, report_storage):
+        """Test a delete followed by a save never repeats an earlier version."""
+        report_storage.save_report("a", {"html": "x"}, self._meta("a"))
+        report_storage.save_report("b", {"html": "x"}, self._meta("b"))
+        seen = {report_storage.version()}
+        report_storage.delete("b")
+        seen.add(report_storage.version())
+        report_storage.save_report("c", {"html": "x"}, self._meta("c"))
+        assert report_storage.version() not in seen
+        assert len(seen) == 2
+
+
+class TestGetStorage:
+    """Test cases for backend selection."""
+
+    def test_default_backend_is_filesystem(self, tmp_path):
+        """Test the filesystem backend is used by default and cached."""
+        storage = get_storage(tmp_path, backend="filesystem")
+        assert isinstance(storage, FilesystemStorage)
+        assert get_storage(tmp_path, backend="filesystem") is storage
+
+    def test_sqlite_backend(self, tmp_path):
+        """Test the SQLite backend lives under the root by default."""
+        storage = get_storage(tmp_path, backend="sqlite")
+        assert isinstance(storage, SqliteStorage)
+        assert storage.path == tmp_path / "reports.db"
+
+    def test_unknown_backend(self, tmp_path):
+        """Test an unknown backend name is rejected."""
+        with pytest.raises(ValueError):
+            get_storage(tmp_path, backend="s3")
+
+
+class TestShardedLayout:
+    """Test cases for the sharded history layout and migration."""
+
+    def _meta(self, run_id):
+        return {"id": run_id, "created_at": "2024-01-01T00:00:00Z"}
+
+    def test_shard_dir(self, tmp_path):
+        """Test shard directories derive from the run id prefix."""
+        assert shard_dir(tmp_path, "abcdef0123") == tmp_path / "ab" / "cd"
+        assert shard_dir(tmp_path, "abc") == tmp_path
+
+    def test_sharded_write(self, tmp_path):
+        """Test new reports land in their shard directory."""
+        storage = FilesystemStorage(tmp_path, layout="sharded")
+        storage.save_report("abcdef", {"html": "x"}, self._meta("abcdef"))
+        assert (tmp_path / "ab" / "cd" / "abcdef.html").exists()
+        assert storage.load_meta("abcdef") == self._meta("abcdef")
+        assert storage.locate("abcdef", "html") == str(tmp_path / "ab" / "cd" / "abcdef.html")
+
+    def test_flat_write(self, tmp_path):
+        """Test the flat layout is still available."""
+        storage = FilesystemStorage(tmp_path, layout="flat")
+        storage.save_report("abcdef", {"html": "x"}, self._meta("abcdef"))
+        assert (tmp_path / "abcdef.html").exists()
+
+    def test_reads_both_layouts(self, tmp_path):
+        """Test flat and sharded reports are both visible."""
+        FilesystemStorage(tmp_path, layout="flat").save_report("flat01", {"html": "flat"}, self._meta("flat01"))
+        storage = FilesystemStorage(tmp_path, layout="sharded")
+        storage.save_report("shard1", {"html": "shard"}, self._meta("shard1"))
+
+        assert storage.load_artifact("flat01", "html") == "flat"
+        assert storage.load_artifact("shard1", "html") == "shard"
+        assert {m["id"] for m in storage.list_meta()} == {"flat01", "shard1"}
+
+    def test_rewrite_removes_flat_copy(self, tmp_path):
+        """Test re-saving a flat run in sharded mode leaves one copy."""
+        FilesystemStorage(tmp_path, layout="flat").save_report("abcdef", {"html": "old"}, self._meta("abcdef"))
+        storage = FilesystemStorage(tmp_path, layout="sharded")
+        storage.save_report("abcdef", {"html": "new"}, self._meta("abcdef"))
+        assert not (tmp_path / "abcdef.html").exists()
+        assert storage.load_artifact("abcdef", "html") == "new"
+        assert len(storage.list_meta()) == 1
+
+    def test_delete_both_layouts(self, tmp_path):
+        """Test delete removes the run whichever layout it is in."""
+        FilesystemStorage(tmp_path, layout="flat").save_report("abcdef", {"html": "x"}, self._meta("abcdef"))
+        storage = FilesystemStorage(tmp_path, layout="sharded")
+        assert storage.delete("abcdef")
+        assert not storage.exists("abcdef")
+
+    def test_migrate_to_sharded(self, tmp_path):
+        """Test migration moves flat runs into shards in place."""
+        flat = FilesystemStorage(tmp_path, layout="flat")
+        flat.save_report("abcdef", {"html": "a"}, self._meta("abcdef"))
+        flat.save_report("123456", {"html": "b"}, self._meta("123456"))
+        (tmp_path / "sources.db").write_text("db")
+
+        assert migrate_to_sharded(tmp_path, dry_run=True) == 2
+        assert (tmp_path / "abcdef.html").exists()
+
+        assert migrate_to_sharded(tmp_path) == 2
+        assert not (tmp_path / "abcdef.html").exists()
+        assert (tmp_path / "ab" / "cd" / "abcdef.html").read_text() == "a"
+        assert (tmp_path / "12" / "34" / "123456.html").exists()
+        assert (tmp_path / "sources.db").exists()
+        assert migrate_to_sharded(tmp_path) == 0
+
+        storage = FilesystemStorage(tmp_path, layout="sharded")
+        assert storage.load_artifact("abcdef", "html") == "a"
+        assert len(storage.list_meta()) == 2
+
+    def test_manage_migrate_history(self, tmp_path, capsys):
+        """Test the migrate-history CLI command."""
+        from manage import main
+
+        FilesystemStorage(tmp_path, layout="flat").save_report("abcdef", {"html": "a"}, self._meta("abcdef"))
+        assert main(["--history-dir", str(tmp_path), "migrate-history"]) == 0
+        assert "Moved 1 run(s)" in capsys.readouterr().out
+        assert (tmp_path / "ab" / "cd" / "abcdef.html").exists()
+
+
+class TestMetadataLog:
+    """Test cases for the append-only metadata log."""
+
+    def _meta(self, run_id, created_at="2024-01-01T00:00:00Z"):
+        return {"id": run_id, "created_at": created_at}
+
+    def test_append_get_and_overwrite(self, tmp_path):
+        """Test the latest record for an id wins."""
+        log = MetadataLog(tmp_path / "meta.log")
+        log.append("run1", {"v": 1})
+        log.append("run2", {"v": 2})
+        log.append("run1", {"v": 3})
+        assert log.get("run1") == {"v": 3}
+        assert log.items() == {"run1": {"v": 3}, "run2": {"v": 2}}
+        assert log.stats()["dead"] == 1
+
+    def test_delete_tombstone(self, tmp_path):
+        """Test deletes append a tombstone record."""
+        log = MetadataLog(tmp_path / "meta.log")
+        log.append("run1", {"v": 1})
+        assert log.delete("run1")
+        assert not log.delete("run1")
+        assert log.get("run1") is None
+        assert log.items() == {}
+
+    def test_sees_appends_from_other_writers(self, tmp_path):
+        """Test the offset index picks up records appended by another instance."""
+        reader = MetadataLog(tmp_path / "meta.log")
+        writer = MetadataLog(tmp_path / "meta.log")
+        writer.append("run1", {"v": 1})
+        assert reader.get("run1") == {"v": 1}
+        writer.compact()
+        writer.append("run2", {"v": 2})
+        assert reader.get("run2") == {"v": 2}
+        assert reader.get("run1") == {"v": 1}
+
+    def test_ignores_partial_trailing_line(self, tmp_path):
+        """Test a half-written last line is not indexed."""
+        log = MetadataLog(tmp_path / "meta.log")
+        log.append("run1", {"v": 1})
+        with open(log.path, "ab") as f:
+            f.write(b'{"op":"put","id":"run2"')
+        assert log.get("run2") is None
+        assert log.items() == {"run1": {"v": 1}}
+
+    def test_compact(self, tmp_path):
+        """Test compaction keeps only live records."""
+        log = MetadataLog(tmp_path / "meta.log")
+        for i in range(5):
+            log.append("run1", {"v": i})
+        log.append("run2", {"v": 0})
+        log.delete("run2")
+        assert log.compact() == 1
+        assert log.path.read_text().count("\n") == 1
+        assert log.get("run1") == {"v": 4}
+        assert log.stats()["dead"] == 0
+
+    def test_auto_compact(self, tmp_path):
+        """Test compaction runs once dead records outnumber live ones."""
+        log = MetadataLog(tmp_path / "meta.log", compact_min_dead=3)
+        for i in range(5):
+            log.append("run1", {"v": i})
+        assert log.stats()["dead"] < 3
+        assert log.get("run1") == {"v": 4}
+
+    def test_storage_uses_log(self, tmp_path):
+        """Test filesystem storage writes metadata to the log, not per-run files."""
+        storage = FilesystemStorage(tmp_path)
+        storage.save_report("abcdef", {"html": "x"}, self._meta("abcdef"))
+        assert not list(tmp_path.rglob("*.json"))
+        assert storage.locate("abcdef", "meta") == f"{tmp_path / 'meta.log'}#abcdef"
+        assert FilesystemStorage(tmp_path).load_meta("abcdef") == self._meta("abcdef")
+
+    def test_imports_legacy_json_on_first_open(self, tmp_path):
+        """Test existing per-run JSON is folded into a new log."""
+        (tmp_path / "old001.json").write_text(json.dumps(self._meta("old001")))
+        (tmp_path / "ab" / "cd").mkdir(parents=True)
+        (tmp_path / "ab" / "cd" / "abcdef.json").write_text(json.dumps(self._meta("abcdef")))
+
+        storage = FilesystemStorage(tmp_path)
+        assert set(storage.meta_log.items()) == {"old001", "abcdef"}
+        assert (tmp_path / "old001.json").exists()
+        assert {m["id"] for m in storage.list_meta()} == {"old001", "abcdef"}
+
+        assert storage.import_legacy_meta(remove=True) == 2
+        assert not list(tmp_path.rglob("*.json"))
+        assert len(storage.list_meta()) == 2
+
+    def test_legacy_json_after_import_needs_import(self, tmp_path):
+        """Test per-run JSON written after the log exists is found by id but only listed once imported."""
+        storage = FilesystemStorage(tmp_path)
+        (tmp_path / "late01.json").write_text(json.dumps(self._meta("late01")))
+        assert storage.exists("late01")
+        assert storage.load_meta("late01") == self._meta("late01")
+        assert storage.list_meta() == []
+        assert storage.usage() == []
+
+        assert storage.import_legacy_meta(remove=True) == 1
+        assert [m["id"] for m in storage.list_meta()] == ["late01"]
+        assert [e["id"] for e in storage.usage()] == ["late01"]
+        assert storage.delete("late01")
+        assert not storage.exists("late01")
+
+    def test_listing_does_not_scan_root(self, tmp_path):
+        """Test listings read the metadata log without listing the history root."""
+        storage = FilesystemStorage(tmp_path)
+        storage.save_report("abcdef", {"doc": "{}"}, self._meta("abcdef"))
+        with patch.object(Path, "glob", side_effect=AssertionError("scanned")):
+            assert [m["id"] for m in storage.list_meta()] == ["abcdef"]
+            assert [e["id"] for e in storage.usage()] == ["abcdef"]
+
+    def test_manage_compact_meta(self, tmp_path, capsys):
+        """Test the compact-meta CLI command."""
+        from manage import main
+
+        storage = FilesystemStorage(tmp_path)
+        for _ in range(3):
+            storage.save_report("abcdef", {"html": "x"}, self._meta("abcdef"))
+        assert main(["--history-dir", str(tmp_path), "compact-meta"]) == 0
+        assert "1 live" in capsys.readouterr().out
+        assert storage.meta_log.stats()["dead"] == 0
@@ -2,6 +2,7 @@
 import pytest
 import sys
 import json
+import re
 import tempfile
 import shutil
 from pathlib import Path
@@ -11,6 +12,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app import app
 from pipeline import generate_full_report, HISTORY_DIR
+from storage import get_storage
 
 
 class TestSystemIntegration:
@@ -28,6 +30,20 @@ class TestSystemIntegration:
         self.app_history_patcher.start()
         self.test_history_dir.mkdir(exist_ok=True)
 
+    def _with_stylesheets(self, html_content):
+        """Report HTML plus the contents of any linked /assets/ stylesheets."""
+        for href in re.findall(r'href="(/assets/[^"]+\.css)"', html_content):
+            response = self.app.get(href)
+            assert response.status_code == 200
+            html_content += response.data.decode('utf-8')
+        return html_content
+
+    def _report_html(self, run_id):
+        """The report page as served from its stored document."""
+        response = self.app.get(f'/report/{run_id}')
+        assert response.status_code == 200, "Report should be viewable"
+        return response.data.decode('utf-8')
+
     def teardown_method(self):
         """Clean up test fixtures."""
         self.history_patcher.stop()
@@ -92,7 +108,7 @@ class TestSystemIntegration:
 
         # Verify result structure
         assert result["id"] == run_id
-        assert "html_path" in result
+        assert "doc_path" in result
         assert "meta_path" in result
 
         # Verify HTML was generated
@@ -105,16 +121,14 @@ class TestSystemIntegration:
         assert len(sources) == 2  # Source 1 and Source 2
 
         # Verify metadata was saved
-        meta_path = self.test_history_dir / f"{run_id}.json"
-        assert meta_path.exists()
-        meta = json.loads(meta_path.read_text(encoding='utf-8'))
+        meta = get_storage(self.test_history_dir).load_meta(run_id)
+        assert meta is not None
         assert meta["id"] == run_id
         assert meta["report_type"] == "research"
         assert meta["refined_topic"] == "Refined Topic"
 
-        # Verify HTML file was created
-        html_path = self.test_history_dir / f"{run_id}.html"
-        assert html_path.exists()
+        # Verify the report renders from its stored document
+        assert "Refined Topic" in self._report_html(run_id)
 
 
     @patch('app.generate_full_report')
@@ -244,11 +258,7 @@ class TestSystemIntegration:
         run_id = "citation_test_123"
         result = generate_full_report("Topic", run_id, "research")
 
-        # Verify the HTML file was created
-        html_path = self.test_history_dir / f"{run_id}.html"
-        assert html_path.exists(), "HTML file should be created"
-        
-        html_content = html_path.read_text(encoding='utf-8')
+        html_content = self._report_html(run_id)
         
         # Check for clickable citation links
         assert 'class="citation-link"' in html_content, "Citations should have citation-link class"
@@ -257,7 +267,8 @@ class TestSystemIntegration:
         # Check for reference IDs
         assert 'id="ref-1"' in html_content, "Reference 1 should have id ref-1"
         assert 'id="ref-2"' in html_content, "Reference 2 should have id ref-2"
-        # Check for superscript CSS
+        # Check for superscript CSS (inline or in the linked stylesheet)
+        html_content = self._with_stylesheets(html_content)
         assert 'vertical-align: super' in html_content, "Citations should have superscript styling"
         # Check that citations are clickable
         assert 'data-ref="1"' in html_content, "Citation should have data-ref attribute"
@@ -289,10 +300,7 @@ class TestSystemIntegration:
         result = generate_full_report("Topic", run_id, "research")
 
         # Check the generated HTML
-        html_path = self.test_history_dir / f"{run_id}.html"
-        assert html_path.exists()
-        
-        html_content = html_path.read_text(encoding='utf-8')
+        html_content = self._report_html(run_id)
         
         # Verify citation [1] links to ref-1
         assert 'href="#ref-1"' in html_content
@@ -324,12 +332,10 @@ class TestSystemIntegration:
         run_id = "styling_test_123"
         result = generate_full_report("Topic", run_id, "research")
 
-        html_path = self.test_history_dir / f"{run_id}.html"
-        assert html_path.exists()
-        
-        html_content = html_path.read_text(encoding='utf-8')
+        html_content = self._report_html(run_id)
         
         # Check for superscript CSS properties
+        html_content = self._with_stylesheets(html_content)
         assert '.citation-link' in html_content
         assert 'vertical-align: super' in html_content
         assert 'font-size: 0.75em' in html_content or 'font-size: 0.7em' in html_content
@@ -0,0 +1,171 @@
+"""Unit tests for tracing module."""
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from unittest.mock import patch, Mock
+
+import pytest
+import requests
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from tracing import span, start_trace, load_trace, waterfall_rows, trace_dir
+
+
+class TestSpans:
+    """Test cases for recording and exporting spans."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir)
+
+    def test_span_outside_trace_is_noop(self):
+        """Test spans without an active trace record nothing."""
+        with span("orphan") as s:
+            assert s is None
+        assert not list(self.test_dir.iterdir())
+
+    def test_nested_spans_exported(self):
+        """Test child spans point at their parent and are written as JSONL."""
+        with start_trace("run1", self.test_dir, "report", topic="T") as root:
+            with span("outline") as outline:
+                outline.set(sections=3)
+            with span("section", title="Intro"):
+                with span("llm.call"):
+                    pass
+
+        spans = load_trace(self.test_dir, "run1")
+        by_name = {s["name"]: s for s in spans}
+        assert set(by_name) == {"report", "outline", "section", "llm.call"}
+        assert by_name["report"]["parent_id"] is None
+        assert by_name["report"]["attrs"] == {"topic": "T"}
+        assert by_name["outline"]["parent_id"] == root.span_id
+        assert by_name["outline"]["attrs"] == {"sections": 3}
+        assert by_name["llm.call"]["parent_id"] == by_name["section"]["span_id"]
+        assert all(s["run_id"] == "run1" for s in spans)
+        assert len({s["trace_id"] for s in spans}) == 1
+
+    def test_error_recorded_and_exported(self):
+        """Test a failing block marks its spans and still exports them."""
+        with pytest.raises(ValueError):
+            with start_trace("run1", self.test_dir, "report"):
+                with span("refine"):
+                    raise ValueError("boom")
+
+        spans = {s["name"]: s for s in load_trace(self.test_dir, "run1")}
+        assert spans["refine"]["status"] == "error"
+        assert spans["refine"]["error"] == "boom"
+        assert spans["report"]["status"] == "error"
+
+    def test_later_traces_append(self):
+        """Test a second trace of the same run is kept alongside the first."""
+        with start_trace("run1", self.test_dir, "report"):
+            pass
+        with start_trace("run1", self.test_dir, "regenerate_section"):
+            pass
+        spans = load_trace(self.test_dir, "run1")
+        assert [s["name"] for s in spans] == ["report", "regenerate_section"]
+
+    def test_disabled(self):
+        """Test TRACING_ENABLED=0 writes nothing."""
+        with patch('tracing.TRACING_ENABLED', False):
+            with start_trace("run1", self.test_dir, "report") as root:
+                assert root is None
+                with span("outline") as s:
+                    assert s is None
+        assert load_trace(self.test_dir, "run1") == []
+
+    def test_waterfall_rows(self):
+        """Test rows are in tree order with depth and relative offsets."""
+        spans = [
+            {"trace_id": "t", "span_id": "a", "parent_id": None, "name": "report", "start": 100.0,
+             "duration_ms": 1000.0},
+            {"trace_id": "t", "span_id": "b", "parent_id": "a", "name": "refine", "start": 100.0,
+             "duration_ms": 250.0},
+            {"trace_id": "t", "span_id": "c", "parent_id": "b", "name": "llm.call", "start": 100.1,
+             "duration_ms": 100.0},
+            {"trace_id": "t", "span_id": "d", "parent_id": "a", "name": "outline", "start": 100.5,
+             "duration_ms": 500.0},
+        ]
+        rows = waterfall_rows(spans)
+        assert [(r["name"], r["depth"]) for r in rows] == [
+            ("report", 0), ("refine", 1), ("llm.call", 2), ("outline", 1)
+        ]
+        assert rows[0]["offset_pct"] == 0 and rows[0]["width_pct"] == 100
+        assert rows[3]["offset_pct"] == 50 and rows[3]["width_pct"] == 50
+
+
+class TestInstrumentation:
+    """Test cases for spans emitted by the LLM client and pipeline."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.test_history_dir = Path(tempfile.mkdtemp())
+        self.history_patcher = patch('pipeline.HISTORY_DIR', self.test_history_dir)
+        self.history_patcher.start()
+        self.app_history_patcher = patch('app.HISTORY_DIR', self.test_history_dir)
+        self.app_history_patcher.start()
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        self.history_patcher.stop()
+        self.app_history_patcher.stop()
+        shutil.rmtree(self.test_history_dir)
+
+    @patch('llm_client.time.sleep')
+    @patch('llm_client.requests.post')
+    @patch('llm_client.OPENROUTER_API_KEY', 'test-key')
+    def test_llm_attempts_and_backoff(self, mock_post, mock_sleep):
+        """Test every attempt and backoff sleep gets its own span."""
+        from llm_client import call_llm
+
+        ok = Mock(status_code=200)
+        ok.json.return_value = {"choices": [{"message": {"content": "x"}, "finish_reason": "stop"}]}
+        mock_post.side_effect = [requests.Timeout("slow"), ok]
+
+        with start_trace("run1", self.test_history_dir, "report"):
+            call_llm([{"role": "user", "content": "p"}], model="m1")
+
+        spans = load_trace(self.test_history_dir, "run1")
+        names = [s["name"] for s in spans]
+        assert names == ["report", "llm.call", "llm.attempt", "llm.backoff", "llm.attempt"]
+        call = spans[1]
+        assert call["attrs"]["model"] == "m1"
+        assert call["attrs"]["outcome"] == "ok"
+        assert spans[2]["status"] == "error"
+        assert spans[3]["attrs"] == {"seconds": 1.5}
+        assert spans[4]["attrs"] == {"attempt": 2, "status_code": 200, "finish_reason": "stop"}
+        assert all(s["parent_id"] == call["span_id"] for s in spans[2:])
+
+    @patch('pipeline.refine_topic_to_queries')
+    @patch('pipeline.build_outline')
+    @patch('pipeline.research_section')
+    def test_report_trace_and_endpoint(self, mock_research, mock_outline, mock_refine):
+        """Test a report run is traced by stage and shown as a waterfall."""
+        from app import app
+        from pipeline import generate_full_report
+
+        mock_refine.return_value = {"topic": "T", "queries": ["q"]}
+        mock_outline.return_value = [{"title": "S1", "goal": "G1"}, {"title": "S2", "goal": "G2"}]
+        mock_research.return_value = {"body": "Body.", "sources": []}
+
+        generate_full_report("Topic", "trace1", use_cache=False)
+
+        spans = load_trace(trace_dir(self.test_history_dir), "trace1")
+        names = [s["name"] for s in spans if s["parent_id"] == spans[0]["span_id"]]
+        assert spans[0]["name"] == "report"
+        assert names == ["refine", "outline", "section", "section", "citations", "source_store.record_run",
+                         "persist", "search_index.put"]
+
+        client = app.test_client()
+        response = client.get('/report/trace1/trace')
+        assert response.status_code == 200
+        assert b"persist" in response.data
+        data = client.get('/report/trace1/trace?format=json').get_json()
+        assert len(data["spans"]) == len(spans)
+        assert client.get('/report/missing/trace').status_code == 404
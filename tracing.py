@@ -0,0 +1,213 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+
+# Can be overridden with env vars:
+#   export TRACING_ENABLED=0     # record no spans at all
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") != "0"
+
+
+class Span:
+    """One timed operation inside a trace."""
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attrs = dict(attrs)
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms = 0.0
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def fail(self, error: Any) -> None:
+        self.status = "error"
+        self.error = str(error)[:500]
+
+    def finish(self) -> None:
+        self.duration_ms = round((time.perf_counter() - self._started) * 1000, 3)
+        self.trace.record(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        record = {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "run_id": self.trace.run_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attrs": self.attrs,
+        }
+        if self.error is not None:
+            record["error"] = self.error
+        return record
+
+
+class Trace:
+    """Spans of one traced operation on a run, written out when it ends."""
+
+    def __init__(self, run_id: str, exporter: "JsonlExporter"):
+        self.run_id = run_id
+        self.trace_id = uuid.uuid4().hex
+        self.exporter = exporter
+        self._spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def record(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span.to_dict())
+
+    def export(self) -> None:
+        with self._lock:
+            spans, self._spans = self._spans, []
+        if spans:
+            self.exporter.export(self.run_id, spans)
+
+
+def trace_dir(history_dir: Path) -> Path:
+    """Where a history directory's run traces are kept."""
+    return Path(history_dir) / "traces"
+
+
+class JsonlExporter:
+    """
+    Appends spans to <directory>/<run_id>.jsonl, one JSON object per line.
+    Each trace is written with a single append, so later traces of the same
+    run (e.g. a section regeneration) follow the original one.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+
+    def path(self, run_id: str) -> Path:
+        return self.directory / f"{run_id}.jsonl"
+
+    def export(self, run_id: str, spans: List[Dict[str, Any]]) -> None:
+        lines = "".join(json.dumps(s, ensure_ascii=False, separators=(",", ":")) + "\n" for s in spans)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.path(run_id), "a", encoding="utf-8") as f:
+                f.write(lines)
+        except OSError:
+            pass
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("span", default=None)
+
+
+@contextmanager
+def start_trace(run_id: str, directory: Path, name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+    """
+    Trace everything run inside the block for run_id, under a root span
+    called name. Spans are exported to directory when the block exits,
+    whether it succeeded or not.
+    """
+    if not TRACING_ENABLED:
+        yield None
+        return
+    trace = Trace(run_id, JsonlExporter(directory))
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        with span(name, **attrs) as root:
+            yield root
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        trace.export()
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+    """
+    Time the block as a child of the current span. Outside a trace this
+    does nothing and yields None, so callers guard attribute updates with
+    `if s:`.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get()
+    current = Span(trace, name, parent.span_id if parent else None, attrs)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.fail(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.finish()
+
+
+def load_trace(directory: Path, run_id: str) -> List[Dict[str, Any]]:
+    """Recorded spans for a run, oldest first; [] if it was never traced."""
+    spans = []
+    try:
+        with open(JsonlExporter(directory).path(run_id), encoding="utf-8") as f:
+            for line in f:
+                try:
+                    spans.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        return []
+    spans.sort(key=lambda s: s.get("start", 0))
+    return spans
+
+
+def delete_trace(directory: Path, run_id: str) -> bool:
+    """Remove a run's recorded spans; False if it had none."""
+    try:
+        JsonlExporter(directory).path(run_id).unlink()
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def waterfall_rows(spans: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Spans in tree order (each parent followed by its children), with their
+    depth and offset/width as percentages of their trace's total duration.
+    """
+    rows: List[Dict[str, Any]] = []
+    by_trace: Dict[str, List[Dict[str, Any]]] = {}
+    for s in spans:
+        by_trace.setdefault(s.get("trace_id", ""), []).append(s)
+
+    for trace_spans in by_trace.values():
+        ids = {s["span_id"] for s in trace_spans}
+        children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+        for s in trace_spans:
+            parent = s.get("parent_id") if s.get("parent_id") in ids else None
+            children.setdefault(parent, []).append(s)
+
+        start = min(s["start"] for s in trace_spans)
+        end = max(s["start"] + s["duration_ms"] / 1000 for s in trace_spans)
+        total = max(end - start, 1e-9)
+
+        stack = [(s, 0) for s in reversed(children.get(None, []))]
+        while stack:
+            s, depth = stack.pop()
+            offset = (s["start"] - start) / total * 100
+            width = s["duration_ms"] / 1000 / total * 100
+            rows.append(dict(s, depth=depth, offset_pct=round(min(offset, 100), 3),
+                             width_pct=round(max(min(width, 100 - offset), 0.2), 3)))
+            stack.extend((c, depth + 1) for c in reversed(children.get(s["span_id"], [])))
+    return rows